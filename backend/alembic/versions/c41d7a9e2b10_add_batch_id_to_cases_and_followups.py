@@ -0,0 +1,35 @@
+"""add_batch_id_to_cases_and_followups
+
+Revision ID: c41d7a9e2b10
+Revises: b6c3e4e46267
+Create Date: 2026-10-19 09:12:04.318842
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41d7a9e2b10'
+down_revision: Union[str, Sequence[str], None] = 'b6c3e4e46267'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Report batch partition: uploads append to a batch instead of clearing the tables
+    op.add_column('cases', sa.Column('batch_id', sa.String(20), nullable=True))
+    op.add_column('followups', sa.Column('batch_id', sa.String(20), nullable=True))
+    op.create_index(op.f('ix_cases_batch_id'), 'cases', ['batch_id'], unique=False)
+    op.create_index(op.f('ix_followups_batch_id'), 'followups', ['batch_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_followups_batch_id'), table_name='followups')
+    op.drop_index(op.f('ix_cases_batch_id'), table_name='cases')
+    op.drop_column('followups', 'batch_id')
+    op.drop_column('cases', 'batch_id')
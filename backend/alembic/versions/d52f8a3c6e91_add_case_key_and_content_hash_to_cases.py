@@ -0,0 +1,33 @@
+"""add_case_key_and_content_hash_to_cases
+
+Revision ID: d52f8a3c6e91
+Revises: c41d7a9e2b10
+Create Date: 2026-10-19 11:40:27.905113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd52f8a3c6e91'
+down_revision: Union[str, Sequence[str], None] = 'c41d7a9e2b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Identity key and content hash make repeated uploads of a report idempotent
+    op.add_column('cases', sa.Column('case_key', sa.String(64), nullable=True))
+    op.add_column('cases', sa.Column('content_hash', sa.String(64), nullable=True))
+    op.create_index('ux_cases_batch_id_case_key', 'cases', ['batch_id', 'case_key'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ux_cases_batch_id_case_key', table_name='cases')
+    op.drop_column('cases', 'content_hash')
+    op.drop_column('cases', 'case_key')
@@ -0,0 +1,29 @@
+"""add_is_ai_generated_to_followups
+
+Revision ID: e7a41c9d3f52
+Revises: d52f8a3c6e91
+Create Date: 2026-10-19 16:05:48.271936
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a41c9d3f52'
+down_revision: Union[str, Sequence[str], None] = 'd52f8a3c6e91'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Marks the followup an upload wrote, so a re-upload refreshes only that one
+    op.add_column('followups', sa.Column('is_ai_generated', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('followups', 'is_ai_generated')
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Chunking benchmark.
+
+Indexes a fixed hotel-policy corpus with each chunker configuration and reports chunk
+count, stored tokens, index size on disk, build time, retrieval hit rate on a fixed Q&A
+set and the prompt tokens the top-k context would cost.
+
+A question is a hit when one of the top-k chunks contains its answer phrase. By default
+retrieval is lexical (BM25) with deterministic fake embeddings, so no OpenAI calls are
+made; pass --provider openai --retrieval hybrid to measure with real embeddings.
+
+Usage:
+    python benchmark_chunking.py --k 3 --copies 20
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+SECTIONS = {
+    "Front Desk": {
+        "Check-in": "Check-in starts at 3pm and guests must present a passport or national ID. "
+                    "Early check-in from 11am costs 25 EUR and depends on availability.",
+        "Check-out": "Check-out is at 11am. Late checkout until 2pm costs 30 EUR, and guests of the "
+                     "Deluxe Ocean Suite get late checkout free of charge.",
+        "Deposits": "A refundable deposit of 100 EUR per stay is pre-authorised on the card at arrival.",
+    },
+    "Rooms": {
+        "Room categories": "Rooms come in four categories: Standard Garden, Superior Sea View, "
+                           "Junior Suite and Deluxe Ocean Suite.",
+        "Amenities": "All rooms include free wifi, a Nespresso machine and blackout curtains. "
+                     "Junior Suites add a bathtub with sea view.",
+        "Housekeeping": "Housekeeping cleans rooms daily between 9am and 3pm; towels are changed on request.",
+    },
+    "Food and Beverage": {
+        "Breakfast": "Breakfast is served in the Olivo restaurant from 7am to 10:30am. "
+                     "Room service breakfast has a 5 EUR tray charge.",
+        "Bars": "The Sunset rooftop bar opens at 5pm and closes at 1am; happy hour runs 6pm to 7pm.",
+        "Allergies": "Gluten-free and lactose-free breakfast options must be requested the evening before.",
+    },
+    "Leisure": {
+        "Pool": "The infinity pool is open from 8am to 9pm; children under 12 must be supervised.",
+        "Spa": "The Aqua spa offers massages from 10am to 8pm and must be booked 24 hours in advance.",
+        "Gym": "The gym is open 24 hours and requires the room key card for access.",
+    },
+    "Policies": {
+        "Pets": "Dogs under 10kg are welcome for a fee of 20 EUR per night.",
+        "Smoking": "Smoking in rooms carries a cleaning fee of 250 EUR.",
+        "Parking": "Underground parking costs 18 EUR per day; electric vehicle chargers are on level -1.",
+        "Cancellations": "Free cancellation is possible up to 48 hours before arrival; later "
+                         "cancellations are charged one night.",
+    },
+}
+
+QUESTIONS = [
+    ("What time is check-in?", "Check-in starts at 3pm"),
+    ("How much is early check-in?", "Early check-in from 11am costs 25 EUR"),
+    ("Is late checkout free for the Deluxe Ocean Suite?", "Deluxe Ocean Suite get late checkout free"),
+    ("How much is the deposit?", "refundable deposit of 100 EUR"),
+    ("Which room categories are there?", "Standard Garden, Superior Sea View"),
+    ("Do rooms have a Nespresso machine?", "a Nespresso machine"),
+    ("When does housekeeping clean rooms?", "between 9am and 3pm"),
+    ("What are breakfast hours in Olivo?", "from 7am to 10:30am"),
+    ("When is happy hour at the rooftop bar?", "happy hour runs 6pm to 7pm"),
+    ("Can I get gluten-free breakfast?", "must be requested the evening before"),
+    ("Until when is the infinity pool open?", "open from 8am to 9pm"),
+    ("How far in advance must I book the spa?", "24 hours in advance"),
+    ("Are dogs allowed?", "Dogs under 10kg are welcome"),
+    ("What is the fee for smoking in the room?", "cleaning fee of 250 EUR"),
+    ("Where are the electric vehicle chargers?", "chargers are on level -1"),
+    ("What is the cancellation policy?", "Free cancellation is possible up to 48 hours"),
+]
+
+FILLER = ("Our team is happy to help with any request during your stay. "
+          "Please contact reception by dialling 9 from your room phone. ")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark chunkers on a fixed Q&A set")
+    parser.add_argument("--k", type=int, default=3, help="chunks retrieved per question")
+    parser.add_argument("--copies", type=int, default=20, help="corpus documents (each with different filler)")
+    parser.add_argument("--provider", default="fake", choices=["fake", "openai"], help="embedding provider")
+    parser.add_argument("--retrieval", default="lexical", choices=["lexical", "vector", "hybrid"])
+    parser.add_argument("--max-tokens", type=int, nargs="+", default=[128, 256, 512],
+                        help="structured chunker sizes to compare")
+    parser.add_argument("--overlap", type=int, nargs="+", default=[0, 32], help="structured chunker overlaps")
+    return parser.parse_args()
+
+
+def build_corpus(copies: int):
+    """Markdown policy documents: one carries the facts, the others are filler-heavy
+    variants, so questions have exactly one right place to land"""
+    documents = []
+    for number in range(copies):
+        lines = [f"# Hotel Handbook {number}", ""]
+        for part, sections in SECTIONS.items():
+            lines += [f"## {part}", ""]
+            for title, fact in sections.items():
+                lines += [f"### {title}", ""]
+                body = fact if number == 0 else f"Details for {title.lower()} are in the main handbook."
+                lines += [FILLER * (1 + number % 3) + body + " " + FILLER, ""]
+        documents.append((f"handbook-{number:03d}.md", "\n".join(lines)))
+    return documents
+
+
+def folder_size(folder: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(folder) for name in names)
+
+
+def run(chunker, documents, args, count_tokens, create_embeddings, work_dir):
+    from langchain_core.documents import Document
+    from services.bm25_index import reciprocal_rank_fusion
+    from services.vector_store import SegmentedVectorStore, chunk_id
+
+    folder = os.path.join(work_dir, chunker.signature)
+    embeddings = create_embeddings(args.provider)
+
+    start = time.perf_counter()
+    store = SegmentedVectorStore(folder, embeddings)
+    stored = {}
+    for filename, text in documents:
+        texts = chunker.split_documents([Document(page_content=text, metadata={"filename": filename})])
+        store.add_source(filename, texts)
+        stored.update((chunk_id(doc.page_content), doc.page_content) for doc in texts)
+    build_seconds = time.perf_counter() - start
+
+    hits = 0
+    prompt_tokens = 0
+    for question, answer in QUESTIONS:
+        if args.retrieval == "lexical":
+            docs = [doc for doc, _ in store.lexical_search_with_score(question, args.k)]
+        else:
+            vector_docs = store.similarity_search(question, k=args.k if args.retrieval == "vector" else 20)
+            docs = vector_docs[:args.k]
+            if args.retrieval == "hybrid":
+                lexical_docs = [doc for doc, _ in store.lexical_search_with_score(question, 20)]
+                by_id = {doc.id: doc for doc in vector_docs + lexical_docs}
+                fused = reciprocal_rank_fusion([[d.id for d in vector_docs], [d.id for d in lexical_docs]])
+                docs = [by_id[doc_id] for doc_id, _ in fused[:args.k]]
+        hits += any(answer in " ".join(doc.page_content.split()) for doc in docs)
+        prompt_tokens += sum(count_tokens(doc.page_content) for doc in docs)
+
+    return {
+        "chunker": chunker.signature,
+        "chunks": store.count(),  # identical chunks are stored once
+        "stored_tokens": sum(count_tokens(text) for text in stored.values()),
+        "index_mb": folder_size(folder) / 1024 / 1024,
+        "build_seconds": build_seconds,
+        "hit_rate": hits / len(QUESTIONS),
+        "prompt_tokens": prompt_tokens / len(QUESTIONS),
+    }
+
+
+def main():
+    args = parse_args()
+    work_dir = tempfile.mkdtemp(prefix="chunking-benchmark-")
+    # Fresh embedding cache, so build time includes embedding every chunk
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(work_dir, "embedding_cache.sqlite3")
+
+    from services.chunking import CharacterChunker, StructuredChunker, count_tokens
+    from services.embedding_pipeline import create_embeddings
+
+    print("✂️ Chunking benchmark")
+    print("=" * 86)
+    documents = build_corpus(args.copies)
+    print(f"   Corpus: {len(documents)} documents, {sum(count_tokens(text) for _, text in documents)} tokens; "
+          f"{len(QUESTIONS)} questions, k={args.k}, retrieval={args.retrieval}, embeddings={args.provider}")
+
+    # Warm up the tokenizer and embeddings so the first configuration isn't charged for it
+    count_tokens("warm up")
+    create_embeddings(args.provider).embeddings.embed_documents(["warm up"])
+
+    chunkers = [CharacterChunker()]
+    chunkers += [StructuredChunker(max_tokens, overlap)
+                 for max_tokens in args.max_tokens for overlap in args.overlap if overlap < max_tokens]
+
+    try:
+        results = [run(chunker, documents, args, count_tokens, create_embeddings, work_dir) for chunker in chunkers]
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\n{'chunker':<24}{'chunks':>8}{'tokens':>10}{'index (MB)':>12}{'build (s)':>11}"
+          f"{'hit@' + str(args.k):>8}{'prompt tok':>12}")
+    print("-" * 85)
+    for r in results:
+        print(f"{r['chunker']:<24}{r['chunks']:>8}{r['stored_tokens']:>10}{r['index_mb']:>12.2f}"
+              f"{r['build_seconds']:>11.2f}{r['hit_rate']:>8.2f}{r['prompt_tokens']:>12.0f}")
+
+    print("\n✅ Done")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Login throughput benchmark.
+
+Simulates a burst of concurrent logins (e.g. a shift change) and compares verifying
+passwords inline on the event loop with verifying them on the password executor.
+Besides login latency it measures how long the event loop stalls, which is what every
+other request waiting on the API feels.
+
+Usage:
+    python benchmark_login.py --logins 30 --rounds 12 --workers 2
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent password verification")
+    parser.add_argument("--logins", type=int, default=30, help="concurrent logins in the burst")
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost factor (BCRYPT_ROUNDS)")
+    parser.add_argument("--workers", type=int, default=2, help="password executor threads (PASSWORD_HASH_WORKERS)")
+    return parser.parse_args()
+
+
+async def monitor_loop(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Tick every `interval` seconds and return the longest stall of the event loop"""
+    max_stall = 0.0
+    last = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(interval)
+        now = time.perf_counter()
+        max_stall = max(max_stall, now - last - interval)
+        last = now
+    return max_stall
+
+
+async def run_burst(verify, logins: int, password: str, hashed: str) -> dict:
+    """Run `logins` concurrent verifications and collect latency and loop stall figures"""
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_loop(stop))
+    await asyncio.sleep(0)
+
+    # Latency counts from the start of the burst: all logins arrive at once
+    start = time.perf_counter()
+
+    async def login():
+        assert await verify(password, hashed)
+        return time.perf_counter() - start
+
+    latencies = await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    max_stall = await monitor
+
+    latencies = sorted(latencies)
+    return {
+        "elapsed": elapsed,
+        "throughput": logins / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[max(0, int(len(latencies) * 0.95) - 1)],
+        "max_stall": max_stall,
+    }
+
+
+def print_result(name: str, result: dict):
+    print(f"\n📊 {name}")
+    print(f"   Total time:      {result['elapsed']:.2f}s")
+    print(f"   Throughput:      {result['throughput']:.1f} logins/s")
+    print(f"   Latency p50/p95: {result['p50'] * 1000:.0f}ms / {result['p95'] * 1000:.0f}ms")
+    print(f"   Max loop stall:  {result['max_stall'] * 1000:.0f}ms")
+
+
+async def main():
+    args = parse_args()
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    os.environ["PASSWORD_HASH_WORKERS"] = str(args.workers)
+
+    from services.security import hash_password, verify_password, verify_password_async
+
+    print("🔐 Login throughput benchmark")
+    print("=" * 60)
+    print(f"   Logins: {args.logins}, bcrypt rounds: {args.rounds}, executor workers: {args.workers}")
+
+    password = "correct horse battery staple"
+    hashed = hash_password(password)
+
+    async def verify_inline(password, hashed):
+        return verify_password(password, hashed)
+
+    inline = await run_burst(verify_inline, args.logins, password, hashed)
+    print_result("Inline on the event loop (before)", inline)
+
+    executor = await run_burst(verify_password_async, args.logins, password, hashed)
+    print_result("Password executor (after)", executor)
+
+    print("\n✅ Done")
+    print(f"   Throughput change: {executor['throughput'] / inline['throughput']:.2f}x")
+    print(f"   Loop stall: {inline['max_stall'] * 1000:.0f}ms -> {executor['max_stall'] * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
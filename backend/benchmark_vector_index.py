@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Vector index benchmark.
+
+Builds every supported segment index type (flat, ivf, hnsw, pq) over a local synthetic
+corpus and reports build time, index size, query latency and recall@k against the
+exact flat baseline, sweeping nprobe (IVF/PQ) and efSearch (HNSW).
+
+No OpenAI calls are made: the corpus is clustered random vectors, which behave like
+embeddings of related documents.
+
+Usage:
+    python benchmark_vector_index.py --chunks 20000 --dimension 256 --queries 200 --k 10
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.vector_store import INDEX_TYPES, build_index, configure_search
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark FAISS index types against a flat baseline")
+    parser.add_argument("--chunks", type=int, default=20000, help="corpus size")
+    parser.add_argument("--dimension", type=int, default=256, help="embedding dimension")
+    parser.add_argument("--clusters", type=int, default=200, help="topics in the synthetic corpus")
+    parser.add_argument("--queries", type=int, default=200, help="number of queries")
+    parser.add_argument("--k", type=int, default=10, help="top k for recall@k")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32], help="IVF/PQ nprobe values")
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128], help="HNSW efSearch values")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+def synthetic_corpus(chunks: int, dimension: int, clusters: int, queries: int, seed: int):
+    """Normalized vectors scattered around random topic centers, plus held-out queries"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimension))
+    assignments = rng.integers(0, clusters, size=chunks + queries)
+    vectors = centers[assignments] + 0.35 * rng.normal(size=(chunks + queries, dimension))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors.astype(np.float32)
+    return vectors[:chunks], vectors[chunks:]
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(row) & set(expected)) for row, expected in zip(found, truth))
+    return hits / truth.size
+
+
+def time_queries(index, queries: np.ndarray, k: int):
+    start = time.perf_counter()
+    _, found = index.search(queries, k)
+    elapsed = time.perf_counter() - start
+    return found, elapsed / len(queries) * 1000
+
+
+def main():
+    args = parse_args()
+    faiss.omp_set_num_threads(1)  # per-query latency, like a single request
+
+    print("🧪 Vector index benchmark")
+    print("=" * 72)
+    print(f"   Corpus: {args.chunks} chunks x {args.dimension} dims, {args.queries} queries, k={args.k}")
+
+    corpus, queries = synthetic_corpus(args.chunks, args.dimension, args.clusters, args.queries, args.seed)
+
+    results = []
+    truth = None
+    for index_type in INDEX_TYPES:
+        start = time.perf_counter()
+        index, actual_type = build_index(corpus, index_type)
+        build_seconds = time.perf_counter() - start
+        size_mb = faiss.serialize_index(index).nbytes / 1024 / 1024
+
+        if actual_type != index_type:
+            print(f"\n⚠️ {index_type}: corpus too small to train, fell back to {actual_type}")
+            continue
+
+        if index_type == "flat":
+            truth, latency = time_queries(index, queries, args.k)
+            results.append((index_type, "-", build_seconds, size_mb, latency, 1.0))
+            continue
+
+        if index_type == "hnsw":
+            sweep = [("efSearch", value, {"ef_search": value}) for value in args.ef_search]
+        else:
+            sweep = [("nprobe", value, {"nprobe": value}) for value in args.nprobe]
+
+        for name, value, params in sweep:
+            configure_search(index, **params)
+            found, latency = time_queries(index, queries, args.k)
+            results.append((index_type, f"{name}={value}", build_seconds, size_mb, latency, recall_at_k(found, truth)))
+
+    print(f"\n{'index':<8}{'params':<16}{'build (s)':>10}{'size (MB)':>11}{'ms/query':>10}{'recall@' + str(args.k):>11}")
+    print("-" * 66)
+    for index_type, params, build_seconds, size_mb, latency, recall in results:
+        print(f"{index_type:<8}{params:<16}{build_seconds:>10.2f}{size_mb:>11.1f}{latency:>10.3f}{recall:>11.3f}")
+
+    print("\n✅ Done")
+
+
+if __name__ == "__main__":
+    main()
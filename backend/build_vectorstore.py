@@ -8,11 +8,11 @@ import os
 import sys
 from pathlib import Path
 from langchain.schema import Document
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
-from langchain.text_splitter import CharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import OpenAIEmbeddings
 from dotenv import load_dotenv
+from services.document_ingestion import ingest_files, is_loadable
+from services.embedding_pipeline import create_embeddings
+from services.chunking import source_hash
+from services.vector_store import SegmentedVectorStore
 import logging
 
 # Load environment variables
@@ -35,54 +35,61 @@ def build_vectorstore(data_folder="data", persist_folder="vectorstore"):
         logger.error(f"Data folder '{data_folder}' does not exist!")
         return False
     
-    documents = []
+    # Create embeddings and open the segmented vectorstore (legacy FAISS folders are converted)
+    embeddings = create_embeddings()  # batched, cached; only new chunks are embedded
+    if os.path.exists(os.path.join(persist_folder, "index.pkl")):
+        vectorstore = SegmentedVectorStore.migrate_langchain_faiss(persist_folder, embeddings)
+    else:
+        vectorstore = SegmentedVectorStore(persist_folder, embeddings)
+    
+    jobs = []
+    file_hashes = {}
     
-    # Process all files in the data folder
+    # Hash every file in the data folder; only new or changed ones are parsed
     for filename in os.listdir(data_folder):
         file_path = os.path.join(data_folder, filename)
         
         if os.path.isfile(file_path):
+            if not is_loadable(filename):
+                logger.warning(f"Skipping unsupported file type: {filename}")
+                continue
             try:
-                logger.info(f"Processing file: {filename}")
-                
-                if filename.endswith(".txt"):
-                    loader = TextLoader(file_path, encoding="utf-8")
-                    documents.extend(loader.load())
-                    
-                elif filename.endswith(".pdf"):
-                    loader = PyPDFLoader(file_path)
-                    documents.extend(loader.load())
-                    
-                elif filename.endswith(".md"):
-                    loader = TextLoader(file_path, encoding="utf-8")
-                    documents.extend(loader.load())
-                    
-                else:
-                    logger.warning(f"Skipping unsupported file type: {filename}")
+                with open(file_path, "rb") as f:
+                    file_hashes[file_path] = source_hash(f.read())  # content + chunker settings
+                if vectorstore.is_source_current(file_path, file_hashes[file_path]):
+                    logger.info(f"Unchanged, skipping: {filename}")
+                    continue
+                jobs.append({"source": file_path, "path": file_path, "metadata": {"filename": filename}})
                     
             except Exception as e:
                 logger.error(f"Error processing {filename}: {str(e)}")
                 continue
     
-    if not documents:
+    if not file_hashes:
         logger.warning("No documents found to process!")
         return False
     
-    logger.info(f"Found {len(documents)} documents to process")
+    logger.info(f"Found {len(jobs)} new or changed documents to process")
     
-    # Split documents into chunks
-    splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    texts = splitter.split_documents(documents)
+    # Load and split files in parallel; each is embedded and indexed as soon as it's ready
+    total_chunks = 0
+    for job, texts, error in ingest_files(jobs):
+        if error is not None:
+            continue
+        logger.info(f"Processing file: {job['metadata']['filename']}")
+        vectorstore.add_source(job["source"], texts, source_hash=file_hashes[job["source"]])
+        total_chunks += len(texts)
     
-    logger.info(f"Split into {len(texts)} chunks")
+    logger.info(f"Split into {total_chunks} chunks")
     
-    # Create embeddings and vectorstore
-    embeddings = OpenAIEmbeddings()
-    vectorstore = FAISS.from_documents(texts, embeddings)
+    # Drop files that were removed from the data folder
+    for manifest in vectorstore.list_sources():
+        if manifest["source"].startswith(data_folder + os.sep) and manifest["source"] not in file_hashes:
+            vectorstore.delete_source(manifest["source"])
     
-    # Save vectorstore
-    vectorstore.save_local(persist_folder)
+    vectorstore.compact()
     logger.info(f"✅ Vector store saved to: {persist_folder}/")
+    logger.info(f"📊 Embedding cache: {embeddings.stats()}")
     
     return True
 
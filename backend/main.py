@@ -1,13 +1,18 @@
 import os
 import time
-from fastapi import FastAPI, Request
+import asyncio
+from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 from logging_config import setup_logging
+from services.llm_rate_limiter import get_rate_limiter
+from services.openai_client import close_async_client
+from services.rag_service import get_rag_status, start_rag_initialization
 from routers import auth_route, user_router, document_router, followup_router, case_router, anonymization_router, rag_router
+from routers.auth_route import get_current_admin_user
 
 # Load environment variables
 load_dotenv()
@@ -106,6 +111,10 @@ if ENVIRONMENT == "production":
 # Startup event
 @app.on_event("startup")
 async def startup_event():
+    # Load the RAG index in the background so startup doesn't wait on corpus size;
+    # /api/rag/* answers 503 until it's ready
+    app.state.rag_init_task = start_rag_initialization()
+
     try:
         # Initialize Supabase client instead of SQLAlchemy
         from supabase_client import initialize_supabase, test_supabase_connection
@@ -120,12 +129,26 @@ async def startup_event():
                 logger.info("Supabase connection test successful")
             else:
                 logger.warning("[!] Supabase connection test failed")
+            
+            # Expire old report batches in the background
+            from services.daily_service_supabase import run_batch_pruning
+            app.state.batch_pruning_task = asyncio.create_task(run_batch_pruning())
         else:
             logger.warning("[!] Supabase client initialization failed")
             
     except Exception as e:
         logger.error(f"Supabase initialization failed: {e}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    pruning_task = getattr(app.state, "batch_pruning_task", None)
+    if pruning_task:
+        pruning_task.cancel()
+    rag_init_task = getattr(app.state, "rag_init_task", None)
+    if rag_init_task:
+        rag_init_task.cancel()
+    await close_async_client()
+
 # Routers
 app.include_router(auth_route.router, prefix="/api", tags=["Authentication"])
 app.include_router(user_router.router, prefix="/api", tags=["Users"])
@@ -151,6 +174,7 @@ def api_health_check():
         "environment": ENVIRONMENT,
         "database": "available" if os.environ.get("SUPABASE_URL") else "unavailable",
         "cors_origins": origins,
+        "rag": get_rag_status()["status"],
         "timestamp": time.time()
     }
 
@@ -159,6 +183,11 @@ def ping():
     """Simple ping endpoint for testing connectivity"""
     return {"message": "pong", "timestamp": time.time()}
 
+@app.get("/api/metrics/llm")
+def llm_metrics(current_user = Depends(get_current_admin_user)):
+    """OpenAI rate limit budget, queue depth and queue wait times per priority (admin only)"""
+    return get_rate_limiter().stats()
+
 @app.get("/api/health")
 def health_check():
     """Comprehensive health check endpoint"""
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, Enum, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, Enum, Boolean, Index
 from sqlalchemy.orm import relationship
 from enum import Enum as PyEnum
 from db import Base  # import Base from db.py
@@ -43,6 +43,13 @@ class Case(Base):
     membership = Column(String(255))
     case_description = Column(Text)
     in_out = Column(String(255))
+    batch_id = Column(String(20), index=True)  # Report batch (report date, YYYY-MM-DD)
+    case_key = Column(String(64))  # Identity of the case across uploads of a report
+    content_hash = Column(String(64))  # Hash of the mutable fields, detects changed cases
+
+    __table_args__ = (
+        Index("ux_cases_batch_id_case_key", "batch_id", "case_key", unique=True),
+    )
 
     owner = relationship("User", back_populates="cases")
     followups = relationship("Followup", back_populates="case")
@@ -58,6 +65,8 @@ class Followup(Base):
     case_id = Column(Integer, ForeignKey("cases.id"))
     suggestion_text = Column(Text, nullable=False)
     assigned_to = Column(Integer, ForeignKey("users.id"), nullable=True)
+    batch_id = Column(String(20), index=True)  # Report batch of the case
+    is_ai_generated = Column(Boolean, default=False, nullable=False)  # Refreshed on re-upload; hand-made ones never are
 
     # Relationships
     case = relationship("Case", back_populates="followups")
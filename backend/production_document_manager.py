@@ -9,13 +9,17 @@ import sys
 import json
 import tempfile
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Tuple
 from langchain.schema import Document
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
-from langchain.text_splitter import CharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import OpenAIEmbeddings
 from dotenv import load_dotenv
+from services.document_ingestion import ingest_files, is_loadable
+from services.embedding_pipeline import create_embeddings
+from services.storage_sync import (
+    SNAPSHOT_NAME, SupabaseBucket, download_file, export_snapshot, import_snapshot,
+    pull_index, push_index, read_sync_manifest
+)
+from services.chunking import source_hash
+from services.vector_store import SegmentedVectorStore
 import logging
 from supabase import create_client, Client
 
@@ -29,18 +33,25 @@ logger = logging.getLogger(__name__)
 class ProductionDocumentManager:
     """Manages documents in production using Supabase Storage"""
     
-    def __init__(self):
+    def __init__(self, storage=None):
+        """`storage` replaces the Supabase bucket, e.g. a LocalBucket for tests and offline runs"""
         self.supabase_url = os.getenv("SUPABASE_URL")
         self.supabase_key = os.getenv("SUPABASE_KEY")
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
+        self.embeddings = create_embeddings()  # batched, cached; only new chunks are embedded
+        self.bucket_name = "ai-training-docs"
+        self.vectorstore_folder = "vectorstore"
+        
+        if storage is not None:
+            self.supabase = None
+            self.storage = storage
+            return
         
         if not all([self.supabase_url, self.supabase_key, self.openai_api_key]):
             raise ValueError("Missing required environment variables: SUPABASE_URL, SUPABASE_KEY, OPENAI_API_KEY")
         
         self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
-        self.embeddings = OpenAIEmbeddings()
-        self.bucket_name = "ai-training-docs"
-        self.vectorstore_folder = "vectorstore"
+        self.storage = SupabaseBucket(self.supabase, self.bucket_name)
         
     def ensure_bucket_exists(self):
         """Ensure the storage bucket exists"""
@@ -63,15 +74,8 @@ class ProductionDocumentManager:
     def upload_document_to_storage(self, file_path: str, filename: str) -> bool:
         """Upload a document to Supabase Storage"""
         try:
-            with open(file_path, 'rb') as f:
-                file_data = f.read()
-            
-            # Upload to storage
-            response = self.supabase.storage.from_(self.bucket_name).upload(
-                path=filename,
-                file=file_data,
-                file_options={"content-type": "application/octet-stream"}
-            )
+            # Upload to storage (replaces an older version; the next sync re-indexes it)
+            self.storage.upload_file(filename, file_path)
             
             logger.info(f"✅ Uploaded {filename} to storage")
             return True
@@ -80,109 +84,135 @@ class ProductionDocumentManager:
             logger.error(f"❌ Failed to upload {filename}: {e}")
             return False
     
+    def _storage_download_job(self, filename: str, temp_dir: str) -> Dict[str, Any]:
+        """Ingestion job that downloads one file from storage into temp_dir"""
+        job = {
+            "source": filename,
+            "metadata": {"source": filename, "filename": filename, "storage_type": "supabase"}
+        }
+        
+        def fetch() -> str:
+            file_data = self.storage.download(filename)
+            job["metadata"]["file_hash"] = source_hash(file_data)  # content + chunker settings
+            file_path = os.path.join(temp_dir, filename)
+            with open(file_path, 'wb') as f:
+                f.write(file_data)
+            return file_path
+        
+        job["fetch"] = fetch
+        return job
+    
+    def iter_storage_documents(self, temp_dir: str, split: bool = True) -> Iterator[Tuple[str, List[Document]]]:
+        """Download, load and split every document in storage concurrently, yielding
+        (filename, docs) per file as soon as it's ready"""
+        jobs = [self._storage_download_job(filename, temp_dir)
+                for filename in self.storage.list_files() if is_loadable(filename)]
+        
+        for job, docs, error in ingest_files(jobs, split=split):
+            if error is not None:
+                continue  # logged by ingest_files
+            logger.info(f"✅ Processed {job['source']}")
+            yield job['source'], docs
+    
+    def sync_documents_from_storage(self, vectorstore: SegmentedVectorStore, temp_dir: str) -> Dict[str, Dict[str, str]]:
+        """Bring the vectorstore in line with the documents in storage.
+        
+        Only documents whose ETag changed since the last sync (or that aren't indexed) are
+        downloaded, parsed and embedded; documents removed from storage are dropped.
+        Returns the ETag and content hash of every indexed document, for the sync manifest.
+        """
+        remote = {name: info for name, info in self.storage.list_files().items() if is_loadable(name)}
+        known = read_sync_manifest(vectorstore.folder).get("documents", {})
+        documents = {}
+        jobs = []
+        
+        for filename, info in remote.items():
+            state = known.get(filename)
+            if (state and info["etag"] and state["etag"] == info["etag"]
+                    and vectorstore.is_source_current(filename, state["file_hash"])):
+                documents[filename] = state
+            else:
+                jobs.append(self._storage_download_job(filename, temp_dir))
+        
+        logger.info(f"📚 {len(jobs)} new or changed documents, {len(documents)} unchanged")
+        
+        # Downloaded, parsed and split in parallel; each is indexed as soon as it's ready
+        for job, texts, error in ingest_files(jobs):
+            if error is not None:
+                continue  # logged by ingest_files; retried on the next sync
+            file_hash_value = job["metadata"]["file_hash"]
+            result = vectorstore.add_source(job["source"], texts, source_hash=file_hash_value)
+            documents[job["source"]] = {"etag": remote[job["source"]]["etag"], "file_hash": file_hash_value}
+            logger.info(f"✅ {job['source']}: {result['status']}, {result['embedded']} chunks embedded")
+        
+        # Drop sources that are no longer in storage
+        for manifest in vectorstore.list_sources():
+            if manifest['source'] not in remote:
+                removed = vectorstore.delete_source(manifest['source'])
+                logger.info(f"🗑️ Removed {removed} chunks of {manifest['source']}")
+        
+        return documents
+    
     def download_documents_from_storage(self) -> List[Document]:
         """Download all documents from Supabase Storage and convert to Langchain Documents"""
         documents = []
         
         try:
-            # List all files in the bucket
-            files = self.supabase.storage.from_(self.bucket_name).list()
+            with tempfile.TemporaryDirectory() as temp_dir:
+                for _, docs in self.iter_storage_documents(temp_dir, split=False):
+                    documents.extend(docs)
             
-            if not files:
+            if not documents:
                 logger.info("No documents found in storage")
-                return documents
-            
-            # Create temporary directory for downloaded files
-            with tempfile.TemporaryDirectory() as temp_dir:
-                for file_info in files:
-                    filename = file_info['name']
-                    file_path = os.path.join(temp_dir, filename)
-                    
-                    try:
-                        # Download file
-                        file_data = self.supabase.storage.from_(self.bucket_name).download(filename)
-                        
-                        # Save to temporary file
-                        with open(file_path, 'wb') as f:
-                            f.write(file_data)
-                        
-                        # Load document based on file type
-                        if filename.endswith('.txt') or filename.endswith('.md'):
-                            loader = TextLoader(file_path, encoding='utf-8')
-                            docs = loader.load()
-                            # Add metadata about source
-                            for doc in docs:
-                                doc.metadata['source'] = filename
-                                doc.metadata['storage_type'] = 'supabase'
-                            documents.extend(docs)
-                            
-                        elif filename.endswith('.pdf'):
-                            loader = PyPDFLoader(file_path)
-                            docs = loader.load()
-                            # Add metadata about source
-                            for doc in docs:
-                                doc.metadata['source'] = filename
-                                doc.metadata['storage_type'] = 'supabase'
-                            documents.extend(docs)
-                        
-                        logger.info(f"✅ Processed {filename}")
-                        
-                    except Exception as e:
-                        logger.error(f"❌ Failed to process {filename}: {e}")
-                        continue
             
         except Exception as e:
             logger.error(f"❌ Failed to download documents from storage: {e}")
         
         return documents
     
-    def upload_vectorstore_to_storage(self, vectorstore_path: str):
-        """Upload the built vectorstore to Supabase Storage"""
+    def upload_vectorstore_to_storage(self, vectorstore_path: str, documents: Dict[str, Dict[str, str]] = None):
+        """Upload the vectorstore segments that changed since the copy in Supabase Storage"""
         try:
-            # Create a zip file of the vectorstore
-            import zipfile
-            import shutil
-            
-            with tempfile.NamedTemporaryFile(suffix='.zip', delete=False) as temp_zip:
-                with zipfile.ZipFile(temp_zip.name, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    for root, dirs, files in os.walk(vectorstore_path):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            arcname = os.path.relpath(file_path, vectorstore_path)
-                            zipf.write(file_path, arcname)
-                
-                # Upload zip file
-                with open(temp_zip.name, 'rb') as f:
-                    zip_data = f.read()
-                
-                self.supabase.storage.from_(self.bucket_name).upload(
-                    path="vectorstore.zip",
-                    file=zip_data,
-                    file_options={"content-type": "application/zip"}
-                )
-                
-                logger.info("✅ Uploaded vectorstore to storage")
-                
-                # Clean up temp file
-                os.unlink(temp_zip.name)
+            result = push_index(self.storage, vectorstore_path, prefix=self.vectorstore_folder, documents=documents)
+            logger.info(f"✅ Uploaded vectorstore to storage: {result['uploaded']} files uploaded, "
+                        f"{result['unchanged']} unchanged, {result['removed']} removed")
                 
         except Exception as e:
             logger.error(f"❌ Failed to upload vectorstore: {e}")
             raise
     
+    def upload_vectorstore_snapshot(self, vectorstore_path: str) -> Dict[str, Any]:
+        """Upload the whole vectorstore as one streamed tar.gz artifact with a sha256 sidecar"""
+        try:
+            result = export_snapshot(self.storage, vectorstore_path, SNAPSHOT_NAME)
+            logger.info(f"✅ Uploaded vectorstore snapshot: {result['bytes'] / 1024 / 1024:.1f} MB")
+            return result
+        except Exception as e:
+            logger.error(f"❌ Failed to upload vectorstore snapshot: {e}")
+            raise
+    
     def download_vectorstore_from_storage(self, local_path: str) -> bool:
-        """Download and extract vectorstore from Supabase Storage"""
+        """Download the vectorstore files that differ from the local copy"""
         try:
-            # Download vectorstore zip
-            zip_data = self.supabase.storage.from_(self.bucket_name).download("vectorstore.zip")
+            result = pull_index(self.storage, local_path, prefix=self.vectorstore_folder)
+            if result is not None:
+                logger.info(f"✅ Downloaded vectorstore from storage: {result['downloaded']} files downloaded, "
+                            f"{result['unchanged']} unchanged")
+                return True
             
-            # Extract to local path
+            # Full snapshot, extracted while it downloads
+            if SNAPSHOT_NAME in self.storage.list_files():
+                import_snapshot(self.storage, local_path, SNAPSHOT_NAME)
+                logger.info("✅ Restored vectorstore snapshot from storage")
+                return True
+            
+            # Indexes uploaded before segment sync were a single zip; zip needs random
+            # access, so it is streamed to a temp file first
             import zipfile
-            with tempfile.NamedTemporaryFile(suffix='.zip') as temp_zip:
-                temp_zip.write(zip_data)
-                temp_zip.flush()
-                
-                with zipfile.ZipFile(temp_zip.name, 'r') as zipf:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                zip_path = os.path.join(temp_dir, "vectorstore.zip")
+                download_file(self.storage, "vectorstore.zip", zip_path)
+                with zipfile.ZipFile(zip_path, 'r') as zipf:
                     zipf.extractall(local_path)
             
             logger.info("✅ Downloaded and extracted vectorstore from storage")
@@ -197,30 +227,22 @@ class ProductionDocumentManager:
         try:
             logger.info("🔄 Building vectorstore from Supabase Storage...")
             
-            # Download documents from storage
-            documents = self.download_documents_from_storage()
+            if os.path.exists(os.path.join(persist_folder, "index.pkl")):
+                vectorstore = SegmentedVectorStore.migrate_langchain_faiss(persist_folder, self.embeddings)
+            else:
+                vectorstore = SegmentedVectorStore(persist_folder, self.embeddings)
+            with tempfile.TemporaryDirectory() as temp_dir:
+                documents = self.sync_documents_from_storage(vectorstore, temp_dir)
             
             if not documents:
                 logger.warning("No documents found in storage")
                 return False
             
-            logger.info(f"📚 Found {len(documents)} documents to process")
+            # No forced compaction: it would rewrite (and re-upload) every segment
+            logger.info(f"💾 Saved vectorstore locally to: {persist_folder}/ ({vectorstore.count()} chunks)")
             
-            # Split documents into chunks
-            splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-            texts = splitter.split_documents(documents)
-            
-            logger.info(f"✂️ Split into {len(texts)} chunks")
-            
-            # Create vectorstore
-            vectorstore = FAISS.from_documents(texts, self.embeddings)
-            
-            # Save locally
-            vectorstore.save_local(persist_folder)
-            logger.info(f"💾 Saved vectorstore locally to: {persist_folder}/")
-            
-            # Upload to storage
-            self.upload_vectorstore_to_storage(persist_folder)
+            # Upload only the segments that changed
+            self.upload_vectorstore_to_storage(persist_folder, documents)
             
             return True
             
@@ -231,14 +253,12 @@ class ProductionDocumentManager:
     def load_vectorstore_from_storage(self, persist_folder: str = "vectorstore") -> bool:
         """Load vectorstore from Supabase Storage"""
         try:
-            # Try to download vectorstore from storage
+            # Start from the index in storage, if any, then index only documents that changed since
             if self.download_vectorstore_from_storage(persist_folder):
                 logger.info("✅ Loaded vectorstore from Supabase Storage")
-                return True
             else:
-                # If no vectorstore in storage, try to build from documents
                 logger.info("🔄 No vectorstore in storage, building from documents...")
-                return self.build_vectorstore_from_storage(persist_folder)
+            return self.build_vectorstore_from_storage(persist_folder)
                 
         except Exception as e:
             logger.error(f"❌ Failed to load vectorstore from storage: {e}")
@@ -258,6 +278,10 @@ def main():
         # Build vectorstore from storage
         success = manager.build_vectorstore_from_storage()
         
+        if success and "--snapshot" in sys.argv:
+            # Optional full artifact, e.g. for backups or seeding a fresh environment
+            manager.upload_vectorstore_snapshot(manager.vectorstore_folder)
+        
         if success:
             print("\n✅ Production vectorstore build completed successfully!")
             print("The AI assistant now has access to training documents from Supabase Storage.")
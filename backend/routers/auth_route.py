@@ -1,9 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from services.database_service import get_db_service
-from services.user_service_supabase import authenticate_user, create_user, get_user_by_username
+from services.user_service_supabase import authenticate_user, create_user, get_user_by_username, get_principal
 from schemas.user import UserCreate, UserResponse
-from services.security import create_access_token, decode_token
+from services.security import create_access_token, decode_token, principal_claims, principal_from_claims, TRUST_TOKEN_CLAIMS
 from typing import List
 import logging
 
@@ -22,7 +22,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db_service = D
                 detail="Invalid credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        token = create_access_token({"sub": user["username"], "is_admin": user["is_admin"], "user_id": user["id"]})
+        token = create_access_token(principal_claims(user))
         return {"access_token": token, "token_type": "bearer", "user": user}
     except HTTPException:
         # Re-raise HTTP exceptions as they are
@@ -62,8 +62,12 @@ async def register(user: UserCreate, db_service = Depends(get_db_service)):
     
     return await create_user(user)
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db_service = Depends(get_db_service)):
-    """Get current authenticated user"""
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    """Get current authenticated user.
+
+    Served from the signed claims when TRUST_TOKEN_CLAIMS is on, otherwise from the
+    principal cache (one Supabase lookup per user per TTL).
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -78,7 +82,12 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db_service = Dep
     if username is None:
         raise credentials_exception
     
-    user = await get_user_by_username(username)
+    if TRUST_TOKEN_CLAIMS:
+        principal = principal_from_claims(payload)
+        if principal is not None:
+            return principal
+    
+    user = await get_principal(username, payload.get("user_id"))
     if user is None:
         raise credentials_exception
     
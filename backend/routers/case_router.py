@@ -206,11 +206,13 @@ async def read_cases_with_followups(db_service = Depends(get_db_service)):
 
 @router.post("/reset-daily")
 async def reset_daily_cases_endpoint(
+    dry_run: bool = False,
     db_service = Depends(get_db_service),
     current_user = Depends(get_current_admin_user)
 ):
-    """Reset all cases, followups, and tasks for a new day (admin only)"""
-    result = await reset_daily_cases()
+    """Reset all cases, followups, and tasks for a new day (admin only).
+    Pass dry_run=true to get the counts without changing anything."""
+    result = await reset_daily_cases(dry_run=dry_run)
     return result
 
 # Parameterized routes must come LAST
@@ -5,14 +5,15 @@ from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
 from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from db import get_db
-from services.document_service import process_document
-from services.ai_service import suggest_feedback
-from services.case_service_supabase import bulk_create_cases
-from services.followup_service_supabase import create_followup
+from services.document_service import process_document_async
+from services.ai_service import FALLBACK_SUGGESTION_TEXT, is_fallback_suggestion, suggest_feedback
+from services.case_service_supabase import plan_case_upsert, apply_case_upsert, compute_case_key
+from services.followup_service_supabase import save_case_followup
+from services.daily_service_supabase import get_batch_id
 from schemas.case import CaseCreate
-from schemas.followup import FollowupCreate
 from pydantic import BaseModel
 from typing import List, Optional, Callable
+from datetime import date
 import json
 import asyncio
 
@@ -52,13 +53,80 @@ class CompleteWorkflowResponse(BaseModel):
     followups_created: int
     final_message: str
 
+def build_case_objects(cases_data: List[dict]) -> List[CaseCreate]:
+    """Map parsed cases onto CaseCreate, tagged with their identity key across uploads"""
+    case_objects = []
+    for case_data in cases_data:
+        # Ensure title is never empty
+        title = case_data.get("title") or case_data.get("case") or "Untitled Case"
+        
+        # Map the data properly, handling potential field name mismatches
+        case_objects.append(CaseCreate(
+            room=case_data.get("room"),
+            status=case_data.get("status") or "pending",
+            importance=case_data.get("importance") or "medium",
+            type=case_data.get("type") or "other",
+            title=title,
+            action=case_data.get("action") or case_data.get("action_text"),
+            created=case_data.get("created"),
+            created_by=case_data.get("created_by"),
+            modified=case_data.get("modified"),
+            modified_by=case_data.get("modified_by"),
+            source=case_data.get("source"),
+            membership=case_data.get("membership"),
+            case_description=case_data.get("case_description"),
+            in_out=case_data.get("in_out"),
+            owner_id=None,  # Explicitly set to None for now
+            case_key=compute_case_key(case_data)
+        ))
+    return case_objects
+
+async def save_followups(case_plan: dict, saved_cases: List[dict], ai_suggestions: List[dict],
+                         timeout: Optional[float] = None) -> int:
+    """Store the AI suggestion of every saved case; changed cases get their followup refreshed.
+
+    ai_suggestions are aligned with case_plan["pending"] (the cases sent to the AI).
+    """
+    rows = case_plan["rows"]
+    suggestions_by_key = {
+        rows[i]["case_key"]: suggestion
+        for i, suggestion in zip(case_plan["pending"], ai_suggestions)
+    }
+    changed_keys = {rows[i]["case_key"] for i in case_plan["changed"]}
+    
+    followups_saved = 0
+    for case in saved_cases:
+        suggestion = suggestions_by_key.get(case["case_key"])
+        if suggestion is None:
+            continue
+        try:
+            result = await asyncio.wait_for(
+                save_case_followup(
+                    case["id"],
+                    suggestion.get("suggestion_text", "No AI suggestion available"),
+                    batch_id=case_plan["batch_id"],
+                    replace_existing=case["case_key"] in changed_keys,
+                    is_fallback=is_fallback_suggestion(suggestion)
+                ),
+                timeout=timeout
+            )
+            if result:
+                followups_saved += 1
+            else:
+                logger.error(f"Failed to save followup for case {case['id']}")
+        except asyncio.TimeoutError:
+            logger.error(f"Followup creation timed out for case {case['id']}")
+        except Exception as e:
+            logger.error(f"Error creating followup for case {case['id']}: {e}")
+    return followups_saved
+
 import time
 
 @router.post("/upload", response_model=DocumentUploadResponse)
 async def upload_document(file: UploadFile = File(...)):
     """
     Upload a PDF or DOCX file, process it, and return structured cases as JSON.
-    This endpoint now automatically clears existing data before processing the new document.
+    Nothing is written to the database, so existing data is left untouched.
     """
     start_time = time.time()
     
@@ -70,40 +138,8 @@ async def upload_document(file: UploadFile = File(...)):
         )
     
     try:
-        # Step 0: Clear all previous data before processing new document
-        from services.daily_service_supabase import clear_all_data, verify_data_cleared
-        
-        try:
-            # Clear data and wait for completion
-            clear_result = await clear_all_data()
-            print(f"✅ Data cleared successfully: {clear_result['message']}")
-            
-            # Wait a moment for database to settle
-            import asyncio
-            await asyncio.sleep(1)
-            
-            # Verify data is actually cleared
-            verification = await verify_data_cleared()
-            if verification['is_cleared']:
-                print(f"✅ Verification passed: Database is empty")
-            else:
-                print(f"⚠️ Warning: {verification['message']}")
-                # If verification fails, try clearing again
-                if verification['total_remaining'] > 0:
-                    print(f"🔄 Retrying data clearance...")
-                    await clear_all_data()
-                    await asyncio.sleep(1)
-                    verification = await verify_data_cleared()
-                    if verification['is_cleared']:
-                        print(f"✅ Second clearance attempt successful")
-                    else:
-                        print(f"❌ Failed to clear data after retry: {verification['message']}")
-        except Exception as clear_error:
-            print(f"⚠️ Warning: Could not clear existing data: {clear_error}")
-            # Continue with upload even if clearing fails
-        
         # Step 1: Process the document (optimized)
-        raw_cases = process_document(file)
+        raw_cases = await process_document_async(file)
         
         # Convert raw cases to API format
         api_cases = []
@@ -147,7 +183,8 @@ async def upload_document(file: UploadFile = File(...)):
 @router.post("/streamlined-workflow", response_model=CompleteWorkflowResponse)
 async def streamlined_workflow(
     file: UploadFile = File(...),
-    create_cases: bool = False
+    create_cases: bool = False,
+    report_date: Optional[date] = None
 ):
     """
     Streamlined workflow: Upload PDF → Process → AI Feedback (automated, no manual review)
@@ -156,40 +193,17 @@ async def streamlined_workflow(
     steps = []
     
     try:
-        # Step 0: Clear all previous data
-        from services.daily_service_supabase import clear_all_data, verify_data_cleared
-        
-        clear_result = await clear_all_data()
+        # Step 0: Assign the upload to its report batch (uploads are appends, nothing is cleared)
+        batch_id = get_batch_id(report_date)
         steps.append(WorkflowStep(
-            step="Data Clearance",
+            step="Batch Assignment",
             status="success",
-            message=clear_result["message"],
-            data=clear_result
+            message=f"Upload assigned to report batch {batch_id}",
+            data={"batch_id": batch_id}
         ))
         
-        # Wait a moment for database to settle
-        import asyncio
-        await asyncio.sleep(1)
-        
-        # Verify data is actually cleared
-        verification = await verify_data_cleared()
-        if verification['is_cleared']:
-            steps.append(WorkflowStep(
-                step="Data Verification",
-                status="success",
-                message="Database verified empty - ready for new data",
-                data=verification
-            ))
-        else:
-            steps.append(WorkflowStep(
-                step="Data Verification",
-                status="warning",
-                message=f"Warning: {verification['message']}",
-                data=verification
-            ))
-        
         # Step 1: Process PDF and extract cases
-        cases_data = process_document(file)
+        cases_data = await process_document_async(file)
         
         if not cases_data:
             steps.append(WorkflowStep(
@@ -213,14 +227,24 @@ async def streamlined_workflow(
             data={"cases_count": len(cases_data), "cases": cases_data}
         ))
         
-        # Step 2: Generate AI Feedback (automated)
+        # Step 1b: Compare with the batch - re-uploads only process new or changed cases
+        case_plan = await plan_case_upsert(build_case_objects(cases_data), batch_id)
+        cases_to_process = [cases_data[i] for i in case_plan["pending"]]
+        steps.append(WorkflowStep(
+            step="Change Detection",
+            status="success",
+            message=case_plan["summary"]["message"],
+            data=case_plan["summary"]
+        ))
+        
+        # Step 2: Generate AI Feedback (automated, new and changed cases only)
         try:
             from services.ai_service import suggest_feedback, check_openai_available
             
             # Check if OpenAI is available
             is_available, message = check_openai_available()
             if is_available:
-                ai_suggestions = suggest_feedback(cases_data)
+                ai_suggestions = await suggest_feedback(cases_to_process)
                 steps.append(WorkflowStep(
                     step="AI Feedback",
                     status="success",
@@ -232,11 +256,11 @@ async def streamlined_workflow(
                 ai_suggestions = [
                     {
                         "case_id": i,
-                        "suggestion_text": "Please review this case and determine appropriate follow-up action.",
+                        "suggestion_text": FALLBACK_SUGGESTION_TEXT,
                         "confidence": 0.0,
                         "case_data": case
                     }
-                    for i, case in enumerate(cases_data)
+                    for i, case in enumerate(cases_to_process)
                 ]
                 steps.append(WorkflowStep(
                     step="AI Feedback",
@@ -250,11 +274,11 @@ async def streamlined_workflow(
             ai_suggestions = [
                 {
                     "case_id": i,
-                    "suggestion_text": "Please review this case and determine appropriate follow-up action.",
+                    "suggestion_text": FALLBACK_SUGGESTION_TEXT,
                     "confidence": 0.0,
                     "case_data": case
                 }
-                for i, case in enumerate(cases_data)
+                for i, case in enumerate(cases_to_process)
             ]
             steps.append(WorkflowStep(
                 step="AI Feedback",
@@ -263,70 +287,39 @@ async def streamlined_workflow(
                 data={"suggestions_count": len(ai_suggestions), "suggestions": ai_suggestions}
             ))
         
-        # Step 3: Create Cases in Database (only if create_cases is True)
+        # Step 3: Upsert Cases in Database (only if create_cases is True)
         created_cases = []
+        followups_created = 0
         if create_cases:
-            case_objects = []
-            for case_data in cases_data:
-                # Ensure title is never empty
-                title = case_data.get("title") or case_data.get("case") or "Untitled Case"
-                
-                # Map the data properly, handling potential field name mismatches
-                case_obj = CaseCreate(
-                    room=case_data.get("room"),
-                    status=case_data.get("status") or "pending",
-                    importance=case_data.get("importance") or "medium",
-                    type=case_data.get("type") or "other",
-                    title=title,
-                    action=case_data.get("action") or case_data.get("action_text"),
-                    created=case_data.get("created"),
-                    created_by=case_data.get("created_by"),
-                    modified=case_data.get("modified"),
-                    modified_by=case_data.get("modified_by"),
-                    source=case_data.get("source"),
-                    membership=case_data.get("membership"),
-                    case_description=case_data.get("case_description"),
-                    in_out=case_data.get("in_out"),
-                    owner_id=None  # Explicitly set to None for now
-                )
-                
-                case_objects.append(case_obj)
-            
-            created_cases = await bulk_create_cases(case_objects)
+            upsert_result = await apply_case_upsert(case_plan)
+            created_cases = upsert_result["saved"]
             
             steps.append(WorkflowStep(
                 step="Case Creation",
                 status="success",
-                message=f"Created {len(created_cases)} cases in database",
-                data={"cases_created": len(created_cases), "cases": cases_data}
+                message=f"Created {len(upsert_result['created'])} and updated {len(upsert_result['updated'])} cases in database ({len(upsert_result['unchanged'])} unchanged)",
+                data={
+                    "cases_created": len(upsert_result["created"]),
+                    "cases_updated": len(upsert_result["updated"]),
+                    "cases_unchanged": len(upsert_result["unchanged"]),
+                    "cases": cases_to_process
+                }
             ))
             
             # Step 4: Create Followups with AI Suggestions
-            followups_created = 0
-            for i, case in enumerate(created_cases):
-                if i < len(ai_suggestions):
-                    try:
-                        followup_data = FollowupCreate(
-                            case_id=case['id'],
-                            suggestion_text=ai_suggestions[i].get("suggestion_text", "No AI suggestion available")
-                        )
-                        result = await create_followup(followup_data)
-                        if result:
-                            followups_created += 1
-                    except Exception as e:
-                        logger.error(f"Error creating followup for case {case['id']}: {e}")
+            followups_created = await save_followups(case_plan, created_cases, ai_suggestions)
             
             steps.append(WorkflowStep(
                 step="Followup Creation",
                 status="success",
-                message=f"Created {followups_created} followups with AI suggestions",
+                message=f"Saved {followups_created} followups with AI suggestions",
                 data={"followups_created": followups_created}
             ))
         
         return CompleteWorkflowResponse(
             steps=steps,
             cases_created=len(created_cases),
-            followups_created=followups_created if create_cases else 0,
+            followups_created=followups_created,
             final_message="Streamlined workflow completed successfully! Cases extracted and AI feedback generated."
         )
         
@@ -347,7 +340,8 @@ async def streamlined_workflow(
 @router.post("/workflow", response_model=CompleteWorkflowResponse)
 async def complete_workflow(
     file: UploadFile = File(...),
-    create_cases: bool = True
+    create_cases: bool = True,
+    report_date: Optional[date] = None
 ):
     """
     Complete workflow: Upload PDF → Process → AI Feedback → Create Cases → Create Followups
@@ -356,58 +350,19 @@ async def complete_workflow(
     steps = []
     
     try:
-        # Step 0: Clear all previous data (with timeout protection)
-        try:
-            from services.daily_service_supabase import clear_all_data, verify_data_cleared
-            import asyncio
-            
-            # Use asyncio.wait_for to add timeout protection
-            clear_result = await asyncio.wait_for(clear_all_data(), timeout=30.0)
-            steps.append(WorkflowStep(
-                step="Data Clearance",
-                status="success",
-                message=clear_result["message"],
-                data=clear_result
-            ))
-            
-            # Wait a moment for database to settle
-            await asyncio.sleep(0.5)  # Reduced wait time
-            
-            # Verify data is actually cleared (with timeout)
-            verification = await asyncio.wait_for(verify_data_cleared(), timeout=10.0)
-            if verification['is_cleared']:
-                steps.append(WorkflowStep(
-                    step="Data Verification",
-                    status="success",
-                    message="Database verified empty - ready for new data",
-                    data=verification
-                ))
-            else:
-                steps.append(WorkflowStep(
-                    step="Data Verification",
-                    status="warning",
-                    message=f"Warning: {verification['message']} - continuing anyway",
-                    data=verification
-                ))
-        except asyncio.TimeoutError:
-            steps.append(WorkflowStep(
-                step="Data Clearance",
-                status="warning",
-                message="Data clearance timed out - continuing with workflow",
-                data={"timeout": True}
-            ))
-        except Exception as e:
-            steps.append(WorkflowStep(
-                step="Data Clearance",
-                status="warning",
-                message=f"Data clearance failed: {str(e)} - continuing anyway",
-                data={"error": str(e)}
-            ))
+        # Step 0: Assign the upload to its report batch (uploads are appends, nothing is cleared)
+        batch_id = get_batch_id(report_date)
+        steps.append(WorkflowStep(
+            step="Batch Assignment",
+            status="success",
+            message=f"Upload assigned to report batch {batch_id}",
+            data={"batch_id": batch_id}
+        ))
         
         # Step 1: Process PDF (with timeout protection)
         try:
             cases_data = await asyncio.wait_for(
-                asyncio.get_event_loop().run_in_executor(None, process_document, file),
+                process_document_async(file),
                 timeout=60.0  # 60 second timeout for document processing
             )
             
@@ -441,6 +396,16 @@ async def complete_workflow(
                 data={"cases_count": len(cases_data), "cases": cases_data}
             ))
             
+            # Step 1b: Compare with the batch - re-uploads only process new or changed cases
+            case_plan = await plan_case_upsert(build_case_objects(cases_data), batch_id)
+            cases_to_process = [cases_data[i] for i in case_plan["pending"]]
+            steps.append(WorkflowStep(
+                step="Change Detection",
+                status="success",
+                message=case_plan["summary"]["message"],
+                data=case_plan["summary"]
+            ))
+            
         except asyncio.TimeoutError:
             steps.append(WorkflowStep(
                 step="PDF Processing",
@@ -464,7 +429,7 @@ async def complete_workflow(
                 detail=f"PDF processing failed: {str(e)}"
             )
         
-        # Step 2: Generate AI Feedback (with timeout protection)
+        # Step 2: Generate AI Feedback for new and changed cases (with timeout protection)
         try:
             from services.ai_service import suggest_feedback, check_openai_available
             
@@ -472,7 +437,7 @@ async def complete_workflow(
             is_available, message = check_openai_available()
             if is_available:
                 ai_suggestions = await asyncio.wait_for(
-                    asyncio.get_event_loop().run_in_executor(None, suggest_feedback, cases_data),
+                    suggest_feedback(cases_to_process),
                     timeout=30.0  # 30 second timeout for AI processing
                 )
                 steps.append(WorkflowStep(
@@ -486,11 +451,11 @@ async def complete_workflow(
                 ai_suggestions = [
                     {
                         "case_id": i,
-                        "suggestion_text": "Please review this case and determine appropriate follow-up action.",
+                        "suggestion_text": FALLBACK_SUGGESTION_TEXT,
                         "confidence": 0.0,
                         "case_data": case
                     }
-                    for i, case in enumerate(cases_data)
+                    for i, case in enumerate(cases_to_process)
                 ]
                 steps.append(WorkflowStep(
                     step="AI Feedback",
@@ -503,11 +468,11 @@ async def complete_workflow(
             ai_suggestions = [
                 {
                     "case_id": i,
-                    "suggestion_text": "Please review this case and determine appropriate follow-up action.",
+                    "suggestion_text": FALLBACK_SUGGESTION_TEXT,
                     "confidence": 0.0,
                     "case_data": case
                 }
-                for i, case in enumerate(cases_data)
+                for i, case in enumerate(cases_to_process)
             ]
             steps.append(WorkflowStep(
                 step="AI Feedback",
@@ -520,11 +485,11 @@ async def complete_workflow(
             ai_suggestions = [
                 {
                     "case_id": i,
-                    "suggestion_text": "Please review this case and determine appropriate follow-up action.",
+                    "suggestion_text": FALLBACK_SUGGESTION_TEXT,
                     "confidence": 0.0,
                     "case_data": case
                 }
-                for i, case in enumerate(cases_data)
+                for i, case in enumerate(cases_to_process)
             ]
             steps.append(WorkflowStep(
                 step="AI Feedback",
@@ -533,46 +498,26 @@ async def complete_workflow(
                 data={"suggestions_count": len(ai_suggestions), "suggestions": ai_suggestions}
             ))
         
-        # Step 3: Create Cases in Database (only if create_cases is True)
+        # Step 3: Upsert Cases in Database (only if create_cases is True)
         created_cases = []
         if create_cases:
             try:
-                case_objects = []
-                for case_data in cases_data:
-                    # Ensure title is never empty
-                    title = case_data.get("title") or case_data.get("case") or "Untitled Case"
-                    
-                    # Map the data properly, handling potential field name mismatches
-                    case_obj = CaseCreate(
-                        room=case_data.get("room"),
-                        status=case_data.get("status") or "pending",
-                        importance=case_data.get("importance") or "medium",
-                        type=case_data.get("type") or "other",
-                        title=title,
-                        action=case_data.get("action") or case_data.get("action_text"),
-                        created=case_data.get("created"),
-                        created_by=case_data.get("created_by"),
-                        modified=case_data.get("modified"),
-                        modified_by=case_data.get("modified_by"),
-                        source=case_data.get("source"),
-                        membership=case_data.get("membership"),
-                        case_description=case_data.get("case_description"),
-                        in_out=case_data.get("in_out"),
-                        owner_id=None  # Explicitly set to None for now
-                    )
-                    
-                    case_objects.append(case_obj)
-                
-                created_cases = await asyncio.wait_for(
-                    bulk_create_cases(case_objects),
+                upsert_result = await asyncio.wait_for(
+                    apply_case_upsert(case_plan),
                     timeout=30.0  # 30 second timeout for case creation
                 )
+                created_cases = upsert_result["saved"]
                 
                 steps.append(WorkflowStep(
                     step="Case Creation",
                     status="success",
-                    message=f"Created {len(created_cases)} cases in database",
-                    data={"cases_created": len(created_cases), "cases": cases_data}
+                    message=f"Created {len(upsert_result['created'])} and updated {len(upsert_result['updated'])} cases in database ({len(upsert_result['unchanged'])} unchanged)",
+                    data={
+                        "cases_created": len(upsert_result["created"]),
+                        "cases_updated": len(upsert_result["updated"]),
+                        "cases_unchanged": len(upsert_result["unchanged"]),
+                        "cases": cases_to_process
+                    }
                 ))
                 
             except asyncio.TimeoutError:
@@ -602,33 +547,15 @@ async def complete_workflow(
         followups_created = 0
         if create_cases and created_cases:
             try:
-                for i, case in enumerate(created_cases):
-                    if i < len(ai_suggestions):
-                        try:
-                            followup_data = FollowupCreate(
-                                case_id=case['id'],  # Use dictionary access since case is a dict
-                                suggestion_text=ai_suggestions[i].get("suggestion_text", "No AI suggestion available")
-                            )
-                            result = await asyncio.wait_for(
-                                create_followup(followup_data),
-                                timeout=5.0  # 5 second timeout per followup
-                            )
-                            if result:
-                                followups_created += 1
-                                logger.info(f"Created followup {followups_created} for case {case['id']}")
-                            else:
-                                logger.error(f"Failed to create followup for case {case['id']}")
-                        except asyncio.TimeoutError:
-                            logger.error(f"Followup creation timed out for case {case['id']}")
-                            continue  # Skip this followup and continue with others
-                        except Exception as e:
-                            logger.error(f"Error creating followup for case {case['id']}: {e}")
-                            continue  # Skip this followup and continue with others
+                followups_created = await save_followups(
+                    case_plan, created_cases, ai_suggestions,
+                    timeout=5.0  # 5 second timeout per followup
+                )
                 
                 steps.append(WorkflowStep(
                     step="Followup Creation",
                     status="success",
-                    message=f"Created {followups_created} followups with AI suggestions",
+                    message=f"Saved {followups_created} followups with AI suggestions",
                     data={"followups_created": followups_created}
                 ))
                 
@@ -668,14 +595,17 @@ async def complete_workflow(
 @router.post("/clear-all-data")
 async def clear_all_data_endpoint():
     """
-    Clear all data from the database - cases, followups, and tasks
+    Clear all data from the database - cases, followups, and tasks.
+    Uploads no longer need this; old report batches are pruned in the background.
     """
     try:
-        from services.daily_service_supabase import clear_all_data
+        from services.daily_service_supabase import clear_all_data, wait_for_data_cleared
         result = await clear_all_data()
+        verification = await wait_for_data_cleared()
         return {
             "message": "All data cleared successfully",
-            "details": result
+            "details": result,
+            "verification": verification
         }
     except Exception as e:
         raise HTTPException(
@@ -690,7 +620,7 @@ async def test_ai_suggestions():
     Debug endpoint to test AI suggestion generation
     """
     try:
-        from services.ai_service import suggest_feedback
+        from services.ai_service import FALLBACK_SUGGESTION_TEXT, is_fallback_suggestion, suggest_feedback
         
         # Sample case data for testing
         test_cases = [
@@ -714,7 +644,7 @@ async def test_ai_suggestions():
             }
         ]
         
-        suggestions = suggest_feedback(test_cases)
+        suggestions = await suggest_feedback(test_cases)
         
         return {
             "message": f"Successfully generated {len(suggestions)} AI suggestions",
@@ -759,44 +689,34 @@ async def debug_extract_text(file: UploadFile = File(...)):
 
 # Streaming workflow endpoint for real-time progress
 @router.post("/workflow-stream")
-async def workflow_stream(file: UploadFile = File(...), create_cases: bool = False):
+async def workflow_stream(file: UploadFile = File(...), create_cases: bool = False, report_date: Optional[date] = None):
     """
     Streaming workflow with real-time progress updates
     """
     async def generate_progress():
         try:
-            # Step 0: Clear all previous data
-            yield f"data: {json.dumps({'step': 'clearing', 'message': 'Clearing previous data...', 'progress': 5})}\n\n"
-            
-            try:
-                from services.daily_service_supabase import clear_all_data, verify_data_cleared
-                import asyncio
-                
-                # Clear existing data
-                clear_result = await asyncio.wait_for(clear_all_data(), timeout=30.0)
-                yield f"data: {json.dumps({'step': 'cleared', 'message': clear_result['message'], 'progress': 8})}\n\n"
-                
-                # Wait a moment for database to settle
-                await asyncio.sleep(0.5)
-                
-                # Verify data is actually cleared
-                verification = await asyncio.wait_for(verify_data_cleared(), timeout=10.0)
-                if verification['is_cleared']:
-                    yield f"data: {json.dumps({'step': 'verified', 'message': 'Database verified empty - ready for new data', 'progress': 10})}\n\n"
-                else:
-                    warning_msg = f"Warning: {verification['message']} - continuing anyway"
-                    yield f"data: {json.dumps({'step': 'warning', 'message': warning_msg, 'progress': 10})}\n\n"
-                    
-            except asyncio.TimeoutError:
-                yield f"data: {json.dumps({'step': 'warning', 'message': 'Data clearance timed out - continuing with workflow', 'progress': 10})}\n\n"
-            except Exception as e:
-                error_msg = f"Data clearance failed: {str(e)} - continuing anyway"
-                yield f"data: {json.dumps({'step': 'warning', 'message': error_msg, 'progress': 10})}\n\n"
+            # Step 0: Assign the upload to its report batch (uploads are appends, nothing is cleared)
+            batch_id = get_batch_id(report_date)
+            yield f"data: {json.dumps({'step': 'batch', 'message': f'Upload assigned to report batch {batch_id}', 'batch_id': batch_id, 'progress': 10})}\n\n"
             
             # Step 1: Process document
             yield f"data: {json.dumps({'step': 'processing', 'message': 'Processing document...', 'progress': 15})}\n\n"
             
-            cases_data = await asyncio.get_event_loop().run_in_executor(None, process_document, file)
+            # With an AI parsing engine cases arrive one by one while the model is still
+            # generating; forward each as it's parsed (regex parsing returns them all at once)
+            parsed_cases: asyncio.Queue = asyncio.Queue()
+            processing = asyncio.create_task(process_document_async(file, on_case=parsed_cases.put_nowait))
+            processing.add_done_callback(lambda _: parsed_cases.put_nowait(None))
+            try:
+                parsed_count = 0
+                while (case := await parsed_cases.get()) is not None:
+                    parsed_count += 1
+                    message = f"Parsed case {parsed_count}: {case.get('title', 'Untitled')}"
+                    yield f"data: {json.dumps({'step': 'case_parsed', 'message': message, 'case': case, 'progress': 20})}\n\n"
+                cases_data = processing.result()
+            finally:
+                if not processing.done():
+                    processing.cancel()
             
             if not cases_data:
                 yield f"data: {json.dumps({'step': 'error', 'message': 'No cases found in document', 'progress': 0})}\n\n"
@@ -804,15 +724,20 @@ async def workflow_stream(file: UploadFile = File(...), create_cases: bool = Fal
             
             yield f"data: {json.dumps({'step': 'parsing', 'message': f'Extracted {len(cases_data)} cases', 'progress': 30})}\n\n"
             
+            # Compare with the batch - re-uploads only process new or changed cases
+            case_plan = await plan_case_upsert(build_case_objects(cases_data), batch_id)
+            cases_to_process = [cases_data[i] for i in case_plan["pending"]]
+            yield f"data: {json.dumps({'step': 'diff', 'message': case_plan['summary']['message'], 'summary': case_plan['summary'], 'progress': 35})}\n\n"
+            
             # Step 2: Generate AI feedback with progress
-            yield f"data: {json.dumps({'step': 'ai_start', 'message': f'Generating AI feedback for {len(cases_data)} cases...', 'progress': 40})}\n\n"
+            yield f"data: {json.dumps({'step': 'ai_start', 'message': f'Generating AI feedback for {len(cases_to_process)} cases...', 'progress': 40})}\n\n"
             
             progress_messages = []
             def progress_callback(current, total, message):
-                progress = 40 + (current / total) * 40  # 40-80% for AI processing
+                progress = 40 + (current / total) * 40 if total else 80  # 40-80% for AI processing
                 progress_messages.append(f"data: {json.dumps({'step': 'ai_progress', 'current': current, 'total': total, 'message': message, 'progress': int(progress)})}\n\n")
             
-            ai_suggestions = suggest_feedback(cases_data, progress_callback)
+            ai_suggestions = await suggest_feedback(cases_to_process, progress_callback)
             
             # Yield all progress messages
             for msg in progress_messages:
@@ -824,47 +749,15 @@ async def workflow_stream(file: UploadFile = File(...), create_cases: bool = Fal
             if create_cases:
                 yield f"data: {json.dumps({'step': 'creating', 'message': 'Creating cases in database...', 'progress': 85})}\n\n"
                 
-                case_objects = []
-                for case_data in cases_data:
-                    title = case_data.get("title") or case_data.get("case") or "Untitled Case"
-                    case_obj = CaseCreate(
-                        room=case_data.get("room"),
-                        status=case_data.get("status") or "pending",
-                        importance=case_data.get("importance") or "medium",
-                        type=case_data.get("type") or "other",
-                        title=title,
-                        action=case_data.get("action") or case_data.get("action_text"),
-                        created=case_data.get("created"),
-                        created_by=case_data.get("created_by"),
-                        modified=case_data.get("modified"),
-                        modified_by=case_data.get("modified_by"),
-                        source=case_data.get("source"),
-                        membership=case_data.get("membership"),
-                        case_description=case_data.get("case_description"),
-                        in_out=case_data.get("in_out"),
-                        owner_id=None
-                    )
-                    case_objects.append(case_obj)
-                
-                created_cases = await bulk_create_cases(case_objects)
-                yield f"data: {json.dumps({'step': 'cases_created', 'message': f'Created {len(created_cases)} cases', 'progress': 90})}\n\n"
+                upsert_result = await apply_case_upsert(case_plan)
+                created_cases = upsert_result["saved"]
+                cases_message = f"Created {len(upsert_result['created'])} and updated {len(upsert_result['updated'])} cases ({len(upsert_result['unchanged'])} unchanged)"
+                yield f"data: {json.dumps({'step': 'cases_created', 'message': cases_message, 'progress': 90})}\n\n"
                 
                 # Create followups
-                followups_created = 0
-                for i, case in enumerate(created_cases):
-                    if i < len(ai_suggestions):
-                        try:
-                            followup_data = FollowupCreate(
-                                case_id=case['id'],
-                                suggestion_text=ai_suggestions[i].get("suggestion_text", "No AI suggestion available")
-                            )
-                            result = await create_followup(followup_data)
-                            if result:
-                                followups_created += 1
-                        except Exception as e:
-                            logger.error(f"Error creating followup for case {case['id']}: {e}")
+                followups_created = await save_followups(case_plan, created_cases, ai_suggestions)
                 
-                yield f"data: {json.dumps({'step': 'followups_created', 'message': f'Created {followups_created} followups', 'progress': 95})}\n\n"
+                yield f"data: {json.dumps({'step': 'followups_created', 'message': f'Saved {followups_created} followups', 'progress': 95})}\n\n"
             
             # Final result
             yield f"data: {json.dumps({'step': 'complete', 'message': 'Workflow completed successfully!', 'progress': 100, 'cases': cases_data, 'suggestions': ai_suggestions})}\n\n"
@@ -1,15 +1,40 @@
 # backend/routers/rag_router.py
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, List, Optional
 from pydantic import BaseModel
+from contextlib import aclosing
+import asyncio
+import json
 import logging
-from services.rag_service import rag_service
+import time
+from services.rag_service import RAGService, get_rag_service, get_rag_status, start_rag_initialization
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/rag", tags=["RAG"])
 
+RAG_RETRY_AFTER_SECONDS = 5
+
+async def require_rag_service() -> RAGService:
+    """Dependency returning the RAG service, or 503 while the index is still loading"""
+    rag_service = get_rag_service()
+    if rag_service is not None:
+        return rag_service
+
+    # Covers apps that skipped the startup hook, and retries after a failed attempt
+    start_rag_initialization()
+    state = get_rag_status()
+    detail = "RAG index is still loading, retry shortly"
+    if state["status"] == "failed":
+        detail = f"RAG service failed to initialize: {state['error']}"
+    raise HTTPException(
+        status_code=503,
+        detail=detail,
+        headers={"Retry-After": str(RAG_RETRY_AFTER_SECONDS)}
+    )
+
 # Pydantic models for request/response
 class EmailProcessRequest(BaseModel):
     input_text: str
@@ -32,10 +57,14 @@ class CollectionStatsResponse(BaseModel):
     total_chunks: int
     status: str
     persist_folder: Optional[str] = None
+    index: Optional[dict] = None
+    embedding_cache: Optional[dict] = None
+    query_cache: Optional[dict] = None
     error: Optional[str] = None
 
 class ChatRequest(BaseModel):
     messages: List[dict]
+    stream: bool = False  # reply as server-sent events while tokens are generated
 
 class ChatResponse(BaseModel):
     reply: str
@@ -50,7 +79,8 @@ class ShiftSummaryResponse(BaseModel):
 
 @router.post("/upload-documents", response_model=DocumentUploadResponse)
 async def upload_training_documents(
-    files: List[UploadFile] = File(...)
+    files: List[UploadFile] = File(...),
+    rag_service: RAGService = Depends(require_rag_service)
 ):
     """
     Upload training documents for the RAG system.
@@ -62,8 +92,10 @@ async def upload_training_documents(
         
         logger.info(f"Uploading {len(files)} documents for RAG training")
         
-        # Process files through RAG service
-        result = rag_service.upload_training_documents(files)
+        uploads = [(file.filename, await file.read()) for file in files]
+        
+        # Process files through RAG service (embedding and index writes block, so off the loop)
+        result = await asyncio.to_thread(rag_service.upload_training_documents, uploads)
         
         logger.info(f"Successfully processed {result['processed_chunks']} chunks from {len(result['uploaded_files'])} files")
         
@@ -74,7 +106,7 @@ async def upload_training_documents(
         raise HTTPException(status_code=500, detail=f"Error uploading documents: {str(e)}")
 
 @router.post("/process-email", response_model=EmailProcessResponse)
-async def process_email(request: EmailProcessRequest):
+async def process_email(request: EmailProcessRequest, rag_service: RAGService = Depends(require_rag_service)):
     """
     Process an email using RAG to generate a standardized response.
     Takes input email text and returns a formatted email based on training documents.
@@ -86,7 +118,7 @@ async def process_email(request: EmailProcessRequest):
         logger.info("Processing email with RAG")
         
         # Process email through RAG service
-        result = rag_service.process_email_with_rag(
+        result = await rag_service.process_email_with_rag(
             input_text=request.input_text,
             context=request.context
         )
@@ -104,8 +136,15 @@ async def process_email(request: EmailProcessRequest):
         logger.error(f"Error processing email: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing email: {str(e)}")
 
+@router.get("/status")
+async def get_rag_readiness():
+    """
+    Readiness of the RAG service. Available while the index is still loading.
+    """
+    return get_rag_status()
+
 @router.get("/stats", response_model=CollectionStatsResponse)
-async def get_collection_stats():
+async def get_collection_stats(rag_service: RAGService = Depends(require_rag_service)):
     """
     Get statistics about the document collection in the vector database.
     """
@@ -118,7 +157,7 @@ async def get_collection_stats():
         raise HTTPException(status_code=500, detail=f"Error getting collection stats: {str(e)}")
 
 @router.delete("/clear-collection")
-async def clear_collection():
+async def clear_collection(rag_service: RAGService = Depends(require_rag_service)):
     """
     Clear all documents from the vector database collection.
     This will remove all training data.
@@ -139,10 +178,57 @@ async def clear_collection():
         logger.error(f"Error clearing collection: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error clearing collection: {str(e)}")
 
+class ClosingStreamingResponse(StreamingResponse):
+    """StreamingResponse that closes its body generator once the response ends.
+
+    On a client disconnect Starlette cancels the send loop and abandons the generator,
+    which then only closes when garbage collected; an upstream completion it holds would
+    keep generating until then.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.body_iterator.aclose()
+
+def _sse(data: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+async def _chat_events(rag_service: RAGService, messages: List[dict]) -> AsyncIterator[str]:
+    """SSE body: one "data" event per text delta, then "done" with timings, or "error" """
+    start = time.perf_counter()
+    first_token_ms = None
+    deltas = 0
+    finished = False
+    try:
+        # aclosing: when the response closes this generator (client disconnect), the reply
+        # stream is closed too, which aborts the upstream completion
+        async with aclosing(rag_service.stream_openai_reply(messages)) as reply:
+            async for delta in reply:
+                if first_token_ms is None:
+                    first_token_ms = round((time.perf_counter() - start) * 1000)
+                deltas += 1
+                yield _sse({"delta": delta})
+        finished = True
+    except Exception as e:
+        finished = True
+        logger.error(f"Error in chat stream: {str(e)}")
+        yield _sse({"error": str(e)}, event="error")
+        return
+    finally:
+        if not finished:
+            logger.info(f"Chat stream closed by the client after {deltas} deltas")
+    total_ms = round((time.perf_counter() - start) * 1000)
+    logger.info(f"Chat stream: first token after {first_token_ms} ms, {deltas} deltas in {total_ms} ms")
+    yield _sse({"first_token_ms": first_token_ms, "total_ms": total_ms}, event="done")
+
 @router.post("/chat", response_model=ChatResponse)
-async def chat_with_ai(request: ChatRequest):
+async def chat_with_ai(request: ChatRequest, rag_service: RAGService = Depends(require_rag_service)):
     """
     Chat with the AI assistant using RAG context.
+    With "stream": true the reply arrives as server-sent events while it is generated.
     """
     try:
         if not request.messages:
@@ -150,8 +236,16 @@ async def chat_with_ai(request: ChatRequest):
         
         logger.info("Processing chat request")
         
+        if request.stream:
+            return ClosingStreamingResponse(
+                _chat_events(rag_service, request.messages),
+                media_type="text/event-stream",
+                # Keep proxies from buffering the stream
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+        
         # Get AI reply with RAG context
-        reply = rag_service.get_openai_reply(request.messages)
+        reply = await rag_service.get_openai_reply(request.messages)
         
         return ChatResponse(reply=reply)
         
@@ -162,7 +256,7 @@ async def chat_with_ai(request: ChatRequest):
         raise HTTPException(status_code=500, detail=f"Error in chat: {str(e)}")
 
 @router.post("/extract-shift-summary", response_model=ShiftSummaryResponse)
-async def extract_shift_summary(request: ShiftSummaryRequest):
+async def extract_shift_summary(request: ShiftSummaryRequest, rag_service: RAGService = Depends(require_rag_service)):
     """
     Extract structured summary from shift notes.
     """
@@ -173,7 +267,7 @@ async def extract_shift_summary(request: ShiftSummaryRequest):
         logger.info("Extracting shift summary")
         
         # Extract shift summary
-        result = rag_service.extract_shift_summary(request.notes)
+        result = await rag_service.extract_shift_summary(request.notes)
         
         if "error" in result:
             return ShiftSummaryResponse(error=result["error"])
@@ -190,7 +284,7 @@ async def extract_shift_summary(request: ShiftSummaryRequest):
         raise HTTPException(status_code=500, detail=f"Error extracting shift summary: {str(e)}")
 
 @router.post("/rebuild-from-data")
-async def rebuild_from_data_folder():
+async def rebuild_from_data_folder(rag_service: RAGService = Depends(require_rag_service)):
     """
     Rebuild vectorstore from documents in the data folder.
     This is an admin-only operation.
@@ -198,7 +292,8 @@ async def rebuild_from_data_folder():
     try:
         logger.info("Rebuilding vectorstore from data folder")
         
-        result = rag_service.rebuild_from_data_folder()
+        # Embedding and compaction block, so they run off the event loop
+        result = await asyncio.to_thread(rag_service.rebuild_from_data_folder)
         
         if result["success"]:
             logger.info(f"Vectorstore rebuilt successfully: {result['message']}")
@@ -214,7 +309,7 @@ async def rebuild_from_data_folder():
         raise HTTPException(status_code=500, detail=f"Error rebuilding vectorstore: {str(e)}")
 
 @router.post("/test-rag")
-async def test_rag_system():
+async def test_rag_system(rag_service: RAGService = Depends(require_rag_service)):
     """
     Test endpoint to verify the RAG system is working correctly.
     """
@@ -222,7 +317,7 @@ async def test_rag_system():
         # Test with a simple query
         test_text = "Hello, I need help with my reservation."
         
-        result = rag_service.process_email_with_rag(test_text)
+        result = await rag_service.process_email_with_rag(test_text)
         
         if result["success"]:
             return {
@@ -18,6 +18,10 @@ class CaseCreate(BaseModel):
     membership: Optional[str] = None
     case_description: Optional[str] = None
     in_out: Optional[str] = None
+    # Report batch (report date, YYYY-MM-DD); defaults to today's batch when omitted
+    batch_id: Optional[str] = None
+    # Identity across repeated uploads; computed from room/created/description when omitted
+    case_key: Optional[str] = None
 
 class CaseUpdate(BaseModel):
     room: Optional[str] = None
@@ -7,6 +7,7 @@ class FollowupBase(BaseModel):
 
 class FollowupCreate(FollowupBase):
     case_id: int
+    batch_id: Optional[str] = None  # Report batch of the case; looked up from the case when omitted
 
 class FollowupUpdate(FollowupBase):
     pass
@@ -1,21 +1,42 @@
 # backend/services/ai_service.py
 
 import os
-import openai
-from typing import List, Dict, Any
+import re
+import time
+import asyncio
+from typing import Any, Callable, Dict, List, Optional
 from dotenv import load_dotenv
+from services.chunking import count_tokens
+from services.llm_rate_limiter import PRIORITY_BATCH, chat_completion
+from services.structured_output import (
+    CASES_SCHEMA, IncrementalJSONArrayParser, parse_json_response, response_format
+)
 
 # Load environment variables from .env file
 load_dotenv()
 
-def get_client():
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise RuntimeError("Missing OPENAI_API_KEY. Check your .env file.")
-    
-    # Use the new OpenAI client format
-    from openai import OpenAI
-    return OpenAI(api_key=api_key)
+# Suggestions requested at the same time; they share the pooled client connections
+AI_FEEDBACK_CONCURRENCY = int(os.getenv("AI_FEEDBACK_CONCURRENCY", "4"))
+# Map-reduce document parsing: report text per request, and parts parsed at once. The JSON
+# reply is usually larger than the text it came from, so parts stay well under max_tokens.
+AI_PARSE_CHUNK_TOKENS = int(os.getenv("AI_PARSE_CHUNK_TOKENS", "1500"))
+AI_PARSE_MIN_CHUNK_TOKENS = 200
+AI_PARSE_CONCURRENCY = int(os.getenv("AI_PARSE_CONCURRENCY", "4"))
+# Stand-in suggestion when the AI is unavailable or fails for a case
+FALLBACK_SUGGESTION_TEXT = "Please review this case and determine appropriate follow-up action."
+
+# Where a new case starts in a report, most specific first (as in document_service.parse_cases)
+CASE_BOUNDARY_PATTERNS = [
+    r'(?=Created\s+\d{2}/\d{2}/\d{4})',
+    r'(?=Guest\s*:\s*)',
+    r'(?=Room\s*:\s*\d+)',
+    r'(?=--- TABLE)',
+    r'\n\s*\n',
+]
+
+def is_fallback_suggestion(suggestion: Dict[str, Any]) -> bool:
+    """True when a suggestion is the stand-in for a failed or unavailable AI call"""
+    return "error" in suggestion or suggestion.get("suggestion_text") == FALLBACK_SUGGESTION_TEXT
 
 def check_openai_available():
     """Check if OpenAI API is available and configured"""
@@ -27,128 +48,253 @@ def check_openai_available():
     except Exception as e:
         return False, f"OpenAI API error: {str(e)}"
 
-def parse_document_with_ai(text: str) -> List[Dict[str, Any]]:
-    """
-    Optimized AI parsing with faster model and better error handling.
-    """
-    client = get_client()
-    
-    # Simplified prompt for faster processing
-    system_prompt = """Extract hotel guest cases from this document. Return as JSON array with fields:
+# Case parsing system prompt; the same for whole documents and for map-reduce parts
+CASE_PARSING_PROMPT = """Extract hotel guest cases from this document. Return a JSON object {"cases": [...]} whose cases have fields:
     guest, room, status, importance, type, title, case_description, action, created, created_by, modified, modified_by, source, membership, in_out
     Use null for missing fields. Return only valid JSON."""
-    
-    user_prompt = f"Parse this guest relations report:\n\n{text}"
+CASE_PARSING_MODEL = "gpt-4o-mini"  # Fastest model
+
+CaseCallback = Callable[[Dict[str, Any]], None]
+
+class TruncatedOutputError(Exception):
+    """The reply hit max_tokens, so its JSON is cut off"""
+
+def _ensure_title(case: Dict[str, Any]) -> None:
+    """Set a title from the available data when the model left it empty"""
+    if not case.get('title'):
+        if case.get('room'):
+            case['title'] = f"Room {case['room']} Case"
+        elif case.get('case_description'):
+            desc = case['case_description'][:50]
+            case['title'] = desc + "..." if len(case['case_description']) > 50 else desc
+        else:
+            case['title'] = "Untitled Case"
+
+def _cases_from_json(parsed_result: Any) -> List[Dict[str, Any]]:
+    if isinstance(parsed_result, list):
+        cases = parsed_result
+    elif isinstance(parsed_result, dict) and 'cases' in parsed_result:
+        cases = parsed_result['cases']
+    else:
+        cases = [parsed_result]  # Single case
+    cases = [case for case in cases if isinstance(case, dict)]
+    for case in cases:
+        _ensure_title(case)
+    return cases
+
+async def _request_cases(text: str, part: str = "", on_case: Optional[CaseCallback] = None) -> List[Dict[str, Any]]:
+    """One parsing request, streamed: each case is parsed (and handed to on_case) as soon
+    as its JSON object is complete, before the rest of the reply has been generated.
+
+    Raises when the request fails or the reply was cut off at max_tokens; returns [] when
+    the reply isn't usable JSON.
+    """
+    user_prompt = f"Parse this guest relations report{part}:\n\n{text}"
 
+    start = time.perf_counter()
+    stream = await chat_completion(
+        PRIORITY_BATCH,
+        model=CASE_PARSING_MODEL,
+        messages=[
+            {"role": "system", "content": CASE_PARSING_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ],
+        temperature=0,  # No randomness for speed
+        max_tokens=4000,  # Limit for faster response
+        stream=True,
+        **response_format(CASE_PARSING_MODEL, "guest_cases", CASES_SCHEMA)
+    )
+
+    parser = IncrementalJSONArrayParser("cases")
+    cases: List[Dict[str, Any]] = []
+    finish_reason = None
+    first_case = None
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        finish_reason = choice.finish_reason or finish_reason
+        if not choice.delta.content:
+            continue
+        for case in parser.feed(choice.delta.content):
+            if first_case is None:
+                first_case = time.perf_counter() - start
+            _ensure_title(case)
+            cases.append(case)
+            if on_case:
+                on_case(case)
+
+    if finish_reason == "length":
+        raise TruncatedOutputError(f"reply exceeded max_tokens for {count_tokens(text)} tokens of report")
+    if parser.started:
+        print(f"AI successfully parsed {len(cases)} cases in {time.perf_counter() - start:.1f}s"
+              + (f" (first after {first_case:.1f}s)" if first_case is not None else ""))
+        return cases
+
+    # No array in the reply (model without structured outputs answering with a single object or prose)
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",  # Fastest model
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0,  # No randomness for speed
-            max_tokens=4000,  # Limit for faster response
-        )
+        cases = _cases_from_json(parse_json_response(parser.text))
+    except ValueError as e:
+        print(f"Failed to parse AI response as JSON: {e}")
+        print(f"Raw response: {parser.text}")
+        # Fallback to regex parsing
+        return []
+    print(f"AI successfully parsed {len(cases)} cases from partial JSON")
+    if on_case:
+        for case in cases:
+            on_case(case)
+    return cases
 
-        # Fast JSON parsing
-        import json
-        result = response.choices[0].message.content.strip()
-        
-        # Quick cleanup
-        if result.startswith('```'):
-            result = result.split('```')[1]
-        if result.startswith('json'):
-            result = result[4:]
-        
-        result = result.strip()
-        
-        # Parse JSON
-        try:
-            parsed_result = json.loads(result)
-            if isinstance(parsed_result, list):
-                cases = parsed_result
-            elif isinstance(parsed_result, dict) and 'cases' in parsed_result:
-                cases = parsed_result['cases']
-            else:
-                cases = [parsed_result]  # Single case
-                
-            print(f"AI successfully parsed {len(cases)} cases")
-            
-            # Ensure all cases have required fields
-            for case in cases:
-                if not case.get('title'):
-                    # Set title based on available data
-                    if case.get('room'):
-                        case['title'] = f"Room {case['room']} Case"
-                    elif case.get('case_description'):
-                        desc = case['case_description'][:50]
-                        case['title'] = desc + "..." if len(case['case_description']) > 50 else desc
-                    else:
-                        case['title'] = "Untitled Case"
-            
-            return cases
-            
-        except json.JSONDecodeError as e:
-            print(f"Failed to parse AI response as JSON: {e}")
-            print(f"Raw response: {result}")
-            # Try to extract any valid JSON from the response
-            try:
-                # Look for JSON array or object in the response
-                import re
-                json_match = re.search(r'\[.*\]|\{.*\}', result, re.DOTALL)
-                if json_match:
-                    parsed_result = json.loads(json_match.group())
-                    if isinstance(parsed_result, list):
-                        cases = parsed_result
-                    elif isinstance(parsed_result, dict) and 'cases' in parsed_result:
-                        cases = parsed_result['cases']
-                    else:
-                        cases = [parsed_result]
-                    print(f"AI successfully parsed {len(cases)} cases from partial JSON")
-                    
-                    # Ensure all cases have required fields
-                    for case in cases:
-                        if not case.get('title'):
-                            # Set title based on available data
-                            if case.get('room'):
-                                case['title'] = f"Room {case['room']} Case"
-                            elif case.get('case_description'):
-                                desc = case['case_description'][:50]
-                                case['title'] = desc + "..." if len(case['case_description']) > 50 else desc
-                            else:
-                                case['title'] = "Untitled Case"
-                    
-                    return cases
-            except:
-                pass
-            # Fallback to regex parsing
-            return []
-            
+async def parse_document_with_ai(text: str, on_case: Optional[CaseCallback] = None) -> List[Dict[str, Any]]:
+    """
+    Optimized AI parsing with faster model and better error handling.
+    on_case receives each case as soon as it has been parsed from the streamed reply.
+    """
+    try:
+        return await _request_cases(text, on_case=on_case)
     except Exception as e:
         print(f"AI parsing failed: {e}")
         print(f"Error type: {type(e).__name__}")
         # Fallback to regex parsing
         return []
 
-def suggest_feedback(cases: List[Dict[str, Any]], progress_callback=None) -> List[Dict[str, Any]]:
+def split_report(text: str, max_tokens: int = AI_PARSE_CHUNK_TOKENS) -> List[str]:
+    """Split a report into parts of at most max_tokens, cutting only between cases.
+
+    Case starts are found with the first CASE_BOUNDARY_PATTERNS entry that occurs more
+    than once; whole cases are packed into parts. A single case longer than max_tokens is
+    cut between lines.
+    """
+    blocks = [text]
+    for pattern in CASE_BOUNDARY_PATTERNS:
+        split = [block for block in re.split(pattern, text) if block.strip()]
+        if len(split) > 1:
+            blocks = split
+            break
+
+    parts, current, current_tokens = [], [], 0
+    for block in blocks:
+        pieces = [block]
+        if count_tokens(block) > max_tokens:
+            pieces, lines, lines_tokens = [], [], 0
+            for line in block.splitlines(keepends=True):
+                line_tokens = count_tokens(line)
+                if lines and lines_tokens + line_tokens > max_tokens:
+                    pieces.append("".join(lines))
+                    lines, lines_tokens = [], 0
+                lines.append(line)
+                lines_tokens += line_tokens
+            if lines:
+                pieces.append("".join(lines))
+        for piece in pieces:
+            tokens = count_tokens(piece)
+            if current and current_tokens + tokens > max_tokens:
+                parts.append("".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += tokens
+    if current:
+        parts.append("".join(current))
+    return parts
+
+def _case_key(case: Dict[str, Any]) -> tuple:
+    """Identity of a parsed case for deduplication across parts"""
+    def norm(value: Any) -> str:
+        return re.sub(r'\W+', ' ', str(value or '')).strip().lower()
+    if case.get('room') or case.get('created'):
+        return (norm(case.get('room')), norm(case.get('created')), norm(case.get('guest')))
+    return ('', '', norm(case.get('case_description'))[:80] or norm(case.get('title')))
+
+def merge_case_lists(case_lists: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Reduce step: concatenate part results in document order, merging duplicates.
+
+    A case repeated in two parts (a case cut between lines, or a repeated page) keeps its
+    first position; empty fields are filled from the later copy and the longer
+    description wins.
+    """
+    merged: Dict[tuple, Dict[str, Any]] = {}
+    for cases in case_lists:
+        for case in cases:
+            key = _case_key(case)
+            existing = merged.get(key)
+            if existing is None:
+                merged[key] = dict(case)
+                continue
+            for field, value in case.items():
+                if value in (None, ''):
+                    continue
+                if existing.get(field) in (None, ''):
+                    existing[field] = value
+                elif field == 'case_description' and len(str(value)) > len(str(existing[field])):
+                    existing[field] = value
+    return list(merged.values())
+
+async def parse_document_map_reduce(text: str, max_tokens: int = AI_PARSE_CHUNK_TOKENS,
+                                    concurrency: int = AI_PARSE_CONCURRENCY,
+                                    on_case: Optional[CaseCallback] = None) -> List[Dict[str, Any]]:
+    """
+    Map-reduce AI parsing for large reports: split at case boundaries into token-bounded
+    parts, parse the parts concurrently, then merge and deduplicate the cases.
+    A part whose reply is cut off at max_tokens is split in half and parsed again. Other
+    failed parts are logged and skipped; if every part fails the result is [].
+    on_case receives each case once, as soon as any part has produced it.
+    """
+    parts = split_report(text, max_tokens)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    start = time.perf_counter()
+    seen_keys = set()
+
+    def on_part_case(case: Dict[str, Any]) -> None:
+        key = _case_key(case)
+        if on_case and key not in seen_keys:
+            seen_keys.add(key)
+            on_case(case)
+    print(f"AI map-reduce parsing: {len(parts)} parts of up to {max_tokens} tokens")
+
+    async def parse_part(index: int, part: str, part_tokens: int) -> List[Dict[str, Any]]:
+        try:
+            async with semaphore:
+                label = f" (part {index + 1} of {len(parts)})" if len(parts) > 1 else ""
+                return await _request_cases(part, label, on_part_case)
+        except TruncatedOutputError:
+            halves = split_report(part, part_tokens // 2)
+            if part_tokens // 2 < AI_PARSE_MIN_CHUNK_TOKENS or len(halves) < 2:
+                raise
+            print(f"AI reply for part {index + 1} was cut off, parsing it in {len(halves)} smaller parts")
+            results = await asyncio.gather(*(parse_part(index, half, part_tokens // 2) for half in halves))
+            return [case for cases in results for case in cases]
+
+    results = await asyncio.gather(*(parse_part(i, part, max_tokens) for i, part in enumerate(parts)),
+                                   return_exceptions=True)
+    case_lists = []
+    for index, result in enumerate(results):
+        if isinstance(result, Exception):
+            print(f"AI parsing failed for part {index + 1}/{len(parts)}: {type(result).__name__}: {result}")
+            continue
+        case_lists.append(result)
+
+    cases = merge_case_lists(case_lists)
+    found = sum(len(part_cases) for part_cases in case_lists)
+    print(f"AI map-reduce parsed {len(cases)} cases ({found - len(cases)} duplicates merged) from "
+          f"{len(case_lists)}/{len(parts)} parts in {time.perf_counter() - start:.1f}s")
+    return cases
+
+async def suggest_feedback(cases: List[Dict[str, Any]], progress_callback=None) -> List[Dict[str, Any]]:
     """
     Given a list of cases, call ChatGPT and return AI suggestions.
     Returns structured feedback that can be used to create followups.
-    Progress callback function receives (current, total, message) updates.
+    Up to AI_FEEDBACK_CONCURRENCY cases are in flight at once; results keep the case order.
+    Progress callback function receives (current, total, message) updates as cases finish.
     """
-    client = get_client()
-    results = []
+    semaphore = asyncio.Semaphore(max(1, AI_FEEDBACK_CONCURRENCY))
+    completed = 0
 
     print(f"Generating AI suggestions for {len(cases)} cases...")
     if progress_callback:
         progress_callback(0, len(cases), f"Starting AI feedback generation for {len(cases)} cases...")
 
-    for i, case in enumerate(cases):
-        print(f"Processing case {i+1}/{len(cases)}: {case.get('title', 'Untitled')}")
-        if progress_callback:
-            progress_callback(i+1, len(cases), f"Processing case {i+1}/{len(cases)}: {case.get('title', 'Untitled')}")
-        
+    async def suggest(i: int, case: Dict[str, Any]) -> Dict[str, Any]:
+        nonlocal completed
         # Create a more detailed prompt for better suggestions
         prompt = (
             f"Case details:\n"
@@ -166,15 +312,18 @@ def suggest_feedback(cases: List[Dict[str, Any]], progress_callback=None) -> Lis
         )
 
         try:
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are an expert guest relations manager with extensive hotel experience. Provide comprehensive, actionable follow-up plans in 3-4 sentences. Focus on practical next steps that would improve guest satisfaction or resolve issues completely. Be specific about what staff should do, when to do it, and how to measure success."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,  # Lower temperature for more consistent suggestions
-                max_tokens=200    # Increased token limit for longer responses
-            )
+            async with semaphore:
+                print(f"Processing case {i+1}/{len(cases)}: {case.get('title', 'Untitled')}")
+                response = await chat_completion(
+                    PRIORITY_BATCH,
+                    model="gpt-4o-mini",
+                    messages=[
+                        {"role": "system", "content": "You are an expert guest relations manager with extensive hotel experience. Provide comprehensive, actionable follow-up plans in 3-4 sentences. Focus on practical next steps that would improve guest satisfaction or resolve issues completely. Be specific about what staff should do, when to do it, and how to measure success."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.3,  # Lower temperature for more consistent suggestions
+                    max_tokens=200    # Increased token limit for longer responses
+                )
 
             suggestion = response.choices[0].message.content.strip()
             
@@ -184,24 +333,30 @@ def suggest_feedback(cases: List[Dict[str, Any]], progress_callback=None) -> Lis
             
             print(f"Generated suggestion: {suggestion}")
             
-            results.append({
+            result = {
                 "case_id": i,  # Use index for better matching
                 "suggestion_text": suggestion,
                 "confidence": 0.85,
                 "case_data": case
-            })
+            }
             
         except Exception as e:
             print(f"Error generating suggestion for case {i+1}: {e}")
             # Fallback suggestion if AI fails
-            fallback_suggestion = "Please review this case and determine appropriate follow-up action."
-            results.append({
+            result = {
                 "case_id": i,
-                "suggestion_text": fallback_suggestion,
+                "suggestion_text": FALLBACK_SUGGESTION_TEXT,
                 "confidence": 0.0,
                 "case_data": case,
                 "error": str(e)
-            })
+            }
+
+        completed += 1
+        if progress_callback:
+            progress_callback(completed, len(cases), f"Processed case {i+1}/{len(cases)}: {case.get('title', 'Untitled')}")
+        return result
+
+    results = list(await asyncio.gather(*(suggest(i, case) for i, case in enumerate(cases))))
 
     print(f"Successfully generated {len(results)} AI suggestions")
     if progress_callback:
@@ -0,0 +1,95 @@
+# backend/services/bm25_index.py
+
+import math
+import re
+from collections import Counter
+from heapq import nlargest
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Common words that match nearly every chunk and only add noise to lexical scores
+STOP_WORDS = frozenset(
+    "a an and are as at be but by for from has have i if in is it its of on or our so "
+    "that the their there this to was we were what when where which who will with you your".split()
+)
+
+# Rank constant from the original RRF paper; damps the weight of the very top ranks
+RRF_K = 60
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+class BM25Index:
+    """In-memory inverted index with Okapi BM25 scoring.
+
+    Documents are added and removed one at a time, so the index can follow the vectorstore
+    incrementally. Not thread-safe on its own; the owner serializes access.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_terms: Dict[str, Tuple[str, ...]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._lengths
+
+    def add(self, doc_id: str, text: str) -> None:
+        """Index a document, replacing any previous version with the same id"""
+        if doc_id in self._lengths:
+            self.remove(doc_id)
+        tokens = tokenize(text)
+        counts = Counter(tokens)
+        for term, tf in counts.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+        self._doc_terms[doc_id] = tuple(counts)
+        self._lengths[doc_id] = len(tokens)
+        self._total_length += len(tokens)
+
+    def remove(self, doc_id: str) -> None:
+        if doc_id not in self._lengths:
+            return
+        for term in self._doc_terms.pop(doc_id):
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._lengths.pop(doc_id)
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Top k (doc id, score) pairs, best first; documents sharing no term are left out"""
+        if not self._lengths:
+            return []
+        n = len(self._lengths)
+        average_length = self._total_length / n or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def stats(self) -> Dict[str, int]:
+        return {"documents": len(self._lengths), "terms": len(self._postings)}
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """Merge ranked id lists: each id scores sum(1 / (k + rank)) over the lists it appears in"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
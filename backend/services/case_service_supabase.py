@@ -2,6 +2,8 @@
 from typing import List, Optional, Dict, Any
 from schemas.case import CaseCreate, CaseUpdate, CaseResponse
 from services.database_service import get_db_service
+from services.daily_service_supabase import get_batch_id, get_current_batch_id, invalidate_current_batch
+import hashlib
 import logging
 from datetime import datetime
 
@@ -29,6 +31,9 @@ async def create_case(case: CaseCreate) -> Optional[Dict[str, Any]]:
             "membership": case.membership,
             "case_description": case.case_description,
             "in_out": case.in_out,
+            "batch_id": case.batch_id or get_batch_id(),
+            "case_key": case.case_key or compute_case_key(case.dict()),
+            "content_hash": compute_case_content_hash(case.dict()),
             "created_at": datetime.utcnow().isoformat(),
             "updated_at": datetime.utcnow().isoformat()
         }
@@ -38,6 +43,7 @@ async def create_case(case: CaseCreate) -> Optional[Dict[str, Any]]:
         
         if result:
             logger.info(f"Case created successfully: {result['id']}")
+            invalidate_current_batch()
             return result
         else:
             logger.error("Failed to create case: No data returned")
@@ -47,59 +53,187 @@ async def create_case(case: CaseCreate) -> Optional[Dict[str, Any]]:
         logger.error(f"Error creating case: {e}", exc_info=True)
         raise Exception(f"Case creation failed: {str(e)}")
 
-async def bulk_create_cases(cases: List[CaseCreate]) -> List[Dict[str, Any]]:
-    """Create multiple cases at once"""
+# Fields that identify a report case across repeated uploads of the same report. Only fields
+# CaseCreate carries, so a key computed from parsed case data equals one computed from the
+# CaseCreate (the guest is not stored on cases)
+CASE_IDENTITY_FIELDS = ("room", "created", "case_description")
+
+# Report fields whose changes make an already uploaded case "changed". owner_id is left out:
+# assignments are made in the app and must survive re-uploads of the report.
+CASE_CONTENT_FIELDS = (
+    "status", "importance", "type", "title", "action",
+    "modified", "modified_by", "source", "membership", "in_out"
+)
+
+def _normalize(value: Any) -> str:
+    """Normalize a field for hashing so whitespace/case-only edits don't change the hash"""
+    if value is None:
+        return ""
+    return " ".join(str(value).split()).lower()
+
+def _hash_fields(case_data: Dict[str, Any], fields) -> str:
+    joined = "\x1f".join(_normalize(case_data.get(field)) for field in fields)
+    return hashlib.sha256(joined.encode("utf-8")).hexdigest()[:32]
+
+def compute_case_key(case_data: Dict[str, Any]) -> str:
+    """Identity key of a case: hash of room, created timestamp and description"""
+    return _hash_fields(case_data, CASE_IDENTITY_FIELDS)
+
+def compute_case_content_hash(case_data: Dict[str, Any]) -> str:
+    """Hash of the mutable case fields, used to detect edits between uploads"""
+    return _hash_fields(case_data, CASE_CONTENT_FIELDS)
+
+def _case_row(case: CaseCreate, batch_id: str) -> Dict[str, Any]:
+    """Database row for a case, including its identity key and content hash"""
+    case_data = case.dict()
+    return {
+        "room": case.room,
+        "status": case.status,
+        "importance": case.importance,
+        "type": case.type,
+        "title": case.title,
+        "action": case.action,
+        "owner_id": case.owner_id,
+        "created": case.created,
+        "created_by": case.created_by,
+        "modified": case.modified,
+        "modified_by": case.modified_by,
+        "source": case.source,
+        "membership": case.membership,
+        "case_description": case.case_description,
+        "in_out": case.in_out,
+        "batch_id": batch_id,
+        "case_key": case.case_key or compute_case_key(case_data),
+        "content_hash": compute_case_content_hash(case_data),
+        "updated_at": datetime.utcnow().isoformat()
+    }
+
+async def plan_case_upsert(cases: List[CaseCreate], batch_id: Optional[str] = None) -> Dict[str, Any]:
+    """Compare incoming cases with the cases already stored in the batch (read-only).
+
+    Returns the rows to write plus the indices (into `cases`) of new, changed and unchanged
+    cases. `pending` lists the new and changed indices in input order - only those need to be
+    written and sent to the AI. Repeated keys within one upload count once (last one wins).
+    """
+    db_service = await get_db_service()
+    batch_id = batch_id or next((case.batch_id for case in cases if case.batch_id), None) or get_batch_id()
+    rows = [_case_row(case, batch_id) for case in cases]
+    
+    latest_index = {}
+    for i, row in enumerate(rows):
+        latest_index[row["case_key"]] = i
+    
+    existing_rows = await db_service.get_cases_by_keys(batch_id, list(latest_index))
+    existing_by_key = {row["case_key"]: row for row in existing_rows}
+    
+    new, changed, unchanged, changes = [], [], [], []
+    for case_key, i in sorted(latest_index.items(), key=lambda item: item[1]):
+        existing = existing_by_key.get(case_key)
+        if existing is None:
+            new.append(i)
+        elif existing.get("content_hash") != rows[i]["content_hash"]:
+            changed.append(i)
+            changes.append({
+                "case_key": case_key,
+                "case_id": existing["id"],
+                "title": rows[i]["title"],
+                "changed_fields": [
+                    field for field in CASE_CONTENT_FIELDS
+                    if _normalize(existing.get(field)) != _normalize(rows[i].get(field))
+                ]
+            })
+        else:
+            unchanged.append(i)
+    
+    duplicates = len(rows) - len(latest_index)
+    summary = {
+        "batch_id": batch_id,
+        "new": len(new),
+        "changed": len(changed),
+        "unchanged": len(unchanged),
+        "duplicates_in_upload": duplicates,
+        "changes": changes,
+        "message": f"{len(new)} new, {len(changed)} changed, {len(unchanged)} unchanged cases in batch {batch_id}"
+    }
+    
+    return {
+        "batch_id": batch_id,
+        "rows": rows,
+        "existing": existing_by_key,
+        "new": new,
+        "changed": changed,
+        "unchanged": unchanged,
+        "pending": sorted(new + changed),
+        "summary": summary
+    }
+
+async def apply_case_upsert(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Write a plan from plan_case_upsert: one bulk insert for new cases and one upsert
+    (on batch_id + case_key) for changed cases. Unchanged cases are not touched.
+
+    `saved` holds the written rows aligned with plan["pending"]. A failed write raises, so
+    callers report the error instead of "0 created".
+    """
+    db_service = await get_db_service()
+    rows = plan["rows"]
+    now = datetime.utcnow().isoformat()
+    
+    created = []
+    if plan["new"]:
+        created = await db_service.bulk_create("cases", [dict(rows[i], created_at=now) for i in plan["new"]])
+    
+    updated = []
+    if plan["changed"]:
+        changed_rows = [{k: v for k, v in rows[i].items() if k != "owner_id"} for i in plan["changed"]]
+        updated = await db_service.bulk_upsert("cases", changed_rows, on_conflict="batch_id,case_key")
+    
+    saved_by_key = {row["case_key"]: row for row in created + updated}
+    saved = [saved_by_key[rows[i]["case_key"]] for i in plan["pending"] if rows[i]["case_key"] in saved_by_key]
+    
+    if plan["new"] or plan["changed"]:
+        invalidate_current_batch()
+    logger.info(
+        f"Case upsert completed for batch {plan['batch_id']}: {len(created)} created, "
+        f"{len(updated)} updated, {len(plan['unchanged'])} unchanged"
+    )
+    if len(saved) < len(plan["pending"]):
+        logger.warning(f"Some cases failed to save: {len(plan['pending']) - len(saved)} failures")
+    
+    return {
+        "created": created,
+        "updated": updated,
+        "saved": saved,
+        "unchanged": [plan["existing"][rows[i]["case_key"]] for i in plan["unchanged"]]
+    }
+
+async def bulk_create_cases(cases: List[CaseCreate], batch_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Idempotently upsert multiple cases into a report batch (today's by default).
+
+    Cases are matched on their identity key: new ones are inserted, changed ones updated and
+    unchanged ones left alone. Returns the stored row of every distinct case in input order.
+    """
     try:
-        db_service = await get_db_service()
-        created_cases = []
-        
-        logger.info(f"Starting bulk creation of {len(cases)} cases")
-        
-        for i, case in enumerate(cases):
-            case_data = {
-                "room": case.room,
-                "status": case.status,
-                "importance": case.importance,
-                "type": case.type,
-                "title": case.title,
-                "action": case.action,
-                "owner_id": case.owner_id,
-                "created": case.created,
-                "created_by": case.created_by,
-                "modified": case.modified,
-                "modified_by": case.modified_by,
-                "source": case.source,
-                "membership": case.membership,
-                "case_description": case.case_description,
-                "in_out": case.in_out,
-                "created_at": datetime.utcnow().isoformat(),
-                "updated_at": datetime.utcnow().isoformat()
-            }
-            
-            logger.debug(f"Creating case {i+1}/{len(cases)}: {case.title}")
-            result = await db_service.create("cases", case_data)
-            if result:
-                created_cases.append(result)
-                logger.info(f"Successfully created case {i+1}/{len(cases)}: {case.title} (ID: {result.get('id', 'unknown')})")
-            else:
-                logger.error(f"Failed to create case {i+1}/{len(cases)}: {case.title}")
-                logger.error(f"Case data that failed: {case_data}")
-                # Continue with other cases instead of failing completely
+        logger.info(f"Starting bulk upsert of {len(cases)} cases")
+        plan = await plan_case_upsert(cases, batch_id)
+        result = await apply_case_upsert(plan)
         
-        logger.info(f"Bulk creation completed: {len(created_cases)}/{len(cases)} cases created successfully")
-        if len(created_cases) < len(cases):
-            logger.warning(f"Some cases failed to create: {len(cases) - len(created_cases)} failures")
-        return created_cases
+        stored_by_key = {row["case_key"]: row for row in result["saved"] + result["unchanged"]}
+        return [
+            stored_by_key[plan["rows"][i]["case_key"]]
+            for i in sorted(plan["pending"] + plan["unchanged"])
+            if plan["rows"][i]["case_key"] in stored_by_key
+        ]
         
     except Exception as e:
         logger.error(f"Error bulk creating cases: {e}", exc_info=True)
         raise Exception(f"Bulk case creation failed: {str(e)}")
 
 async def get_cases() -> List[Dict[str, Any]]:
-    """Get all cases"""
+    """Get all cases of the current report batch"""
     try:
         db_service = await get_db_service()
-        cases = await db_service.get_all("cases")
+        batch_id = await get_current_batch_id()
+        cases = await db_service.get_all("cases", {"batch_id": batch_id} if batch_id else None)
         return cases
     except Exception as e:
         logger.error(f"Error getting cases: {e}")
@@ -116,10 +250,11 @@ async def get_case_by_id(case_id: int) -> Optional[Dict[str, Any]]:
         return None
 
 async def get_cases_with_followups() -> List[Dict[str, Any]]:
-    """Get all cases with their associated followups and user information"""
+    """Get all cases of the current report batch with their associated followups and user information"""
     try:
         db_service = await get_db_service()
-        cases_with_followups = await db_service.get_cases_with_followups()
+        batch_id = await get_current_batch_id()
+        cases_with_followups = await db_service.get_cases_with_followups(batch_id)
         return cases_with_followups
     except Exception as e:
         logger.error(f"Error getting cases with followups: {e}")
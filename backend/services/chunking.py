@@ -0,0 +1,210 @@
+# backend/services/chunking.py
+
+import logging
+import os
+import re
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.documents import Document
+from langchain_text_splitters import CharacterTextSplitter
+
+from services.vector_store import file_hash
+
+logger = logging.getLogger(__name__)
+
+RAG_CHUNKER = os.getenv("RAG_CHUNKER", "structured")  # structured | character
+RAG_CHUNK_MAX_TOKENS = int(os.getenv("RAG_CHUNK_MAX_TOKENS", "256"))
+RAG_CHUNK_OVERLAP_TOKENS = int(os.getenv("RAG_CHUNK_OVERLAP_TOKENS", "32"))
+TOKEN_ENCODING = "cl100k_base"  # tokenizer of the OpenAI embedding and chat models
+
+# Markdown headings, or short lines in capitals / ending with a colon ("CHECK-IN POLICY", "Pets:")
+_MARKDOWN_HEADING = re.compile(r"^\s{0,3}(#{1,6})\s+(.+?)\s*#*\s*$")
+_PLAIN_HEADING = re.compile(r"^(?=.*[A-Za-zÀ-ÿ])[^a-zà-ÿ.!?]{3,80}$|^[^.!?]{2,60}:$")
+_SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]*\s+")
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(TOKEN_ENCODING)
+    except Exception as e:
+        logger.warning(f"tiktoken encoding unavailable ({e}); estimating 4 characters per token")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def split_by_tokens(text: str, max_tokens: int) -> List[str]:
+    """Cut text into consecutive pieces of at most max_tokens tokens, for runs without
+    spaces (URLs, base64, long identifiers) that no word boundary can split"""
+    encoding = _encoding()
+    if encoding is None:
+        size = max_tokens * 4
+        return [text[start:start + size] for start in range(0, len(text), size)]
+    tokens = encoding.encode(text, disallowed_special=())
+    check_partial = "\ufffd" not in text
+    pieces, start = [], 0
+    while start < len(tokens):
+        end = min(len(tokens), start + max_tokens)
+        piece = encoding.decode(tokens[start:end])
+        # A window can end inside a multi-byte character, and a decoded piece can re-encode
+        # to more tokens than its window: shrink the window until neither happens
+        while end - start > 1 and (count_tokens(piece) > max_tokens or (check_partial and piece.endswith("\ufffd"))):
+            end -= 1
+            piece = encoding.decode(tokens[start:end])
+        pieces.append(piece)
+        start = end
+    return pieces
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence.strip() for sentence in _SENTENCE_END.split(text) if sentence.strip()]
+
+
+class StructuredChunker:
+    """Splits at headings, then packs whole sentences into chunks of at most max_tokens.
+
+    Each chunk starts with its nearest heading and records the full heading path
+    ("Policies > Check-in") in metadata["section"].
+    Chunks of one section share the last overlap_tokens worth of sentences; sections never
+    overlap. Sentences longer than max_tokens are cut at word boundaries, and words longer
+    than that by tokens.
+    """
+
+    def __init__(self, max_tokens: int = RAG_CHUNK_MAX_TOKENS, overlap_tokens: int = RAG_CHUNK_OVERLAP_TOKENS):
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    @property
+    def signature(self) -> str:
+        return f"structured-{self.max_tokens}-{self.overlap_tokens}"
+
+    def _sections(self, text: str) -> List[tuple]:
+        """(heading path, body) pairs in document order, e.g. ("Policies > Check-in", ...).
+        Text before the first heading has an empty path."""
+        sections, stack, lines = [], [], []
+
+        def flush():
+            if any(part.strip() for part in lines):
+                sections.append((" > ".join(title for _, title in stack), "\n".join(lines)))
+            lines.clear()
+
+        for line in text.splitlines():
+            markdown = _MARKDOWN_HEADING.match(line)
+            if markdown:
+                flush()
+                level = len(markdown.group(1))
+                while stack and stack[-1][0] >= level:
+                    stack.pop()
+                stack.append((level, markdown.group(2).rstrip(":")))
+            elif _PLAIN_HEADING.match(line.strip()):
+                # Plain-text headings carry no level; each one starts a new top-level section
+                flush()
+                stack = [(1, line.strip().rstrip(":"))]
+            else:
+                lines.append(line)
+        flush()
+        return sections
+
+    def _pieces(self, body: str, budget: int) -> List[tuple]:
+        """(sentence, tokens) pairs, with over-long sentences cut to fit the budget"""
+        pieces = []
+        for paragraph in re.split(r"\n\s*\n", body):
+            for sentence in split_sentences(" ".join(paragraph.split())):
+                tokens = count_tokens(sentence)
+                if tokens <= budget:
+                    pieces.append((sentence, tokens))
+                    continue
+                words, current = sentence.split(), []
+                for word in words:
+                    if current and count_tokens(" ".join(current + [word])) > budget:
+                        pieces.append((" ".join(current), count_tokens(" ".join(current))))
+                        current = []
+                    if count_tokens(word) > budget:
+                        # A single word over the budget is cut by tokens
+                        pieces.extend((part, count_tokens(part)) for part in split_by_tokens(word, budget))
+                        continue
+                    current.append(word)
+                if current:
+                    pieces.append((" ".join(current), count_tokens(" ".join(current))))
+        return pieces
+
+    def split_text(self, text: str) -> List[Dict[str, str]]:
+        chunks = []
+        for heading, body in self._sections(text):
+            # Only the nearest heading goes into the text: the full path repeats the same
+            # words in every chunk of a document, costing tokens and blurring BM25 matches
+            title = heading.rsplit(" > ", 1)[-1]
+            prefix = f"{title}\n" if title else ""
+            budget = max(1, self.max_tokens - (count_tokens(prefix) if prefix else 0))
+            current, current_tokens = [], 0
+            for sentence, tokens in self._pieces(body, budget):
+                if current and current_tokens + tokens > budget:
+                    chunks.append({"section": heading, "text": prefix + " ".join(s for s, _ in current)})
+                    # Carry the tail of the finished chunk over, up to overlap_tokens
+                    carried, carried_tokens = [], 0
+                    for previous, previous_tokens in reversed(current):
+                        if carried_tokens + previous_tokens > self.overlap_tokens:
+                            break
+                        carried.insert(0, (previous, previous_tokens))
+                        carried_tokens += previous_tokens
+                    if carried_tokens + tokens > budget:
+                        carried, carried_tokens = [], 0
+                    current, current_tokens = carried, carried_tokens
+                current.append((sentence, tokens))
+                current_tokens += tokens
+            if current:
+                chunks.append({"section": heading, "text": prefix + " ".join(s for s, _ in current)})
+        return chunks
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        return [
+            Document(page_content=chunk["text"], metadata=dict(doc.metadata, section=chunk["section"]))
+            for doc in documents
+            for chunk in self.split_text(doc.page_content)
+        ]
+
+
+class CharacterChunker:
+    """The original fixed-size splitter: 1000 characters with 200 of overlap"""
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+        self.splitter = CharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        self.signature = f"character-{chunk_size}-{chunk_overlap}"
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        return self.splitter.split_documents(documents)
+
+
+CHUNKERS: Dict[str, Callable[[], object]] = {
+    "structured": StructuredChunker,
+    "character": CharacterChunker,
+}
+
+
+def register_chunker(name: str, factory: Callable[[], object]) -> None:
+    """Make a chunker selectable through RAG_CHUNKER. It needs split_documents(docs) and a
+    signature string that changes whenever its output would"""
+    CHUNKERS[name] = factory
+
+
+def get_chunker(name: Optional[str] = None):
+    name = name or RAG_CHUNKER
+    if name not in CHUNKERS:
+        raise ValueError(f"Unknown chunker '{name}', expected one of {', '.join(CHUNKERS)}")
+    return CHUNKERS[name]()
+
+
+def source_hash(data: bytes, chunker_name: Optional[str] = None) -> str:
+    """Version of a source file for the vectorstore: its content hash plus the chunker
+    settings, so changing the chunker re-chunks files that didn't change"""
+    return f"{file_hash(data)}:{get_chunker(chunker_name).signature}"
@@ -0,0 +1,119 @@
+# backend/services/context_packer.py
+
+import os
+import re
+from typing import Any, Dict, List
+
+from langchain_core.documents import Document
+
+from services.chunking import count_tokens, split_sentences
+
+RAG_CONTEXT_MAX_TOKENS = int(os.getenv("RAG_CONTEXT_MAX_TOKENS", "1500"))
+RAG_HISTORY_MAX_TOKENS = int(os.getenv("RAG_HISTORY_MAX_TOKENS", "1500"))
+# A chunk that only partly fits is cut to the remaining budget if that leaves at least
+# this many tokens; smaller leftovers are dropped
+MIN_TRUNCATED_TOKENS = 48
+# Tokens the chat format adds per message on top of its content
+MESSAGE_OVERHEAD_TOKENS = 4
+# Shorter units (headings, list bullets) are kept even when repeated
+_MIN_DEDUPE_CHARS = 20
+
+
+def _units(text: str) -> List[str]:
+    """Lines split into sentences; headings stay on their own"""
+    return [sentence for line in text.splitlines() for sentence in split_sentences(line)]
+
+
+def _normalize(unit: str) -> str:
+    return re.sub(r"\W+", " ", unit.lower()).strip()
+
+
+def _truncate(units: List[str], budget: int) -> List[str]:
+    kept, used = [], 0
+    for unit in units:
+        tokens = count_tokens(unit)
+        if used + tokens > budget:
+            break
+        kept.append(unit)
+        used += tokens
+    return kept
+
+
+def pack_context(docs: List[Document], max_tokens: int = RAG_CONTEXT_MAX_TOKENS) -> Dict[str, Any]:
+    """Assemble retrieved chunks (best first) into a context string within max_tokens.
+
+    Sentences already included from a better-ranked chunk are skipped, which removes the
+    overlap between neighbouring chunks. Chunks are added in rank order until the budget
+    runs out; the first one that doesn't fit is cut at a sentence boundary, the rest dropped.
+    """
+    seen = set()
+    parts, used_docs = [], []
+    used_tokens = duplicate_sentences = 0
+    truncated = False
+
+    for doc in docs:
+        units, new_units = [], 0
+        for unit in _units(doc.page_content):
+            key = _normalize(unit)
+            if key in seen:
+                if len(key) >= _MIN_DEDUPE_CHARS:
+                    duplicate_sentences += 1
+                    continue
+            else:
+                seen.add(key)
+                new_units += 1
+            units.append(unit)
+        if not new_units:
+            continue  # fully covered by better-ranked chunks
+
+        text = "\n".join(units)
+        tokens = count_tokens(text)
+        remaining = max_tokens - used_tokens
+        if tokens > remaining:
+            if remaining < MIN_TRUNCATED_TOKENS:
+                break
+            units = _truncate(units, remaining)
+            if not units:
+                break
+            text = "\n".join(units)
+            tokens = count_tokens(text)
+            truncated = True
+        parts.append(text)
+        used_docs.append(doc)
+        used_tokens += tokens
+        if truncated:
+            break
+
+    return {
+        "text": "\n\n".join(parts),
+        "documents": used_docs,
+        "tokens": used_tokens,
+        "chunks_retrieved": len(docs),
+        "chunks_used": len(used_docs),
+        "duplicate_sentences": duplicate_sentences,
+        "truncated": truncated,
+    }
+
+
+def message_tokens(message: Dict[str, str]) -> int:
+    return count_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+
+def trim_history(messages: List[Dict[str, str]], max_tokens: int = RAG_HISTORY_MAX_TOKENS) -> Dict[str, Any]:
+    """Keep the newest messages that fit in max_tokens, dropping the oldest turns first.
+    The last message (the current question) is always kept."""
+    kept, used = [], 0
+    for index, message in enumerate(reversed(messages)):
+        tokens = message_tokens(message)
+        if index > 0 and used + tokens > max_tokens:
+            break
+        kept.insert(0, message)
+        used += tokens
+    # Don't open the conversation with an assistant reply whose question was trimmed
+    while len(kept) > 1 and kept[0].get("role") == "assistant":
+        used -= message_tokens(kept.pop(0))
+    return {
+        "messages": kept,
+        "tokens": used,
+        "messages_dropped": len(messages) - len(kept),
+    }
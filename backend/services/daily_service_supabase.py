@@ -1,10 +1,27 @@
 from supabase_client import get_supabase
-from typing import List
-from datetime import date, datetime
+from typing import List, Optional
+from datetime import date, datetime, timedelta
+import asyncio
 import logging
+import os
+import time
 
 logger = logging.getLogger(__name__)
 
+# Report batches: every uploaded report is tagged with the report date it belongs to
+# (batch_id = "YYYY-MM-DD"). Reads are scoped to the newest batch and old batches are
+# pruned in the background instead of wiping the tables on every upload.
+BATCH_RETENTION_DAYS = int(os.getenv("BATCH_RETENTION_DAYS", "7"))
+BATCH_PRUNE_INTERVAL_SECONDS = int(os.getenv("BATCH_PRUNE_INTERVAL_SECONDS", "3600"))
+CURRENT_BATCH_CACHE_SECONDS = 30
+# Expired cases are pruned in pages of this many ids (they end up in the URL of an IN filter)
+PRUNE_PAGE_SIZE = 500
+
+_current_batch = {"batch_id": None, "expires_at": 0.0}
+
+# Tables emptied by clear_all_data, in the order verify_data_cleared reports them
+CLEARED_TABLES = ("cases", "followups", "tasks", "documents")
+
 async def clear_all_data() -> dict:
     """Clear all data from the Supabase database - cases, followups, tasks, and documents"""
     try:
@@ -40,22 +57,17 @@ async def clear_all_data() -> dict:
         raise Exception(f"Error clearing data: {str(e)}")
 
 async def verify_data_cleared() -> dict:
-    """Verify that all data has been cleared from the Supabase database"""
+    """Verify that all data has been cleared from the Supabase database.
+
+    Uses count-only queries (no rows are transferred) and checks the four tables concurrently.
+    """
     try:
         supabase = get_supabase()
         
         # Check remaining records in each table
-        cases_result = supabase.table("cases").select("id").execute()
-        cases_count = len(cases_result.data) if cases_result.data else 0
-        
-        followups_result = supabase.table("followups").select("id").execute()
-        followups_count = len(followups_result.data) if followups_result.data else 0
-        
-        tasks_result = supabase.table("tasks").select("id").execute()
-        tasks_count = len(tasks_result.data) if tasks_result.data else 0
-        
-        documents_result = supabase.table("documents").select("id").execute()
-        documents_count = len(documents_result.data) if documents_result.data else 0
+        cases_count, followups_count, tasks_count, documents_count = await asyncio.gather(
+            *(asyncio.to_thread(_count_rows, supabase, table) for table in CLEARED_TABLES)
+        )
         
         total_remaining = cases_count + followups_count + tasks_count + documents_count
         
@@ -76,43 +88,183 @@ async def verify_data_cleared() -> dict:
             "message": f"Error verifying data clearance: {str(e)}"
         }
 
-async def reset_daily_cases() -> dict:
-    """Reset cases for a new day - archive current cases and create fresh ones"""
+async def wait_for_data_cleared(timeout: float = 5.0, initial_delay: float = 0.05) -> dict:
+    """Read-after-write check for clear_all_data.
+
+    Re-runs verify_data_cleared with a short exponential backoff until the deletes are
+    visible or the timeout expires, instead of sleeping a fixed amount before a single check.
+    In the normal case the first check already passes and no sleep happens at all.
+    """
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    attempts = 0
+    
+    while True:
+        verification = await verify_data_cleared()
+        attempts += 1
+        if verification["is_cleared"] or "error" in verification or time.monotonic() + delay > deadline:
+            verification["attempts"] = attempts
+            return verification
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 1.0)
+
+def _count_rows(supabase, table: str, apply_filter=None) -> int:
+    """Count rows in a table (optionally filtered) without fetching any of them"""
+    query = supabase.table(table).select("id", count="exact").limit(0)
+    if apply_filter:
+        query = apply_filter(query)
+    response = query.execute()
+    return response.count or 0
+
+def _not_archived(query):
+    """Filter for cases that still need archiving (IS DISTINCT FROM keeps NULL statuses)"""
+    return query.filter("status", "isdistinct", "archived")
+
+def _not_completed(query):
+    """Filter for tasks that still need completing (IS DISTINCT FROM keeps NULL statuses)"""
+    return query.filter("status", "isdistinct", "completed")
+
+async def reset_daily_cases(dry_run: bool = False) -> dict:
+    """Reset cases for a new day - archive current cases and complete open tasks.
+
+    Uses one filtered UPDATE per table instead of one request per row. Only counts
+    are fetched; with dry_run=True nothing is written and the counts describe what
+    a real reset would change.
+    """
     try:
+        start_time = time.perf_counter()
         supabase = get_supabase()
         today = date.today().strftime("%Y-%m-%d")
         
-        # Get all current cases
-        cases_result = supabase.table("cases").select("*").execute()
-        current_cases = cases_result.data if cases_result.data else []
-        
-        # Archive current cases by updating their status
-        archived_count = 0
-        for case in current_cases:
-            supabase.table("cases").update({"status": "archived"}).eq("id", case["id"]).execute()
-            archived_count += 1
+        # Count what the reset would touch (no rows are transferred)
+        cases_to_archive = _count_rows(supabase, "cases", _not_archived)
+        tasks_to_complete = _count_rows(supabase, "tasks", _not_completed)
+        completed_followups = _count_rows(supabase, "followups")
         
-        # Get all current followups
-        followups_result = supabase.table("followups").select("*").execute()
-        current_followups = followups_result.data if followups_result.data else []
-        completed_followups = len(current_followups)
+        if not dry_run:
+            # One set-based UPDATE per table; returning=minimal keeps the response body empty
+            if cases_to_archive:
+                _not_archived(
+                    supabase.table("cases").update({"status": "archived"}, returning="minimal")
+                ).execute()
+            if tasks_to_complete:
+                _not_completed(
+                    supabase.table("tasks").update({"status": "completed"}, returning="minimal")
+                ).execute()
         
-        # Get all current tasks and mark as completed
-        tasks_result = supabase.table("tasks").select("*").execute()
-        current_tasks = tasks_result.data if tasks_result.data else []
-        completed_tasks = 0
-        
-        for task in current_tasks:
-            supabase.table("tasks").update({"status": "completed"}).eq("id", task["id"]).execute()
-            completed_tasks += 1
+        duration_ms = round((time.perf_counter() - start_time) * 1000, 2)
+        summary = f"{cases_to_archive} cases archived, {completed_followups} followups completed, {tasks_to_complete} tasks completed"
+        if dry_run:
+            message = f"Dry run (no changes made): {summary}"
+        else:
+            message = f"Daily reset completed: {summary}"
+        logger.info(f"{message} in {duration_ms}ms")
         
         return {
             "date": today,
-            "cases_archived": archived_count,
+            "dry_run": dry_run,
+            "cases_archived": cases_to_archive,
             "followups_completed": completed_followups,
-            "tasks_completed": completed_tasks,
-            "message": f"Daily reset completed: {archived_count} cases archived, {completed_followups} followups completed, {completed_tasks} tasks completed"
+            "tasks_completed": tasks_to_complete,
+            "duration_ms": duration_ms,
+            "message": message
         }
     except Exception as e:
         logger.error(f"Error resetting daily cases: {e}")
         raise Exception(f"Error resetting daily cases: {str(e)}")
+
+def _delete_rows(supabase, table: str, apply_filter) -> None:
+    """Delete the rows matched by apply_filter without returning them"""
+    apply_filter(supabase.table(table).delete(returning="minimal")).execute()
+
+def _expired_case_ids(supabase, cutoff: str, limit: int) -> List[int]:
+    """Ids of up to `limit` cases from batches before the cutoff"""
+    response = supabase.table("cases").select("id").lt("batch_id", cutoff).order("id").limit(limit).execute()
+    return [row["id"] for row in response.data or []]
+
+def get_batch_id(report_date: Optional[date] = None) -> str:
+    """Batch identifier for a report date (defaults to today)"""
+    return (report_date or date.today()).isoformat()
+
+def invalidate_current_batch():
+    """Forget the cached current batch so the next read looks it up again"""
+    _current_batch["expires_at"] = 0.0
+
+async def get_current_batch_id() -> Optional[str]:
+    """Return the newest report batch, or None when no batched cases exist yet.
+
+    The value is cached for a few seconds so scoped reads don't pay an extra round trip.
+    """
+    now = time.monotonic()
+    if now < _current_batch["expires_at"]:
+        return _current_batch["batch_id"]
+    
+    try:
+        supabase = get_supabase()
+        response = (
+            supabase.table("cases")
+            .select("batch_id")
+            .not_.is_("batch_id", "null")
+            .order("batch_id", desc=True)
+            .limit(1)
+            .execute()
+        )
+        batch_id = response.data[0]["batch_id"] if response.data else None
+    except Exception as e:
+        logger.error(f"Error looking up current batch: {e}")
+        return _current_batch["batch_id"]
+    
+    _current_batch["batch_id"] = batch_id
+    _current_batch["expires_at"] = now + CURRENT_BATCH_CACHE_SECONDS
+    return batch_id
+
+async def prune_expired_batches(retention_days: int = BATCH_RETENTION_DAYS) -> dict:
+    """Delete report batches older than the retention window (followups first, then cases).
+
+    Followups are selected through their case, not their own batch_id, since
+    followups.case_id has no ON DELETE CASCADE. The current batch is never pruned,
+    even if it is older than the window.
+    """
+    try:
+        start_time = time.perf_counter()
+        supabase = get_supabase()
+        
+        cutoff = get_batch_id(date.today() - timedelta(days=retention_days))
+        current_batch = await get_current_batch_id()
+        if current_batch and current_batch < cutoff:
+            cutoff = current_batch
+        
+        deleted = {"followups": 0, "cases": 0}
+        # Each page is deleted before the next is read, so the first page is always the next one
+        while case_ids := await asyncio.to_thread(_expired_case_ids, supabase, cutoff, PRUNE_PAGE_SIZE):
+            of_cases = lambda query: query.in_("case_id", case_ids)
+            followups = await asyncio.to_thread(_count_rows, supabase, "followups", of_cases)
+            if followups:
+                await asyncio.to_thread(_delete_rows, supabase, "followups", of_cases)
+            await asyncio.to_thread(_delete_rows, supabase, "cases", lambda query: query.in_("id", case_ids))
+            deleted["followups"] += followups
+            deleted["cases"] += len(case_ids)
+        
+        duration_ms = round((time.perf_counter() - start_time) * 1000, 2)
+        message = f"Pruned batches before {cutoff}: {deleted['cases']} cases, {deleted['followups']} followups"
+        logger.info(f"{message} in {duration_ms}ms")
+        
+        return {
+            "cutoff": cutoff,
+            "cases_deleted": deleted["cases"],
+            "followups_deleted": deleted["followups"],
+            "duration_ms": duration_ms,
+            "message": message
+        }
+    except Exception as e:
+        logger.error(f"Error pruning expired batches: {e}")
+        raise Exception(f"Error pruning expired batches: {str(e)}")
+
+async def run_batch_pruning(interval_seconds: int = BATCH_PRUNE_INTERVAL_SECONDS):
+    """Background job: prune expired batches periodically until cancelled"""
+    while True:
+        try:
+            await prune_expired_batches()
+        except Exception as e:
+            logger.error(f"Batch pruning run failed: {e}")
+        await asyncio.sleep(interval_seconds)
@@ -52,6 +52,32 @@ class DatabaseService:
             logger.error(f"Error creating record in {table}: {e}", exc_info=True)
             return None
     
+    async def bulk_create(self, table: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Create several records with a single request. Raises if the request fails: the
+        whole batch is rejected, so callers must not report it as written."""
+        try:
+            response = self.supabase.table(table).insert(rows).execute()
+        except Exception as e:
+            logger.error(f"Error bulk creating {len(rows)} records in {table}: {e}", exc_info=True)
+            raise Exception(f"Bulk create in {table} failed: {str(e)}")
+        result = self._handle_response(response, f"Bulk create in {table}")
+        if result is None:
+            raise Exception(f"Bulk create in {table} failed: No data returned")
+        return result
+    
+    async def bulk_upsert(self, table: str, rows: List[Dict[str, Any]], on_conflict: str) -> List[Dict[str, Any]]:
+        """Insert or update several records with a single request, matching on the on_conflict
+        columns. Raises if the request fails, like bulk_create."""
+        try:
+            response = self.supabase.table(table).upsert(rows, on_conflict=on_conflict).execute()
+        except Exception as e:
+            logger.error(f"Error bulk upserting {len(rows)} records in {table}: {e}", exc_info=True)
+            raise Exception(f"Bulk upsert in {table} failed: {str(e)}")
+        result = self._handle_response(response, f"Bulk upsert in {table}")
+        if result is None:
+            raise Exception(f"Bulk upsert in {table} failed: No data returned")
+        return result
+    
     async def get_by_field(self, table: str, field: str, value: Any) -> List[Dict[str, Any]]:
         """Get records by field value"""
         try:
@@ -140,18 +166,36 @@ class DatabaseService:
             logger.error(f"Error getting user by ID: {e}")
             return None
 
-    async def get_cases_with_followups(self) -> List[Dict[str, Any]]:
-        """Get cases with their followups and user information"""
+    async def get_cases_by_keys(self, batch_id: str, case_keys: List[str]) -> List[Dict[str, Any]]:
+        """Get the cases of a batch whose identity keys are in case_keys"""
+        if not case_keys:
+            return []
+        try:
+            response = self.supabase.table("cases").select("*").eq("batch_id", batch_id).in_("case_key", case_keys).execute()
+            result = self._handle_response(response, "Get cases by keys")
+            return result or []
+        except Exception as e:
+            logger.error(f"Error getting cases by keys: {e}")
+            return []
+
+    async def get_cases_with_followups(self, batch_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get cases with their followups and user information, optionally scoped to one report batch"""
         try:
             # Get cases first
-            cases_response = self.supabase.table("cases").select("*").execute()
+            cases_query = self.supabase.table("cases").select("*")
+            if batch_id:
+                cases_query = cases_query.eq("batch_id", batch_id)
+            cases_response = cases_query.execute()
             cases = self._handle_response(cases_response, "Get cases")
             
             if not cases:
                 return []
             
             # Get followups for all cases
-            followups_response = self.supabase.table("followups").select("*").execute()
+            followups_query = self.supabase.table("followups").select("*")
+            if batch_id:
+                followups_query = followups_query.eq("batch_id", batch_id)
+            followups_response = followups_query.execute()
             followups = self._handle_response(followups_response, "Get followups") or []
             
             # Group followups by case_id
@@ -198,11 +242,14 @@ class DatabaseService:
             logger.error(f"Error getting cases with followups: {e}")
             return []
     
-    async def get_followups_with_case_info(self) -> List[Dict[str, Any]]:
-        """Get followups with case information"""
+    async def get_followups_with_case_info(self, batch_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get followups with case information, optionally scoped to one report batch"""
         try:
             # Get followups with case info using join-like query
-            response = self.supabase.table("followups").select("*, cases(*)").execute()
+            query = self.supabase.table("followups").select("*, cases(*)")
+            if batch_id:
+                query = query.eq("batch_id", batch_id)
+            response = query.execute()
             result = self._handle_response(response, "Get followups with case info")
             return result or []
         except Exception as e:
@@ -0,0 +1,96 @@
+# backend/services/document_ingestion.py
+
+import logging
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from langchain_community.document_loaders import PyPDFLoader, TextLoader
+from langchain_core.documents import Document
+
+from services.chunking import get_chunker
+
+logger = logging.getLogger(__name__)
+
+INGEST_DOWNLOAD_WORKERS = int(os.getenv("INGEST_DOWNLOAD_WORKERS", "8"))
+INGEST_PROCESS_WORKERS = int(os.getenv("INGEST_PROCESS_WORKERS", str(os.cpu_count() or 1)))
+
+LOADABLE_EXTENSIONS = (".txt", ".md", ".pdf")
+
+
+def is_loadable(filename: str) -> bool:
+    return filename.lower().endswith(LOADABLE_EXTENSIONS)
+
+
+def load_and_split(file_path: str, metadata: Optional[Dict[str, Any]] = None, split: bool = True,
+                   chunker: Optional[str] = None) -> List[Document]:
+    """Load a text, markdown or PDF file and split it into chunks carrying `metadata`.
+
+    Top-level so it can run in a worker process; `chunker` is a name from CHUNKERS
+    (default RAG_CHUNKER).
+    """
+    if file_path.lower().endswith(".pdf"):
+        loader = PyPDFLoader(file_path)
+    else:
+        loader = TextLoader(file_path, encoding="utf-8")
+    docs = loader.load()
+    for doc in docs:
+        doc.metadata.update(metadata or {})
+    if split:
+        docs = get_chunker(chunker).split_documents(docs)
+    return docs
+
+
+def ingest_files(jobs: Iterable[Dict[str, Any]], split: bool = True,
+                 download_workers: int = INGEST_DOWNLOAD_WORKERS,
+                 process_workers: int = INGEST_PROCESS_WORKERS) -> Iterator[Tuple[Dict[str, Any], Optional[List[Document]], Optional[Exception]]]:
+    """Fetch, load and split files concurrently, yielding (job, docs, error) as each file is ready.
+
+    A job is a dict with a "source", either a local "path" or a "fetch" callable returning
+    one (run on the download thread pool), and optional chunk "metadata". PDF extraction and
+    splitting run on a process pool when more than one core is available; text files are
+    cheap and stay on threads. Results stream out in completion order, so the caller can
+    embed and index one file while the others are still being downloaded and parsed.
+    """
+    thread_pool = ThreadPoolExecutor(max_workers=max(1, download_workers))
+    process_pool = None
+    pending = {}
+
+    def start_load(job: Dict[str, Any], path: str) -> None:
+        nonlocal process_pool
+        if path.lower().endswith(".pdf") and process_workers > 1:
+            if process_pool is None:
+                # spawn: the API process has live threads, which fork doesn't copy safely
+                process_pool = ProcessPoolExecutor(max_workers=process_workers,
+                                                   mp_context=multiprocessing.get_context("spawn"))
+            executor = process_pool
+        else:
+            executor = thread_pool
+        pending[executor.submit(load_and_split, path, job.get("metadata"), split)] = ("load", job)
+
+    try:
+        for job in jobs:
+            if "fetch" in job:
+                pending[thread_pool.submit(job["fetch"])] = ("fetch", job)
+            else:
+                start_load(job, job["path"])
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, job = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to {stage} {job['source']}: {e}")
+                    yield job, None, e
+                    continue
+                if stage == "fetch":
+                    start_load(job, result)
+                else:
+                    yield job, result, None
+    finally:
+        thread_pool.shutdown(cancel_futures=True)
+        if process_pool is not None:
+            process_pool.shutdown(cancel_futures=True)
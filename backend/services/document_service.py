@@ -1,13 +1,20 @@
 # services/document_service.py
+import os
 import re
+import asyncio
 import pdfplumber
 from fastapi import UploadFile
 from io import BytesIO
 from docx import Document
-from typing import List, Dict, Optional
+from typing import Any, Callable, List, Dict, Optional
 import zipfile
 import xml.etree.ElementTree as ET
 
+# How cases are extracted from report text: regex (default), ai (one request) or
+# ai_map_reduce (token-bounded parts parsed concurrently, then merged)
+DOCUMENT_PARSING_ENGINE = os.getenv("DOCUMENT_PARSING_ENGINE", "regex").lower()
+PARSING_ENGINES = ("regex", "ai", "ai_map_reduce")
+
 # Lazy loading of spaCy model
 _nlp = None
 
@@ -615,44 +622,96 @@ def parse_cases(text: str, status_type_info: dict = None) -> list:
     print(f"DEBUG: Total cases found: {len(cases)}")
     return cases
 
-def process_document(file: UploadFile) -> list:
-    """Optimized pipeline: extract → try AI parsing → fallback to regex parsing"""
-    try:
-        # Extract text once and cache it
-        if file.filename.lower().endswith('.pdf'):
-            raw_text = extract_text_from_pdf(file)
-        elif file.filename.lower().endswith('.docx'):
-            raw_text = extract_text_from_docx(file)
-        elif file.filename.lower().endswith('.txt'):
-            # For text files, just read the content directly
+def extract_document_text(file: UploadFile) -> str:
+    """Raw text of an uploaded PDF, Word or text file"""
+    if file.filename.lower().endswith('.pdf'):
+        return extract_text_from_pdf(file)
+    elif file.filename.lower().endswith('.docx'):
+        return extract_text_from_docx(file)
+    elif file.filename.lower().endswith('.txt'):
+        # For text files, just read the content directly
+        try:
+            return file.file.read().decode('utf-8')
+        except UnicodeDecodeError:
+            # Try different encodings if utf-8 fails
+            file.file.seek(0)  # Reset file pointer
             try:
-                raw_text = file.file.read().decode('utf-8')
-            except UnicodeDecodeError:
-                # Try different encodings if utf-8 fails
-                file.file.seek(0)  # Reset file pointer
-                try:
-                    raw_text = file.file.read().decode('latin-1')
-                except:
-                    file.file.seek(0)
-                    raw_text = file.file.read().decode('cp1252')
+                return file.file.read().decode('latin-1')
+            except:
+                file.file.seek(0)
+                return file.file.read().decode('cp1252')
+    else:
+        raise ValueError(f"Unsupported file type: {file.filename}")
+
+def parse_cases_with_regex(anonymized_text: str) -> list:
+    status_type_info = extract_status_type_info(anonymized_text)
+    return parse_cases(anonymized_text, status_type_info)
+
+async def parse_document_text(raw_text: str, engine: Optional[str] = None,
+                              on_case: Optional[Callable[[Dict[str, Any]], None]] = None) -> list:
+    """Anonymize report text and extract its cases with the selected parsing engine.
+    AI engines stream: on_case gets each case as soon as it's parsed. They fall back to
+    regex parsing when they return no cases (on_case is not called for regex results)."""
+    engine = (engine or DOCUMENT_PARSING_ENGINE).lower()
+    if engine not in PARSING_ENGINES:
+        raise ValueError(f"Unknown parsing engine '{engine}', expected one of {', '.join(PARSING_ENGINES)}")
+    
+    # Apply automatic anonymization to protect privacy
+    anonymized_text = await asyncio.to_thread(anonymise_text, raw_text)
+    
+    if engine != "regex":
+        from services.ai_service import parse_document_map_reduce, parse_document_with_ai
+        if engine == "ai_map_reduce":
+            cases = await parse_document_map_reduce(anonymized_text, on_case=on_case)
         else:
-            raise ValueError(f"Unsupported file type: {file.filename}")
+            cases = await parse_document_with_ai(anonymized_text, on_case=on_case)
+        if cases:
+            return cases
+        print(f"{engine} parsing found no cases, falling back to regex parsing")
+    
+    # Optimized regex parsing with anonymized text
+    return await asyncio.to_thread(parse_cases_with_regex, anonymized_text)
+
+async def process_document_async(file: UploadFile, engine: Optional[str] = None,
+                                 on_case: Optional[Callable[[Dict[str, Any]], None]] = None) -> list:
+    """Pipeline: extract → parse with the selected engine (DOCUMENT_PARSING_ENGINE by default).
+    Extraction and regex parsing run in a worker thread, AI requests on the event loop."""
+    try:
+        raw_text = await asyncio.to_thread(extract_document_text, file)
         
         # Quick validation
         if not raw_text or len(raw_text.strip()) < 10:
             return []
         
-        # Apply automatic anonymization to protect privacy
-        anonymized_text = anonymise_text(raw_text)
+        return await parse_document_text(raw_text, engine, on_case)
         
-        # Skip AI parsing - use regex parsing directly
-        # AI parsing disabled per user preference
+    except Exception as e:
+        print(f"ERROR in process_document: {e}")
+        raise
+
+async def _process_document_in_own_loop(file: UploadFile, engine: str) -> list:
+    """process_document_async for asyncio.run: the loop's OpenAI client is closed before the loop is"""
+    from services.openai_client import close_async_client
+    try:
+        return await process_document_async(file, engine)
+    finally:
+        await close_async_client()
+
+def process_document(file: UploadFile, engine: Optional[str] = None) -> list:
+    """Synchronous pipeline for scripts and worker threads; API routes use process_document_async"""
+    engine = (engine or DOCUMENT_PARSING_ENGINE).lower()
+    if engine != "regex":
+        return asyncio.run(_process_document_in_own_loop(file, engine))
+    try:
+        # Extract text once and cache it
+        raw_text = extract_document_text(file)
         
-        # Fallback to optimized regex parsing with anonymized text
-        status_type_info = extract_status_type_info(anonymized_text)
-        cases = parse_cases(anonymized_text, status_type_info)
+        # Quick validation
+        if not raw_text or len(raw_text.strip()) < 10:
+            return []
         
-        return cases
+        # Apply automatic anonymization to protect privacy
+        return parse_cases_with_regex(anonymise_text(raw_text))
         
     except Exception as e:
         print(f"ERROR in process_document: {e}")
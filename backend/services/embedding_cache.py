@@ -0,0 +1,154 @@
+# backend/services/embedding_cache.py
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+def embedding_model_name(embeddings: Embeddings) -> str:
+    """Model identifier used in cache keys, so switching models never reuses vectors"""
+    return getattr(embeddings, "model", None) or type(embeddings).__name__
+
+
+def embedding_cache_key(text: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\x1f{text}".encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper with a persistent SQLite cache keyed by hash(text, model).
+
+    Only texts missing from the cache are sent to the underlying embeddings, so rebuilding
+    the vectorstore or re-uploading documents only embeds new chunks. The cache keeps at
+    most max_entries vectors and evicts the least recently used ones.
+    """
+
+    def __init__(self, embeddings: Embeddings, path: str = EMBEDDING_CACHE_PATH,
+                 max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.embeddings = embeddings
+        self.model = embedding_model_name(embeddings)
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        now = time.time()
+        for start in range(0, len(keys), _SQL_BATCH):
+            batch = keys[start:start + _SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            if rows:
+                self._conn.execute(
+                    f"UPDATE embeddings SET last_used = ? WHERE key IN ({','.join('?' * len(rows))})",
+                    [now] + [key for key, _ in rows]
+                )
+        return found
+
+    def _store(self, items: Dict[str, List[float]]) -> None:
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, model, vector, last_used) VALUES (?, ?, ?, ?)",
+            [(key, self.model, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items.items()]
+        )
+        self._evict()
+
+    def _evict(self) -> None:
+        """Drop the least recently used vectors beyond max_entries"""
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,)
+            )
+            self.evictions += excess
+            logger.info(f"Embedding cache evicted {excess} least recently used vectors")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [embedding_cache_key(text, self.model) for text in texts]
+        with self._lock:
+            cached = self._lookup(list(set(keys)))
+            self._conn.commit()
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        if missing:
+            text_keys = {text: key for key, text in missing.items()}
+
+            def checkpoint(texts: List[str], vectors: List[List[float]]) -> None:
+                new_items = {text_keys[text]: vector for text, vector in zip(texts, vectors)}
+                with self._lock:
+                    self._store(new_items)
+                    self._conn.commit()
+                cached.update(new_items)
+
+            # Batched embeddings persist every finished batch, so an interrupted build resumes
+            embed_in_batches = getattr(self.embeddings, "embed_in_batches", None)
+            if embed_in_batches:
+                embed_in_batches(list(missing.values()), on_batch=checkpoint)
+            else:
+                checkpoint(list(missing.values()), self.embeddings.embed_documents(list(missing.values())))
+
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        logger.info(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} chunks embedded")
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit-rate and size statistics (hits/misses counted since start-up)"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "model": self.model,
+            "path": self.path,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "pipeline": self.embeddings.stats() if hasattr(self.embeddings, "stats") else None
+        }
+
@@ -0,0 +1,207 @@
+# backend/services/embedding_pipeline.py
+
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional
+
+import openai
+from langchain_core.embeddings import Embeddings
+
+from services.embedding_cache import CachedEmbeddings, embedding_model_name
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai")  # openai | fake
+EMBEDDING_FAKE_DIMENSION = int(os.getenv("EMBEDDING_FAKE_DIMENSION", "256"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+EMBEDDING_REQUESTS_PER_MINUTE = float(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE", "500"))  # 0 = unlimited
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
+EMBEDDING_RETRY_BASE_SECONDS = float(os.getenv("EMBEDDING_RETRY_BASE_SECONDS", "1"))
+EMBEDDING_RETRY_MAX_SECONDS = float(os.getenv("EMBEDDING_RETRY_MAX_SECONDS", "60"))
+
+# HTTP statuses worth retrying; anything else (bad key, bad input) fails immediately
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def is_retryable(error: Exception) -> bool:
+    """Only transient OpenAI failures are retried; bugs and rejected requests fail at once"""
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError, openai.RateLimitError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+class RequestRateLimiter:
+    """Spaces requests evenly so at most requests_per_minute start per minute"""
+
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Block until a request may start; returns the seconds waited"""
+        if not self.interval:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        wait_seconds = start - now
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+        return wait_seconds
+
+
+class SerializedEmbeddings(Embeddings):
+    """Runs one call at a time, for embeddings that aren't thread-safe (DeterministicFakeEmbedding
+    seeds numpy's global random generator, so concurrent batches would mix up vectors)"""
+
+    def __init__(self, embeddings: Embeddings, model: Optional[str] = None):
+        self.embeddings = embeddings
+        self.model = model or embedding_model_name(embeddings)
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with self._lock:
+            return self.embeddings.embed_query(text)
+
+
+class EmbeddingPipeline(Embeddings):
+    """Embeds documents in batches, several batches at a time, under a request rate limit.
+
+    Failed batches are retried with exponential backoff and jitter. embed_in_batches hands
+    every finished batch to on_batch straight away; CachedEmbeddings uses that to checkpoint
+    vectors, so an interrupted build only re-embeds the batches that never completed.
+    """
+
+    def __init__(self, embeddings: Embeddings, batch_size: int = EMBEDDING_BATCH_SIZE,
+                 concurrency: int = EMBEDDING_CONCURRENCY,
+                 requests_per_minute: float = EMBEDDING_REQUESTS_PER_MINUTE,
+                 max_retries: int = EMBEDDING_MAX_RETRIES,
+                 retry_base_seconds: float = EMBEDDING_RETRY_BASE_SECONDS,
+                 retry_max_seconds: float = EMBEDDING_RETRY_MAX_SECONDS,
+                 model: Optional[str] = None):
+        self.embeddings = embeddings
+        self.model = model or embedding_model_name(embeddings)
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.rate_limiter = RequestRateLimiter(requests_per_minute)
+        self.batches = 0
+        self.retries = 0
+        self.texts_embedded = 0
+        self.rate_limited_seconds = 0.0
+        self._stats_lock = threading.Lock()
+
+    def _call(self, fn: Callable[[], Any], what: str) -> Any:
+        """Run one embeddings request under the rate limit, retrying transient failures"""
+        attempt = 0
+        while True:
+            waited = self.rate_limiter.acquire()
+            try:
+                result = fn()
+                with self._stats_lock:
+                    self.rate_limited_seconds += waited
+                return result
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = min(self.retry_max_seconds, self.retry_base_seconds * 2 ** attempt)
+                delay = random.uniform(delay / 2, delay)
+                attempt += 1
+                with self._stats_lock:
+                    self.retries += 1
+                logger.warning(f"Embedding {what} failed ({e}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _embed_batch(self, texts: List[str], number: int) -> List[List[float]]:
+        vectors = self._call(lambda: self.embeddings.embed_documents(texts), f"batch {number}")
+        with self._stats_lock:
+            self.batches += 1
+            self.texts_embedded += len(texts)
+        return vectors
+
+    def embed_in_batches(self, texts: List[str],
+                         on_batch: Optional[Callable[[List[str], List[List[float]]], None]] = None) -> List[List[float]]:
+        """Embed texts batch by batch, calling on_batch(texts, vectors) as each batch completes"""
+        batches = [texts[start:start + self.batch_size] for start in range(0, len(texts), self.batch_size)]
+        if not batches:
+            return []
+
+        results: Dict[int, List[List[float]]] = {}
+        error: Optional[Exception] = None
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches))) as executor:
+            futures = {executor.submit(self._embed_batch, batch, number): number
+                       for number, batch in enumerate(batches)}
+            for future in as_completed(futures):
+                number = futures[future]
+                if future.cancelled():
+                    continue
+                try:
+                    results[number] = future.result()
+                except Exception as e:
+                    # Stop queued batches, but still checkpoint the ones already in flight
+                    if error is None:
+                        error = e
+                        for other in futures:
+                            other.cancel()
+                    continue
+                if on_batch:
+                    on_batch(batches[number], results[number])
+
+        if error is not None:
+            logger.error(f"Embedding failed after retries; {len(results)}/{len(batches)} batches completed")
+            raise error
+
+        logger.info(f"Embedded {len(texts)} texts in {len(batches)} batches "
+                    f"({time.perf_counter() - started:.1f}s)")
+        return [vector for number in range(len(batches)) for vector in results[number]]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_in_batches(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._call(lambda: self.embeddings.embed_query(text), "query")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batch_size": self.batch_size,
+            "concurrency": self.concurrency,
+            "batches": self.batches,
+            "texts_embedded": self.texts_embedded,
+            "retries": self.retries,
+            "rate_limited_seconds": round(self.rate_limited_seconds, 2)
+        }
+
+
+def create_embeddings(provider: str = EMBEDDING_PROVIDER) -> CachedEmbeddings:
+    """Embeddings used to build and query the vectorstore: the provider behind the batched
+    pipeline, behind the persistent cache that also checkpoints builds"""
+    if provider == "fake":
+        # Offline builds and tests: the same text always gets the same vector
+        from langchain_community.embeddings import DeterministicFakeEmbedding
+        model = f"fake-{EMBEDDING_FAKE_DIMENSION}"
+        base = SerializedEmbeddings(DeterministicFakeEmbedding(size=EMBEDDING_FAKE_DIMENSION), model=model)
+    elif provider == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        from services.openai_client import get_http_client
+        # Batching and retries are handled by the pipeline; connections come from the shared pool
+        base = OpenAIEmbeddings(chunk_size=EMBEDDING_BATCH_SIZE, max_retries=0, http_client=get_http_client())
+        model = None
+    else:
+        raise ValueError(f"Unknown EMBEDDING_PROVIDER '{provider}', expected 'openai' or 'fake'")
+    return CachedEmbeddings(EmbeddingPipeline(base, model=model))
@@ -3,12 +3,20 @@ from typing import List, Optional, Dict, Any
 from schemas.followup import FollowupCreate, FollowupUpdate, FollowupOut
 from services.database_service import get_db_service
 from services.anonymization_service import anonymization_service
+from services.daily_service_supabase import get_batch_id, get_current_batch_id
 import logging
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
-async def create_followup(followup: FollowupCreate) -> Optional[Dict[str, Any]]:
+async def _case_batch_id(db_service, case_id: Optional[int]) -> str:
+    """Batch of the followup's case, so the followup is scoped and pruned with it"""
+    case = await db_service.get_by_id("cases", case_id) if case_id is not None else None
+    if case and case.get("batch_id"):
+        return case["batch_id"]
+    return get_batch_id()
+
+async def create_followup(followup: FollowupCreate, is_ai_generated: bool = False) -> Optional[Dict[str, Any]]:
     """Create a new followup using Supabase"""
     try:
         db_service = await get_db_service()
@@ -18,6 +26,8 @@ async def create_followup(followup: FollowupCreate) -> Optional[Dict[str, Any]]:
             "case_id": followup.case_id,
             "suggestion_text": followup.suggestion_text,
             "assigned_to": followup.assigned_to,
+            "is_ai_generated": is_ai_generated,
+            "batch_id": followup.batch_id or await _case_batch_id(db_service, followup.case_id),
             "created_at": datetime.utcnow().isoformat(),
             "updated_at": datetime.utcnow().isoformat()
         }
@@ -36,11 +46,41 @@ async def create_followup(followup: FollowupCreate) -> Optional[Dict[str, Any]]:
         logger.error(f"Error creating followup: {e}", exc_info=True)
         raise Exception(f"Followup creation failed: {str(e)}")
 
+async def save_case_followup(case_id: int, suggestion_text: str, batch_id: Optional[str] = None,
+                             replace_existing: bool = False, is_fallback: bool = False) -> Optional[Dict[str, Any]]:
+    """Store the AI suggestion for a case.
+
+    With replace_existing (the case changed since the last upload) the case's AI-generated
+    followup is refreshed instead of adding another one; followups added by hand are never
+    touched. A fallback suggestion (the AI call failed) keeps the earlier text. A new
+    followup is only created when the case has no AI followup yet.
+    """
+    if replace_existing:
+        db_service = await get_db_service()
+        existing = await db_service.get_all("followups", {"case_id": case_id, "is_ai_generated": True})
+        if existing:
+            if is_fallback:
+                logger.info(f"Kept the earlier AI followup of changed case {case_id}: no new suggestion")
+                return existing[0]
+            updated = await db_service.update("followups", existing[0]["id"], {
+                "suggestion_text": suggestion_text,
+                "updated_at": datetime.utcnow().isoformat()
+            })
+            if updated:
+                logger.info(f"Followup refreshed for changed case: {case_id}")
+                return updated
+    
+    return await create_followup(
+        FollowupCreate(case_id=case_id, batch_id=batch_id, suggestion_text=suggestion_text),
+        is_ai_generated=True
+    )
+
 async def get_all_followups() -> List[Dict[str, Any]]:
-    """Get all followups"""
+    """Get all followups of the current report batch"""
     try:
         db_service = await get_db_service()
-        followups = await db_service.get_all("followups")
+        batch_id = await get_current_batch_id()
+        followups = await db_service.get_all("followups", {"batch_id": batch_id} if batch_id else None)
         return followups
     except Exception as e:
         logger.error(f"Error getting followups: {e}")
@@ -57,10 +97,11 @@ async def get_followup_by_id(followup_id: int) -> Optional[Dict[str, Any]]:
         return None
 
 async def get_followups_with_case_info() -> List[Dict[str, Any]]:
-    """Get all followups with case information and assigned user names"""
+    """Get all followups of the current report batch with case information and assigned user names"""
     try:
         db_service = await get_db_service()
-        followups_with_case_info = await db_service.get_followups_with_case_info()
+        batch_id = await get_current_batch_id()
+        followups_with_case_info = await db_service.get_followups_with_case_info(batch_id)
         
         # Add assigned user names to followups
         for followup in followups_with_case_info:
@@ -127,10 +168,11 @@ async def delete_followup(followup_id: int) -> bool:
         return False
 
 async def get_anonymized_followups() -> List[Dict[str, Any]]:
-    """Get all followups with anonymized case information"""
+    """Get all followups of the current report batch with anonymized case information"""
     try:
         db_service = await get_db_service()
-        followups_with_case_info = await db_service.get_followups_with_case_info()
+        batch_id = await get_current_batch_id()
+        followups_with_case_info = await db_service.get_followups_with_case_info(batch_id)
         
         # Anonymize case information
         anonymized_followups = []
@@ -235,6 +277,7 @@ async def create_followup_from_anonymized_data(anonymized_data: Dict[str, Any])
             "room": anonymized_data.get("room"),
             "suggestion_text": anonymized_data.get("suggestion_text", ""),
             "assigned_to": anonymized_data.get("assigned_to"),
+            "batch_id": anonymized_data.get("batch_id") or await _case_batch_id(db_service, anonymized_data.get("case_id")),
             "created_at": datetime.utcnow().isoformat(),
             "updated_at": datetime.utcnow().isoformat()
         }
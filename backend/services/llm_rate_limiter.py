@@ -0,0 +1,261 @@
+# backend/services/llm_rate_limiter.py
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import re
+import time
+from collections import deque
+from typing import Any, Dict, List, Mapping, Optional
+
+import openai
+
+from services.chunking import count_tokens
+from services.embedding_pipeline import is_retryable
+from services.openai_client import get_async_client
+
+logger = logging.getLogger(__name__)
+
+# Starting limits; replaced by what the x-ratelimit-* response headers report
+OPENAI_REQUESTS_PER_MINUTE = float(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "500"))
+OPENAI_TOKENS_PER_MINUTE = float(os.getenv("OPENAI_TOKENS_PER_MINUTE", "200000"))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "4"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "1"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "30"))
+
+# Lower runs first: staff waiting on a chat reply go ahead of workflow suggestions
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BATCH: "batch"}
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds in an OpenAI reset header ("1s", "6m0s", "120ms")"""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * _DURATION_SECONDS[unit] for number, unit in parts)
+
+
+def retry_after_seconds(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    if not headers:
+        return None
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value:
+            try:
+                return float(value) * scale
+            except ValueError:
+                pass
+    return None
+
+
+def estimate_tokens(kwargs: Dict[str, Any]) -> int:
+    """Prompt tokens plus the completion budget, charged before the request is sent"""
+    prompt = sum(count_tokens(str(message.get("content") or "")) + 4 for message in kwargs.get("messages", []))
+    return prompt + int(kwargs.get("max_tokens") or 0)
+
+
+class TokenBucket:
+    """Refills `limit` units per minute, continuously, up to `limit`"""
+
+    def __init__(self, limit: float):
+        self.limit = limit
+        self.level = limit
+        self._updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.limit, self.level + (now - self._updated) * self.limit / 60.0)
+        self._updated = now
+
+    def seconds_until(self, amount: float, now: float) -> float:
+        self.refill(now)
+        # A request larger than the whole bucket waits for a full bucket instead of forever
+        missing = min(amount, self.limit) - self.level
+        return max(0.0, missing * 60.0 / self.limit) if self.limit > 0 else 0.0
+
+    def observe(self, limit: Optional[float], remaining: Optional[float], now: float) -> None:
+        """Follow the server's view: its limit, and never more headroom than it reports.
+        Our level may be lower still: it already counts requests the server hasn't seen."""
+        self.refill(now)
+        if limit:
+            self.limit = limit
+        if remaining is not None:
+            self.level = min(self.level, remaining)
+
+
+class AdaptiveRateLimiter:
+    """Token-bucket limiter for requests/min and tokens/min shared by all LLM calls.
+
+    Callers wait in a priority queue (interactive before batch, then arrival order). The
+    buckets follow the x-ratelimit-* headers of every response, and a 429 pauses everyone
+    until the server's retry-after has passed. Wait times are kept per priority for stats().
+    """
+
+    def __init__(self, requests_per_minute: float = OPENAI_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = OPENAI_TOKENS_PER_MINUTE):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._queue: List[tuple] = []
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._waits = {priority: deque(maxlen=1000) for priority in PRIORITY_NAMES}
+        self._counters = {"requests": 0, "rate_limited": 0, "retries": 0, "failures": 0}
+
+    def _delay(self, tokens: int, now: float) -> float:
+        return max(self._paused_until - now,
+                   self.requests.seconds_until(1, now),
+                   self.tokens.seconds_until(tokens, now))
+
+    def _wake_head(self) -> None:
+        if self._queue:
+            self._queue[0][2].set()
+
+    async def acquire(self, tokens: int, priority: int = PRIORITY_BATCH) -> float:
+        """Wait for a request slot and `tokens` of budget; returns the seconds waited"""
+        start = time.monotonic()
+        entry = (priority, next(self._sequence), asyncio.Event())
+        heapq.heappush(self._queue, entry)
+        try:
+            while True:
+                now = time.monotonic()
+                if self._queue[0] is entry:
+                    delay = self._delay(tokens, now)
+                    if delay <= 0:
+                        break
+                else:
+                    delay = None  # not our turn: sleep until the head hands over
+                entry[2].clear()
+                try:
+                    await asyncio.wait_for(entry[2].wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+            self.requests.level -= 1
+            self.tokens.level -= tokens
+        finally:
+            was_head = self._queue and self._queue[0] is entry
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+            if was_head:
+                self._wake_head()
+        waited = time.monotonic() - start
+        self._waits[priority].append(waited)
+        self._counters["requests"] += 1
+        return waited
+
+    def observe_headers(self, headers: Optional[Mapping[str, str]]) -> None:
+        if not headers:
+            return
+
+        def number(name: str) -> Optional[float]:
+            try:
+                return float(headers.get(name)) if headers.get(name) is not None else None
+            except ValueError:
+                return None
+
+        now = time.monotonic()
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            remaining = number(f"x-ratelimit-remaining-{kind}")
+            bucket.observe(number(f"x-ratelimit-limit-{kind}"), remaining, now)
+            reset = parse_reset_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+            if remaining is not None and remaining < 1 and reset:
+                # Exhausted: nothing goes out until the server's window resets
+                self._paused_until = max(self._paused_until, now + reset)
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller for `seconds` (after a 429)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._counters["rate_limited"] += 1
+
+    def record(self, counter: str) -> None:
+        self._counters[counter] += 1
+
+    def refund(self, tokens: int) -> None:
+        """Return over-estimated tokens once the real usage is known (negative charges more)"""
+        self.tokens.level = min(self.tokens.limit, self.tokens.level + tokens)
+        self._wake_head()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        queue_wait = {}
+        for priority, waits in self._waits.items():
+            ordered = sorted(waits)
+            queue_wait[PRIORITY_NAMES[priority]] = {
+                "samples": len(ordered),
+                "avg_ms": round(sum(ordered) / len(ordered) * 1000, 1) if ordered else 0.0,
+                "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1) if ordered else 0.0,
+                "max_ms": round(ordered[-1] * 1000, 1) if ordered else 0.0,
+            }
+        return {
+            "requests_per_minute": self.requests.limit,
+            "tokens_per_minute": self.tokens.limit,
+            "requests_available": round(self.requests.level, 1),
+            "tokens_available": round(self.tokens.level),
+            "queued": {name: sum(1 for entry in self._queue if entry[0] == priority)
+                       for priority, name in PRIORITY_NAMES.items()},
+            "paused_seconds": round(max(0.0, self._paused_until - now), 2),
+            "queue_wait": queue_wait,
+            **self._counters,
+        }
+
+
+_limiter = AdaptiveRateLimiter()
+
+
+def get_rate_limiter() -> AdaptiveRateLimiter:
+    return _limiter
+
+
+def _backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2 ** attempt))
+
+
+async def chat_completion(priority: int = PRIORITY_BATCH, **kwargs) -> Any:
+    """chat.completions.create through the shared limiter and retry scheduler.
+
+    Retries 429s, 5xx and connection errors up to LLM_MAX_ATTEMPTS with jittered backoff
+    (at least the server's retry-after); other errors raise at once. Streams (stream=True)
+    are returned as the client's AsyncStream.
+    """
+    limiter = _limiter
+    # Our scheduler owns retries, so the client must not retry on its own as well
+    client = get_async_client().with_options(max_retries=0)
+    estimate = estimate_tokens(kwargs)
+    for attempt in range(LLM_MAX_ATTEMPTS):
+        waited = await limiter.acquire(estimate, priority)
+        if waited > 1:
+            logger.info(f"LLM {PRIORITY_NAMES[priority]} request waited {waited:.1f}s for rate limit budget")
+        try:
+            raw = await client.chat.completions.with_raw_response.create(**kwargs)
+        except Exception as e:
+            headers = getattr(getattr(e, "response", None), "headers", None)
+            limiter.observe_headers(headers)
+            server_delay = retry_after_seconds(headers)
+            if isinstance(e, openai.RateLimitError):
+                limiter.pause(server_delay if server_delay is not None else _backoff(attempt))
+            if not is_retryable(e) or attempt == LLM_MAX_ATTEMPTS - 1:
+                limiter.record("failures")
+                raise
+            delay = max(_backoff(attempt), server_delay or 0.0)
+            limiter.record("retries")
+            logger.warning(f"LLM request failed ({e.__class__.__name__}), retry {attempt + 1} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+
+        limiter.observe_headers(raw.headers)
+        response = raw.parse()
+        usage = getattr(response, "usage", None)
+        if usage is not None and getattr(usage, "total_tokens", None) is not None:
+            limiter.refund(estimate - usage.total_tokens)
+        return response
@@ -0,0 +1,91 @@
+# backend/services/openai_client.py
+
+import asyncio
+import importlib.util
+import logging
+import os
+import threading
+import weakref
+from typing import Any, Dict
+
+import httpx
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60"))
+OPENAI_CONNECT_TIMEOUT_SECONDS = float(os.getenv("OPENAI_CONNECT_TIMEOUT_SECONDS", "5"))
+# Transient failures (connection errors, 408/409/429/5xx) are retried by the client with
+# exponential backoff, honouring Retry-After
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+OPENAI_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY_SECONDS", "30"))
+OPENAI_HTTP2 = os.getenv("OPENAI_HTTP2", "auto").lower()  # auto (if h2 is installed) | true | false
+
+# One async client per event loop: an httpx.AsyncClient pool must not be shared across loops
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+_sync_http_client = None
+_lock = threading.Lock()
+
+
+def http2_enabled() -> bool:
+    if OPENAI_HTTP2 == "auto":
+        return importlib.util.find_spec("h2") is not None
+    return OPENAI_HTTP2 in ("1", "true", "yes")
+
+
+def _api_key() -> str:
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("Missing OPENAI_API_KEY. Check your .env file.")
+    return api_key
+
+
+def _http_options() -> Dict[str, Any]:
+    return {
+        "timeout": httpx.Timeout(OPENAI_TIMEOUT_SECONDS, connect=OPENAI_CONNECT_TIMEOUT_SECONDS),
+        "limits": httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        "http2": http2_enabled(),
+        "follow_redirects": True,
+    }
+
+
+def get_async_client() -> AsyncOpenAI:
+    """Shared AsyncOpenAI client of the running event loop, with a pooled keep-alive transport"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncOpenAI(
+            api_key=_api_key(),
+            max_retries=OPENAI_MAX_RETRIES,
+            timeout=httpx.Timeout(OPENAI_TIMEOUT_SECONDS, connect=OPENAI_CONNECT_TIMEOUT_SECONDS),
+            http_client=httpx.AsyncClient(**_http_options()),
+        )
+        _async_clients[loop] = client
+        logger.info(f"Created shared async OpenAI client (http2={http2_enabled()}, "
+                    f"max_connections={OPENAI_MAX_CONNECTIONS})")
+    return client
+
+
+def get_http_client() -> httpx.Client:
+    """Shared pooled transport for synchronous clients (embedding builds)"""
+    global _sync_http_client
+    with _lock:
+        if _sync_http_client is None:
+            _sync_http_client = httpx.Client(**_http_options())
+        return _sync_http_client
+
+
+async def close_async_client() -> None:
+    """Close the running loop's client and its connections (application shutdown)"""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
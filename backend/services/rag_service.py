@@ -1,17 +1,23 @@
 # backend/services/rag_service.py
 
 import os
-import json
 import uuid
-from typing import List, Dict, Any, Optional
+import time
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
 from pathlib import Path
 from langchain_core.documents import Document
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
-from langchain_text_splitters import CharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
-from openai import OpenAI
 from dotenv import load_dotenv
+from services.bm25_index import reciprocal_rank_fusion
+from services.chunking import get_chunker, source_hash as source_hash_of
+from services.context_packer import pack_context, trim_history
+from services.document_ingestion import ingest_files, is_loadable
+from services.embedding_pipeline import create_embeddings
+from services.llm_rate_limiter import PRIORITY_INTERACTIVE, chat_completion
+from services.structured_output import EMAIL_SCHEMA, SHIFT_SUMMARY_SCHEMA, parse_json_response, response_format
+from services.query_cache import TTLCache, normalize_query
+from services.vector_store import SegmentedVectorStore
 import logging
 
 # Load environment variables
@@ -21,12 +27,29 @@ logger = logging.getLogger(__name__)
 
 class Config:
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+    QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "1000"))
+    QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "600"))
+    RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "hybrid").lower()  # hybrid | vector | lexical
+    HYBRID_CANDIDATES = int(os.getenv("RAG_HYBRID_CANDIDATES", "20"))  # per retriever, before fusion
+    # Hybrid search answers from BM25 alone if the query embedding takes longer than this
+    EMBED_QUERY_TIMEOUT_SECONDS = float(os.getenv("RAG_EMBED_QUERY_TIMEOUT_SECONDS", "2"))
+
+NO_DOCUMENTS_REPLY = "I don't have access to training documents yet. Please upload some documents first."
 
 class RAGService:
     def __init__(self):
         """Initialize the RAG service with FAISS vector database and OpenAI client"""
-        self.openai_client = self._get_openai_client()
-        self.embeddings = OpenAIEmbeddings()
+        if not Config.OPENAI_API_KEY:
+            raise RuntimeError("Missing OPENAI_API_KEY. Check your .env file.")
+        # Persistent cache: rebuilds and re-uploads only embed chunks not seen before
+        self.embeddings = create_embeddings()  # batched, cached; only new chunks are embedded
+        
+        # Repeated questions skip embedding (query -> vector) and search (query -> top-k ids).
+        # Retrieval results are dropped whenever the vectorstore changes.
+        self.query_embedding_cache = TTLCache(Config.QUERY_CACHE_MAX_ENTRIES, Config.QUERY_CACHE_TTL_SECONDS)
+        self.retrieval_cache = TTLCache(Config.QUERY_CACHE_MAX_ENTRIES, Config.QUERY_CACHE_TTL_SECONDS)
+        self._index_generation = 0
+        self._query_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="query-embed")
         
         # Initialize FAISS vector store
         self.persist_folder = "vectorstore"
@@ -34,88 +57,153 @@ class RAGService:
         self.environment = os.getenv("ENVIRONMENT", "development")
         self._load_or_create_vectorstore()
     
-    def _get_openai_client(self) -> OpenAI:
-        """Get OpenAI client"""
-        api_key = Config.OPENAI_API_KEY
-        if not api_key:
-            raise RuntimeError("Missing OPENAI_API_KEY. Check your .env file.")
-        return OpenAI(api_key=api_key)
-    
     def _load_or_create_vectorstore(self):
         """Load existing vectorstore or create a new one from data folder"""
         try:
-            if os.path.exists(self.persist_folder):
-                self.vectorstore = FAISS.load_local(
-                    self.persist_folder, 
-                    self.embeddings, 
-                    allow_dangerous_deserialization=True
-                )
+            if SegmentedVectorStore.exists(self.persist_folder):
+                self.vectorstore = SegmentedVectorStore(self.persist_folder, self.embeddings)
                 logger.info(f"Loaded existing vectorstore from {self.persist_folder}")
+            elif os.path.exists(os.path.join(self.persist_folder, "index.pkl")):
+                # Vectorstore saved by FAISS.save_local before segments were introduced
+                self.vectorstore = SegmentedVectorStore.migrate_langchain_faiss(self.persist_folder, self.embeddings)
             else:
                 # Try to build vectorstore from data folder
                 logger.info("No existing vectorstore found, attempting to build from data folder")
+                self.vectorstore = SegmentedVectorStore(self.persist_folder, self.embeddings)
                 self._build_from_data_folder()
         except Exception as e:
             logger.error(f"Error loading vectorstore: {str(e)}")
             self.vectorstore = None
     
+    def _has_documents(self) -> bool:
+        return self.vectorstore is not None and self.vectorstore.count() > 0
+    
+    def _invalidate_retrieval_cache(self):
+        """Forget cached top-k results after the vectorstore changed"""
+        self._index_generation += 1
+        self.retrieval_cache.clear()
+    
+    def _embed_query(self, text: str) -> List[float]:
+        embedding = self.query_embedding_cache.get(text)
+        if embedding is None:
+            embedding = self.embeddings.embed_query(text)
+            self.query_embedding_cache.set(text, embedding)
+        return embedding
+    
+    def _embed_query_async(self, text: str) -> Future:
+        """Query embedding as a future; already resolved when the embedding is cached"""
+        embedding = self.query_embedding_cache.get(text)
+        if embedding is not None:
+            future = Future()
+            future.set_result(embedding)
+            return future
+        return self._query_executor.submit(self._embed_query, text)
+    
+    def _search(self, query: str, k: int, mode: str) -> tuple:
+        """Ranked chunks for a query and whether the result is complete (cacheable).
+        
+        Hybrid mode fuses the vector and BM25 rankings with reciprocal rank fusion. If the
+        embedding is slow it answers from BM25 alone; the embedding keeps running in the
+        background and lands in the query embedding cache for the next ask.
+        """
+        if mode == "lexical":
+            return [doc for doc, _ in self.vectorstore.lexical_search_with_score(query, k)], True
+        if mode == "vector":
+            return self.vectorstore.similarity_search_by_vector(self._embed_query(query), k=k), True
+        
+        candidates = max(k, Config.HYBRID_CANDIDATES)
+        embedding_future = self._embed_query_async(query)
+        lexical_docs = [doc for doc, _ in self.vectorstore.lexical_search_with_score(query, candidates)]
+        try:
+            embedding = embedding_future.result(timeout=Config.EMBED_QUERY_TIMEOUT_SECONDS)
+        except FutureTimeoutError:
+            if lexical_docs:
+                logger.warning(f"Query embedding slower than {Config.EMBED_QUERY_TIMEOUT_SECONDS}s, using lexical results")
+                return lexical_docs[:k], False
+            embedding = embedding_future.result()
+        
+        vector_docs = self.vectorstore.similarity_search_by_vector(embedding, k=candidates)
+        docs_by_id = {doc.id: doc for doc in vector_docs + lexical_docs}
+        fused = reciprocal_rank_fusion([[doc.id for doc in vector_docs], [doc.id for doc in lexical_docs]])
+        return [docs_by_id[doc_id] for doc_id, _ in fused[:k]], True
+    
+    def _retrieve(self, query: str, k: int = 3) -> List[Document]:
+        """Top-k chunks for a query, served from the retrieval cache for repeated questions"""
+        mode = Config.RETRIEVAL_MODE
+        cache_key = (normalize_query(query), k, mode)
+        doc_ids = self.retrieval_cache.get(cache_key)
+        if doc_ids is not None:
+            docs = self.vectorstore.get_by_ids(doc_ids)
+            if len(docs) == len(doc_ids):
+                return docs
+        
+        generation = self._index_generation
+        docs, complete = self._search(query, k, mode)
+        # Don't cache lexical fallbacks or results of a search that raced with a vectorstore change
+        if complete and generation == self._index_generation:
+            self.retrieval_cache.set(cache_key, [doc.id for doc in docs])
+        return docs
+    
     def _build_from_data_folder(self):
-        """Build vectorstore from documents in the data folder"""
+        """Sync the vectorstore with the documents in the data folder.
+
+        Each file is indexed as its own source; files that disappeared from the folder are
+        removed from the index. Uploaded documents are left alone.
+        """
         data_folder = "data"
         
         if not os.path.exists(data_folder):
             logger.info("No data folder found, vectorstore will be empty")
-            self.vectorstore = None
             return
         
-        documents = []
+        seen_sources = set()
+        jobs = []
+        total_chunks = 0
         
-        # Process all files in the data folder
+        # Hash every file first; only new or changed ones are parsed
         for filename in os.listdir(data_folder):
             file_path = os.path.join(data_folder, filename)
             
-            if os.path.isfile(file_path):
+            if os.path.isfile(file_path) and is_loadable(filename):
                 try:
-                    logger.info(f"Processing file: {filename}")
-                    
-                    if filename.endswith(".txt") or filename.endswith(".md"):
-                        loader = TextLoader(file_path, encoding="utf-8")
-                        documents.extend(loader.load())
-                        
-                    elif filename.endswith(".pdf"):
-                        loader = PyPDFLoader(file_path)
-                        documents.extend(loader.load())
-                        
+                    with open(file_path, "rb") as f:
+                        source_hash = source_hash_of(f.read())
+                    seen_sources.add(file_path)
+                    if not self.vectorstore.is_source_current(file_path, source_hash):
+                        jobs.append({"source": file_path, "path": file_path, "hash": source_hash,
+                                     "metadata": {"filename": filename}})
                 except Exception as e:
-                    logger.error(f"Error processing {filename}: {str(e)}")
-                    continue
-        
-        if not documents:
-            logger.info("No documents found in data folder")
-            self.vectorstore = None
-            return
+                    logger.error(f"Error reading {filename}: {str(e)}")
         
-        logger.info(f"Found {len(documents)} documents to process")
-        
-        # Split documents into chunks
-        splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        texts = splitter.split_documents(documents)
-        
-        logger.info(f"Split into {len(texts)} chunks")
+        # Files are loaded and split in parallel; each is indexed as soon as it's ready
+        for job, texts, error in ingest_files(jobs):
+            if error is not None:
+                seen_sources.discard(job["source"])
+                continue
+            try:
+                logger.info(f"Indexing file: {job['metadata']['filename']}")
+                self.vectorstore.add_source(job["source"], texts, source_hash=job["hash"])
+                total_chunks += len(texts)
+            except Exception as e:
+                logger.error(f"Error processing {job['metadata']['filename']}: {str(e)}")
         
-        # Create vectorstore
-        self.vectorstore = FAISS.from_documents(texts, self.embeddings)
+        # Drop data folder files that were removed since the last build
+        for manifest in self.vectorstore.list_sources():
+            source = manifest["source"]
+            if source.startswith(data_folder + os.sep) and source not in seen_sources:
+                removed = self.vectorstore.delete_source(source)
+                logger.info(f"Removed {removed} chunks of deleted file {source}")
         
-        # Save vectorstore
-        self.vectorstore.save_local(self.persist_folder)
-        logger.info(f"✅ Vectorstore built and saved to: {self.persist_folder}/")
+        self._invalidate_retrieval_cache()
+        logger.info(f"✅ Vectorstore synced with data folder: {len(seen_sources)} files, {total_chunks} chunks")
     
-    def upload_training_documents(self, files: List[Any]) -> Dict[str, Any]:
+    def upload_training_documents(self, files: List[Tuple[str, bytes]]) -> Dict[str, Any]:
         """
-        Upload and process training documents for RAG system
+        Upload and process training documents for RAG system.
+        Blocks while chunks are embedded and written; call it off the event loop.
         
         Args:
-            files: List of uploaded files (documents, PDFs, etc.)
+            files: (filename, content) of each uploaded file (documents, PDFs, etc.)
             
         Returns:
             Dict with upload results
@@ -128,61 +216,56 @@ class RAGService:
         
         documents = []
         
-        for file in files:
+        for filename, content in files:
             try:
-                # Read file content
-                content = file.read()
-                if isinstance(content, bytes):
-                    content = content.decode('utf-8')
+                source_hash = source_hash_of(content)
+                content = content.decode('utf-8')
                 
                 # Extract text based on file type
-                text_content = self._extract_text_from_file(file.filename, content)
+                text_content = self._extract_text_from_file(filename, content)
                 
                 if text_content:
                     # Create document object
                     doc = Document(
                         page_content=text_content,
-                        metadata={"filename": file.filename}
+                        metadata={"filename": filename}
                     )
-                    documents.append(doc)
-                    
-                    results["uploaded_files"].append({
-                        "filename": file.filename,
+                    file_result = {
+                        "filename": filename,
                         "status": "success"
-                    })
+                    }
+                    documents.append((doc, source_hash, file_result))
+                    results["uploaded_files"].append(file_result)
                     
-                    logger.info(f"Successfully processed {file.filename}")
+                    logger.info(f"Successfully processed {filename}")
                 
             except Exception as e:
-                error_msg = f"Error processing {file.filename}: {str(e)}"
+                error_msg = f"Error processing {filename}: {str(e)}"
                 logger.error(error_msg)
                 results["errors"].append(error_msg)
                 results["uploaded_files"].append({
-                    "filename": file.filename,
+                    "filename": filename,
                     "status": "error",
                     "error": str(e)
                 })
         
-        # Process all documents together
+        # Index each document as its own source; only its new chunks are written
         if documents:
             try:
-                # Split documents into chunks
-                splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-                texts = splitter.split_documents(documents)
-                
-                # Create or update vectorstore
+                chunker = get_chunker()
                 if self.vectorstore is None:
-                    self.vectorstore = FAISS.from_documents(texts, self.embeddings)
-                else:
-                    # Add new documents to existing vectorstore
-                    new_vectorstore = FAISS.from_documents(texts, self.embeddings)
-                    self.vectorstore.merge_from(new_vectorstore)
+                    self.vectorstore = SegmentedVectorStore(self.persist_folder, self.embeddings)
                 
-                # Save vectorstore
-                self.vectorstore.save_local(self.persist_folder)
+                for doc, source_hash, file_result in documents:
+                    # Unchanged files are a no-op; repeated chunks are stored once
+                    texts = chunker.split_documents([doc])
+                    indexed = self.vectorstore.add_source(doc.metadata["filename"], texts, source_hash=source_hash)
+                    file_result.update(indexed=indexed["status"], chunks=indexed["chunks"], embedded=indexed["embedded"])
+                    if indexed["status"] == "indexed":
+                        results["processed_chunks"] += indexed["chunks"]
+                self._invalidate_retrieval_cache()
                 
-                results["processed_chunks"] = len(texts)
-                logger.info(f"Successfully processed {len(texts)} chunks and saved vectorstore")
+                logger.info(f"Successfully processed {results['processed_chunks']} chunks and saved vectorstore")
                 
             except Exception as e:
                 error_msg = f"Error creating vectorstore: {str(e)}"
@@ -210,37 +293,7 @@ class RAGService:
             # Default to treating as plain text
             return content
     
-    def _split_text_into_chunks(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
-        """Split text into overlapping chunks for better retrieval"""
-        if len(text) <= chunk_size:
-            return [text]
-        
-        chunks = []
-        start = 0
-        
-        while start < len(text):
-            end = start + chunk_size
-            
-            # Try to break at sentence boundary
-            if end < len(text):
-                # Look for sentence endings within the last 100 characters
-                search_start = max(start + chunk_size - 100, start)
-                for i in range(end, search_start, -1):
-                    if text[i] in '.!?':
-                        end = i + 1
-                        break
-            
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            
-            start = end - overlap
-            if start >= len(text):
-                break
-        
-        return chunks
-    
-    def process_email_with_rag(self, input_text: str, context: Optional[str] = None) -> Dict[str, Any]:
+    async def process_email_with_rag(self, input_text: str, context: Optional[str] = None) -> Dict[str, Any]:
         """
         Process input email text using RAG to generate a standardized email response
         
@@ -252,18 +305,19 @@ class RAGService:
             Dict with the generated email and metadata
         """
         try:
-            if self.vectorstore is None:
+            if not self._has_documents():
                 return {
                     "success": False,
                     "error": "No vectorstore available. Please upload training documents first.",
                     "input_text": input_text
                 }
             
-            # Retrieve relevant chunks from vector database
-            docs = self.vectorstore.similarity_search(input_text, k=3)
+            # Retrieve relevant chunks from vector database (embedding and search block, so off the loop)
+            docs = await asyncio.to_thread(self._retrieve, input_text, 3)
             
-            # Prepare context for OpenAI
-            context_text = "\n".join([doc.page_content for doc in docs])
+            # Prepare context for OpenAI: deduplicated and capped at the context token budget
+            packed = pack_context(docs)
+            context_text = packed["text"]
             
             # Generate email using OpenAI with RAG context
             system_prompt = """You are an expert email assistant that helps format and improve emails based on provided standards and templates.
@@ -294,30 +348,28 @@ Relevant standards and templates:
 
 Please process this email and return a formatted response following the standards provided."""
 
-            response = self.openai_client.chat.completions.create(
+            start = time.perf_counter()
+            response = await chat_completion(
+                PRIORITY_INTERACTIVE,
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
                 temperature=0.3,
-                max_tokens=2000
+                max_tokens=2000,
+                **response_format("gpt-4o-mini", "formatted_email", EMAIL_SCHEMA)
             )
+            self._log_completion("email", packed, None, response.usage, time.perf_counter() - start)
             
-            # Parse the response
+            # Parse the response (schema-constrained JSON; fences and prose tolerated for other models)
             result_text = response.choices[0].message.content.strip()
             
-            # Clean up JSON response
-            if result_text.startswith('```'):
-                result_text = result_text.split('```')[1]
-            if result_text.startswith('json'):
-                result_text = result_text[4:]
-            
-            result_text = result_text.strip()
-            
             try:
-                email_result = json.loads(result_text)
-            except json.JSONDecodeError:
+                email_result = parse_json_response(result_text)
+                if not isinstance(email_result, dict):
+                    raise ValueError("Expected a JSON object")
+            except ValueError:
                 # Fallback if JSON parsing fails
                 email_result = {
                     "subject": "Processed Email",
@@ -330,12 +382,14 @@ Please process this email and return a formatted response following the standard
             return {
                 "success": True,
                 "email": email_result,
-                "context_used": [{"content": doc.page_content, "source": doc.metadata.get("filename", "unknown")} for doc in docs],
+                "context_used": [{"content": doc.page_content, "source": doc.metadata.get("filename", "unknown")} for doc in packed["documents"]],
                 "input_text": input_text,
                 "processing_info": {
                     "model": "gpt-4o-mini",
                     "chunks_retrieved": len(docs),
-                    "total_chunks_available": len(self.vectorstore.docstore._dict) if self.vectorstore else 0
+                    "chunks_used": packed["chunks_used"],
+                    "context_tokens": packed["tokens"],
+                    "total_chunks_available": self.vectorstore.count()
                 }
             }
             
@@ -347,16 +401,12 @@ Please process this email and return a formatted response following the standard
                 "input_text": input_text
             }
     
-    def get_openai_reply(self, messages: List[Dict[str, str]]) -> str:
-        """
-        Get OpenAI reply with vector search context (similar to your previous project)
-        """
-        if self.vectorstore is None:
-            return "I don't have access to training documents yet. Please upload some documents first."
-        
+    def _build_chat_log(self, messages: List[Dict[str, str]]) -> tuple:
+        """System prompt with packed RAG context, followed by the trimmed history"""
         user_question = messages[-1]["content"]
-        docs = self.vectorstore.similarity_search(user_question, k=3)
-        context = "\n".join([doc.page_content for doc in docs])
+        docs = self._retrieve(user_question, k=3)
+        packed = pack_context(docs)
+        context = packed["text"]
 
         system_prompt = {
             "role": "system",
@@ -369,18 +419,86 @@ Please process this email and return a formatted response following the standard
             )
         }
 
-        chat_log = [system_prompt] + messages
+        # Oldest turns go first once the conversation outgrows the history budget
+        history = trim_history(messages)
+        return [system_prompt] + history["messages"], packed, history
 
-        response = self.openai_client.chat.completions.create(
+    async def get_openai_reply(self, messages: List[Dict[str, str]]) -> str:
+        """
+        Get OpenAI reply with vector search context (similar to your previous project)
+        """
+        if not self._has_documents():
+            return NO_DOCUMENTS_REPLY
+        
+        chat_log, packed, history = await asyncio.to_thread(self._build_chat_log, messages)
+
+        start = time.perf_counter()
+        response = await chat_completion(
+            PRIORITY_INTERACTIVE,
             model="gpt-4",
             messages=chat_log,
             temperature=0, 
             max_tokens=500
         )
+        self._log_completion("chat", packed, history, response.usage, time.perf_counter() - start)
 
         return response.choices[0].message.content
 
-    def extract_shift_summary(self, notes: str) -> Dict[str, Any]:
+    async def stream_openai_reply(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """
+        Same reply as get_openai_reply, yielded as text deltas while the model generates.
+        Closing the generator (aclose) closes the completion stream, which stops generation.
+        """
+        if not self._has_documents():
+            yield NO_DOCUMENTS_REPLY
+            return
+
+        start = time.perf_counter()
+        chat_log, packed, history = await asyncio.to_thread(self._build_chat_log, messages)
+        stream = await chat_completion(
+            PRIORITY_INTERACTIVE,
+            model="gpt-4",
+            messages=chat_log,
+            temperature=0,
+            max_tokens=500,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        first_token = None
+        usage = None
+        try:
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                yield chunk.choices[0].delta.content
+        finally:
+            try:
+                # Shielded: when the client disconnects this runs inside a cancelled task, and
+                # the connection must still be closed to stop generation
+                await asyncio.shield(stream.close())
+            finally:
+                self._log_completion("chat stream", packed, history, usage, time.perf_counter() - start, first_token)
+
+    def _log_completion(self, kind: str, packed: Dict[str, Any], history: Optional[Dict[str, Any]],
+                        usage: Any, seconds: float, first_token_seconds: Optional[float] = None) -> None:
+        """Log the prompt token breakdown of a RAG completion and what the API billed"""
+        history_info = ""
+        if history is not None:
+            history_info = (f", history {history['tokens']} ({len(history['messages'])} messages, "
+                            f"{history['messages_dropped']} dropped)")
+        logger.info(
+            f"RAG {kind}: context {packed['tokens']} tokens ({packed['chunks_used']}/{packed['chunks_retrieved']} chunks, "
+            f"{packed['duplicate_sentences']} duplicate sentences{', truncated' if packed['truncated'] else ''})"
+            f"{history_info}; prompt {getattr(usage, 'prompt_tokens', '?')}, "
+            f"completion {getattr(usage, 'completion_tokens', '?')} tokens in {seconds:.2f}s"
+            + (f", first token after {first_token_seconds:.2f}s" if first_token_seconds is not None else "")
+        )
+
+    async def extract_shift_summary(self, notes: str) -> Dict[str, Any]:
         """
         Takes raw shift notes and returns a JSON with date, room moves, and highlights.
         """
@@ -399,7 +517,8 @@ Please process this email and return a formatted response following the standard
             "Return only the JSON, nothing else."
         )
 
-        response = self.openai_client.chat.completions.create(
+        response = await chat_completion(
+            PRIORITY_INTERACTIVE,
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You summarize hotel shifts into structured JSON."},
@@ -407,13 +526,16 @@ Please process this email and return a formatted response following the standard
             ],
             temperature=0,
             max_tokens=300,
+            **response_format("gpt-4o-mini", "shift_summary", SHIFT_SUMMARY_SCHEMA)
         )
 
         text = response.choices[0].message.content
 
         try:
-            data = json.loads(text)
-        except json.JSONDecodeError:
+            data = parse_json_response(text)
+            if not isinstance(data, dict):
+                raise ValueError("Expected a JSON object")
+        except ValueError:
             data = {"error": "Failed to parse JSON from model output", "raw_output": text}
 
         return data
@@ -421,18 +543,22 @@ Please process this email and return a formatted response following the standard
     def get_collection_stats(self) -> Dict[str, Any]:
         """Get statistics about the document collection"""
         try:
-            if self.vectorstore is None:
+            if not self._has_documents():
                 return {
                     "total_chunks": 0,
                     "status": "no_vectorstore",
-                    "message": "No vectorstore available"
+                    "message": "No vectorstore available",
+                    "embedding_cache": self.embeddings.stats(),
+                    "query_cache": self._query_cache_stats()
                 }
             
-            count = len(self.vectorstore.docstore._dict)
             return {
-                "total_chunks": count,
+                "total_chunks": self.vectorstore.count(),
                 "status": "active",
-                "persist_folder": self.persist_folder
+                "persist_folder": self.persist_folder,
+                "index": self.vectorstore.stats(),
+                "embedding_cache": self.embeddings.stats(),
+                "query_cache": self._query_cache_stats()
             }
         except Exception as e:
             return {
@@ -441,34 +567,45 @@ Please process this email and return a formatted response following the standard
                 "error": str(e)
             }
     
+    def _query_cache_stats(self) -> Dict[str, Any]:
+        return {
+            "embeddings": self.query_embedding_cache.stats(),
+            "retrieval": self.retrieval_cache.stats()
+        }
+    
     def clear_collection(self) -> Dict[str, Any]:
         """Clear all documents from the collection"""
         try:
-            # Remove the vectorstore directory
+            # Close the open segments (file descriptors, mmaps) before their files go
+            if self.vectorstore is not None:
+                self.vectorstore.clear()
+                self.vectorstore = None
+            
+            # Remove whatever else is left in the vectorstore directory (e.g. a legacy index)
             import shutil
             if os.path.exists(self.persist_folder):
                 shutil.rmtree(self.persist_folder)
-            
-            # Reset vectorstore
-            self.vectorstore = None
+            self._invalidate_retrieval_cache()
             
             return {"success": True, "message": "Collection cleared successfully"}
         except Exception as e:
             return {"success": False, "error": str(e)}
     
     def rebuild_from_data_folder(self) -> Dict[str, Any]:
-        """Rebuild vectorstore from documents in the data folder"""
+        """Bring the vectorstore up to date with the data folder.
+
+        Only data folder sources are replaced or removed; the segments are then compacted
+        into one. Chunk embeddings come from the embedding cache where possible.
+        """
         try:
-            # Clear existing vectorstore
-            if os.path.exists(self.persist_folder):
-                import shutil
-                shutil.rmtree(self.persist_folder)
+            if self.vectorstore is None:
+                self.vectorstore = SegmentedVectorStore(self.persist_folder, self.embeddings)
             
-            # Build new vectorstore from data folder
             self._build_from_data_folder()
+            self.vectorstore.compact()
             
-            if self.vectorstore is not None:
-                count = len(self.vectorstore.docstore._dict)
+            if self._has_documents():
+                count = self.vectorstore.count()
                 return {
                     "success": True, 
                     "message": f"Vectorstore rebuilt successfully with {count} chunks",
@@ -484,5 +621,39 @@ Please process this email and return a formatted response following the standard
             logger.error(f"Error rebuilding vectorstore: {str(e)}")
             return {"success": False, "error": str(e)}
 
-# Global instance
-rag_service = RAGService()
+# Shared instance, built in the background after startup (see initialize_rag_service)
+_rag_service: Optional[RAGService] = None
+_rag_state: Dict[str, Any] = {"status": "not_started", "error": None, "started_at": None, "ready_at": None}
+_rag_init_task: Optional[asyncio.Task] = None
+RAG_INIT_RETRY_SECONDS = float(os.getenv("RAG_INIT_RETRY_SECONDS", "60"))
+
+def get_rag_service() -> Optional[RAGService]:
+    """The RAG service once it's ready, else None"""
+    return _rag_service
+
+def get_rag_status() -> Dict[str, Any]:
+    """Readiness of the RAG service: not_started, initializing, ready or failed"""
+    return dict(_rag_state)
+
+async def initialize_rag_service() -> Optional[RAGService]:
+    """Build the RAG service (OpenAI client, vectorstore load or build) off the event loop"""
+    global _rag_service
+    _rag_state.update(status="initializing", error=None, started_at=time.time(), ready_at=None)
+    try:
+        _rag_service = await asyncio.to_thread(RAGService)
+        _rag_state.update(status="ready", ready_at=time.time())
+        logger.info(f"RAG service ready in {_rag_state['ready_at'] - _rag_state['started_at']:.1f}s")
+    except Exception as e:
+        _rag_state.update(status="failed", error=str(e))
+        logger.error(f"RAG service initialization failed: {e}", exc_info=True)
+    return _rag_service
+
+def start_rag_initialization() -> Optional[asyncio.Task]:
+    """Start background initialization unless it's running or done; failed attempts are
+    retried after RAG_INIT_RETRY_SECONDS. Must be called from the event loop."""
+    global _rag_init_task
+    status = _rag_state["status"]
+    retry_due = status == "failed" and time.time() - _rag_state["started_at"] >= RAG_INIT_RETRY_SECONDS
+    if status == "not_started" or retry_due:
+        _rag_init_task = asyncio.create_task(initialize_rag_service())
+    return _rag_init_task
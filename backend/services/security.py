@@ -1,14 +1,35 @@
 # backend/services/security.py
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+import asyncio
 import os
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# When enabled, authenticated requests are served from the signed token claims alone and
+# never touch the database. Role/profile changes then apply once the token expires.
+TRUST_TOKEN_CLAIMS = os.getenv("TRUST_TOKEN_CLAIMS", "false").lower() == "true"
+PRINCIPAL_CLAIMS = ("sub", "user_id", "is_admin", "name", "email")
+
+# bcrypt cost factor. Hashes made with another cost are rehashed on the next login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Threads dedicated to bcrypt, so logins never run it on the event loop and a burst of
+# logins can't take over the default executor
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+_password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -16,6 +37,27 @@ def hash_password(password: str) -> str:
 def verify_password(password: str, hashed: str) -> bool:
     return pwd_context.verify(password, hashed)
 
+def verify_and_update_password(password: str, hashed: str):
+    """Verify a password; returns (valid, new_hash) where new_hash is set when the stored
+    hash uses an outdated cost factor and should be replaced"""
+    return pwd_context.verify_and_update(password, hashed)
+
+async def _run_password_task(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, func, *args)
+
+async def hash_password_async(password: str) -> str:
+    """hash_password on the password executor"""
+    return await _run_password_task(hash_password, password)
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    """verify_password on the password executor"""
+    return await _run_password_task(verify_password, password, hashed)
+
+async def verify_and_update_password_async(password: str, hashed: str):
+    """verify_and_update_password on the password executor"""
+    return await _run_password_task(verify_and_update_password, password, hashed)
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     if not SECRET_KEY:
         raise ValueError("SECRET_KEY environment variable is not set")
@@ -32,3 +74,25 @@ def decode_token(token: str):
         return payload
     except JWTError:
         return None
+
+def principal_claims(user: dict) -> dict:
+    """Token claims describing a user, enough to rebuild the principal without the database"""
+    return {
+        "sub": user["username"],
+        "user_id": user["id"],
+        "is_admin": user["is_admin"],
+        "name": user.get("name"),
+        "email": user.get("email"),
+    }
+
+def principal_from_claims(payload: dict):
+    """Principal built from a decoded token, or None if the token lacks the claims (older tokens)"""
+    if any(claim not in payload for claim in PRINCIPAL_CLAIMS):
+        return None
+    return {
+        "id": payload["user_id"],
+        "username": payload["sub"],
+        "name": payload["name"],
+        "email": payload["email"],
+        "is_admin": payload["is_admin"],
+    }
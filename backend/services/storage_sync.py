@@ -0,0 +1,392 @@
+# backend/services/storage_sync.py
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tarfile
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from urllib.parse import quote
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Written into the vectorstore folder and next to the uploaded index; lists every index
+# file with its sha256 and the storage documents (with ETags) the index was built from
+SYNC_MANIFEST_FILE = "sync_manifest.json"
+
+# Uploaded last / downloaded last, so a reader never sees a manifest without its segments
+_COMMIT_FILES = ("manifest.json", "tombstones.txt")
+
+# Full-index artifact: a streamed tar.gz with a sha256 sidecar
+SNAPSHOT_NAME = "vectorstore.tar.gz"
+
+_LIST_PAGE_SIZE = 1000
+_HASH_BLOCK_SIZE = 1024 * 1024
+STREAM_CHUNK_SIZE = 1024 * 1024  # memory per transfer, whatever the file size
+# Per read (not per download), so large objects aren't cut off
+STREAM_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class SupabaseBucket:
+    """Storage operations used by the sync, on a Supabase Storage bucket"""
+
+    def __init__(self, client, bucket_name: str):
+        self.client = client
+        self.bucket_name = bucket_name
+        self._http: Optional[httpx.Client] = None
+
+    @property
+    def _bucket(self):
+        return self.client.storage.from_(self.bucket_name)
+
+    def list_files(self, prefix: str = "") -> Dict[str, Dict[str, Any]]:
+        """Files directly under prefix: {name: {"etag", "size"}} (folders are skipped)"""
+        files = {}
+        offset = 0
+        while True:
+            entries = self._bucket.list(prefix or None, {"limit": _LIST_PAGE_SIZE, "offset": offset})
+            for entry in entries:
+                if entry.get("id") is None:
+                    continue  # folder placeholder
+                metadata = entry.get("metadata") or {}
+                files[entry["name"]] = {"etag": (metadata.get("eTag") or "").strip('"'), "size": metadata.get("size")}
+            if len(entries) < _LIST_PAGE_SIZE:
+                return files
+            offset += _LIST_PAGE_SIZE
+
+    def download(self, path: str) -> bytes:
+        return self._bucket.download(path)
+
+    @contextmanager
+    def open_stream(self, path: str) -> Iterator[Iterator[bytes]]:
+        """Stream an object in STREAM_CHUNK_SIZE chunks instead of loading it into memory.
+
+        storage3's download() buffers the whole object, so this calls the Storage REST API
+        directly with our own client and the key the Supabase client was created with.
+        """
+        if self._http is None:
+            key = self.client.supabase_key
+            self._http = httpx.Client(
+                base_url=f"{self.client.storage_url}/",
+                headers={"apikey": key, "Authorization": f"Bearer {key}"},
+                timeout=STREAM_TIMEOUT,
+                follow_redirects=True,
+            )
+        with self._http.stream("GET", f"object/{quote(self.bucket_name)}/{quote(path)}") as response:
+            response.raise_for_status()
+            yield response.iter_bytes(STREAM_CHUNK_SIZE)
+
+    def upload_file(self, path: str, local_path: str, content_type: str = "application/octet-stream") -> None:
+        # A file object (not bytes) lets the client stream the upload from disk
+        with open(local_path, "rb") as f:
+            self._bucket.upload(path, f, {"content-type": content_type, "x-upsert": "true"})
+
+    def remove(self, paths: List[str]) -> None:
+        if paths:
+            self._bucket.remove(paths)
+
+
+class LocalBucket:
+    """Folder-backed stand-in for SupabaseBucket, for tests and offline runs.
+
+    ETags are the md5 of the content, like Supabase's for single-part uploads.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, path: str) -> str:
+        return os.path.join(self.root, *path.split("/"))
+
+    def list_files(self, prefix: str = "") -> Dict[str, Dict[str, Any]]:
+        folder = self._path(prefix) if prefix else self.root
+        if not os.path.isdir(folder):
+            return {}
+        files = {}
+        for name in os.listdir(folder):
+            path = os.path.join(folder, name)
+            if os.path.isfile(path):
+                digest = hashlib.md5()
+                with open(path, "rb") as f:
+                    for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b""):
+                        digest.update(block)
+                files[name] = {"etag": digest.hexdigest(), "size": os.path.getsize(path)}
+        return files
+
+    def download(self, path: str) -> bytes:
+        try:
+            with open(self._path(path), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Object not found: {path}")
+
+    @contextmanager
+    def open_stream(self, path: str) -> Iterator[Iterator[bytes]]:
+        try:
+            f = open(self._path(path), "rb")
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Object not found: {path}")
+        with f:
+            yield iter(lambda: f.read(STREAM_CHUNK_SIZE), b"")
+
+    def upload_file(self, path: str, local_path: str, content_type: str = "application/octet-stream") -> None:
+        target = self._path(path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(local_path, target + ".part")
+        os.replace(target + ".part", target)
+
+    def remove(self, paths: List[str]) -> None:
+        for path in paths:
+            if os.path.exists(self._path(path)):
+                os.remove(self._path(path))
+
+
+def download_file(bucket, path: str, local_path: str, sha256: Optional[str] = None) -> str:
+    """Stream an object to local_path chunk by chunk, verifying its sha256 when given.
+    The file only appears at local_path once complete and verified."""
+    directory = os.path.dirname(local_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    partial = local_path + ".tmp"
+    try:
+        with bucket.open_stream(path) as chunks, open(partial, "wb") as f:
+            for chunk in chunks:
+                digest.update(chunk)
+                f.write(chunk)
+        if sha256 is not None and digest.hexdigest() != sha256:
+            raise ValueError(f"Checksum mismatch for {path}")
+        os.replace(partial, local_path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return digest.hexdigest()
+
+
+def read_sync_manifest(folder: str) -> Dict[str, Any]:
+    path = os.path.join(folder, SYNC_MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {"files": {}, "documents": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_sync_manifest(folder: str, manifest: Dict[str, Any]) -> None:
+    path = os.path.join(folder, SYNC_MANIFEST_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def fetch_remote_sync_manifest(bucket, prefix: str) -> Optional[Dict[str, Any]]:
+    """The sync manifest of the index in storage, or None if none was uploaded"""
+    try:
+        return json.loads(bucket.download(f"{prefix}/{SYNC_MANIFEST_FILE}"))
+    except Exception:
+        return None
+
+
+def _commit_order(relative_path: str) -> tuple:
+    return (os.path.basename(relative_path) in _COMMIT_FILES, relative_path)
+
+
+def scan_index_files(folder: str, previous: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
+    """{relative path: {"sha256", "size", "mtime_ns"}} for every index file in folder.
+
+    Files whose size and mtime match `previous` keep their recorded hash; segments are
+    immutable, so after the first scan only new files are hashed.
+    """
+    previous = previous or {}
+    files = {}
+    for root, _, names in os.walk(folder):
+        for name in names:
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, folder).replace(os.sep, "/")
+            if relative == SYNC_MANIFEST_FILE or name.endswith(".tmp"):
+                continue
+            stat = os.stat(path)
+            known = previous.get(relative)
+            if known and known.get("size") == stat.st_size and known.get("mtime_ns") == stat.st_mtime_ns:
+                files[relative] = known
+            else:
+                files[relative] = {"sha256": sha256_file(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return files
+
+
+def push_index(bucket, folder: str, prefix: str = "vectorstore",
+               documents: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, int]:
+    """Upload the index files that changed since the copy in storage, then the sync
+    manifest, then remove files storage no longer needs"""
+    local = read_sync_manifest(folder)
+    files = scan_index_files(folder, local.get("files"))
+    remote = fetch_remote_sync_manifest(bucket, prefix) or {"files": {}}
+    remote_files = remote.get("files", {})
+
+    changed = [path for path, info in files.items()
+               if remote_files.get(path, {}).get("sha256") != info["sha256"]]
+    for path in sorted(changed, key=_commit_order):
+        bucket.upload_file(f"{prefix}/{path}", os.path.join(folder, *path.split("/")))
+
+    manifest = {
+        "files": files,
+        "documents": documents if documents is not None else local.get("documents", {})
+    }
+    write_sync_manifest(folder, manifest)
+    bucket.upload_file(f"{prefix}/{SYNC_MANIFEST_FILE}", os.path.join(folder, SYNC_MANIFEST_FILE), "application/json")
+
+    stale = [f"{prefix}/{path}" for path in remote_files if path not in files]
+    bucket.remove(stale)
+
+    logger.info(f"Pushed index to storage: {len(changed)} files uploaded, "
+                f"{len(files) - len(changed)} unchanged, {len(stale)} removed")
+    return {"uploaded": len(changed), "unchanged": len(files) - len(changed), "removed": len(stale)}
+
+
+def pull_index(bucket, folder: str, prefix: str = "vectorstore") -> Optional[Dict[str, int]]:
+    """Download the index files that differ from the local copy, verifying each one's
+    sha256, and delete local files storage no longer has. None if storage has no index."""
+    remote = fetch_remote_sync_manifest(bucket, prefix)
+    if remote is None:
+        return None
+
+    local = read_sync_manifest(folder)
+    local_files = scan_index_files(folder, local.get("files")) if os.path.isdir(folder) else {}
+    remote_files = remote.get("files", {})
+
+    changed = [path for path, info in remote_files.items()
+               if local_files.get(path, {}).get("sha256") != info["sha256"]]
+    for path in sorted(changed, key=_commit_order):
+        download_file(bucket, f"{prefix}/{path}", os.path.join(folder, *path.split("/")),
+                      sha256=remote_files[path]["sha256"])
+
+    stale = [path for path in local_files if path not in remote_files]
+    for path in stale:
+        os.remove(os.path.join(folder, *path.split("/")))
+
+    write_sync_manifest(folder, {
+        "files": scan_index_files(folder, local_files),
+        "documents": remote.get("documents", {})
+    })
+    logger.info(f"Pulled index from storage: {len(changed)} files downloaded, "
+                f"{len(remote_files) - len(changed)} unchanged, {len(stale)} removed")
+    return {"downloaded": len(changed), "unchanged": len(remote_files) - len(changed), "removed": len(stale)}
+
+
+class _HashingWriter:
+    """Write-only file object that hashes what passes through it"""
+
+    def __init__(self, f):
+        self.f = f
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.digest.update(data)
+        self.size += len(data)
+        return self.f.write(data)
+
+
+class _HashingReader:
+    """Read-only file object over a chunk iterator, hashing everything read"""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self.chunks = chunks
+        self.chunk = b""
+        self.offset = 0
+        self.digest = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        parts = []
+        while size != 0:
+            if self.offset >= len(self.chunk):
+                self.chunk = next(self.chunks, b"")
+                self.offset = 0
+                if not self.chunk:
+                    break
+                self.digest.update(self.chunk)
+            available = len(self.chunk) - self.offset
+            take = available if size < 0 else min(size, available)
+            parts.append(self.chunk[self.offset:self.offset + take])
+            self.offset += take
+            if size > 0:
+                size -= take
+        return b"".join(parts)
+
+    def drain(self) -> None:
+        """Consume the rest of the stream, so the digest covers the whole object"""
+        while self.read(STREAM_CHUNK_SIZE):
+            pass
+
+
+def export_snapshot(bucket, folder: str, name: str = SNAPSHOT_NAME) -> Dict[str, Any]:
+    """Upload the whole index as one tar.gz plus a `<name>.sha256` sidecar.
+
+    The archive is compressed in a streaming pass straight to a temp file and uploaded
+    from disk, so memory stays bounded whatever the index size.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".tar.gz") as archive:
+        writer = _HashingWriter(archive)
+        with tarfile.open(fileobj=writer, mode="w|gz") as tar:
+            for relative in sorted(scan_index_files(folder)):
+                tar.add(os.path.join(folder, *relative.split("/")), arcname=relative)
+        archive.flush()
+        checksum = writer.digest.hexdigest()
+        bucket.upload_file(name, archive.name, "application/gzip")
+
+    with tempfile.NamedTemporaryFile("w", suffix=".sha256", delete=False) as sidecar:
+        sidecar.write(f"{checksum}  {name}\n")
+    try:
+        bucket.upload_file(f"{name}.sha256", sidecar.name, "text/plain")
+    finally:
+        os.remove(sidecar.name)
+
+    logger.info(f"Uploaded snapshot {name}: {writer.size / 1024 / 1024:.1f} MB, sha256 {checksum}")
+    return {"name": name, "bytes": writer.size, "sha256": checksum}
+
+
+def import_snapshot(bucket, folder: str, name: str = SNAPSHOT_NAME) -> Dict[str, Any]:
+    """Replace folder with the snapshot in storage, extracting while it downloads.
+
+    Files are unpacked into a staging folder; it only replaces folder once the whole
+    stream matched the sidecar checksum.
+    """
+    expected = bucket.download(f"{name}.sha256").decode("utf-8").split()[0]
+    staging = folder.rstrip(os.sep) + ".incoming"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    try:
+        with bucket.open_stream(name) as chunks:
+            reader = _HashingReader(chunks)
+            with tarfile.open(fileobj=reader, mode="r|gz") as tar:
+                tar.extractall(staging, filter="data")
+            reader.drain()
+        if reader.digest.hexdigest() != expected:
+            raise ValueError(f"Checksum mismatch for {name}")
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    previous = folder.rstrip(os.sep) + ".previous"
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(folder):
+        os.replace(folder, previous)
+    os.replace(staging, folder)
+    shutil.rmtree(previous, ignore_errors=True)
+
+    write_sync_manifest(folder, {"files": scan_index_files(folder), "documents": {}})
+    logger.info(f"Restored snapshot {name} into {folder}")
+    return {"name": name, "sha256": expected}
@@ -0,0 +1,168 @@
+# backend/services/structured_output.py
+
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+# Ask the API for schema-constrained JSON (structured outputs) on models that support it
+AI_STRUCTURED_OUTPUT = os.getenv("AI_STRUCTURED_OUTPUT", "true").lower() in ("1", "true", "yes")
+JSON_SCHEMA_MODEL_PREFIXES = ("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4")
+
+CASE_FIELDS = [
+    "guest", "room", "status", "importance", "type", "title", "case_description", "action",
+    "created", "created_by", "modified", "modified_by", "source", "membership", "in_out",
+]
+
+# Strict mode needs every property listed as required; optional values are nullable instead
+CASES_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "cases": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {field: {"type": ["string", "null"]} for field in CASE_FIELDS},
+                "required": CASE_FIELDS,
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["cases"],
+    "additionalProperties": False,
+}
+
+EMAIL_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "subject": {"type": "string"},
+        "body": {"type": "string"},
+        "improvements": {"type": "array", "items": {"type": "string"}},
+        "tone": {"type": "string"},
+        "confidence": {"type": "number"},
+    },
+    "required": ["subject", "body", "improvements", "tone", "confidence"],
+    "additionalProperties": False,
+}
+
+SHIFT_SUMMARY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "date": {"type": ["string", "null"]},
+        "highlights": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["date", "highlights"],
+    "additionalProperties": False,
+}
+
+_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+
+
+def supports_json_schema(model: str) -> bool:
+    return AI_STRUCTURED_OUTPUT and model.startswith(JSON_SCHEMA_MODEL_PREFIXES)
+
+
+def response_format(model: str, name: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Extra chat.completions.create arguments for a JSON reply matching `schema`; empty
+    for models without structured outputs, which then rely on the prompt"""
+    if not supports_json_schema(model):
+        return {}
+    return {"response_format": {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}}
+
+
+def parse_json_response(text: str) -> Any:
+    """JSON from a model reply: the whole reply, else the first JSON value inside it
+    (code fences and surrounding prose are skipped). Raises ValueError if there is none."""
+    text = _FENCE.sub("", text.strip())
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    decoder = json.JSONDecoder()
+    for match in re.finditer(r"[\[{]", text):
+        try:
+            value, _ = decoder.raw_decode(text, match.start())
+            return value
+        except json.JSONDecodeError:
+            continue
+    raise ValueError("No JSON value found in model output")
+
+
+class IncrementalJSONArrayParser:
+    """Parses the objects of a streamed JSON array one by one, as soon as each is complete.
+
+    The array is either the top-level value or the value of `key` in the top-level object
+    ({"cases": [...]}). Feed text deltas in order; feed() returns the objects completed by
+    that delta. Text before the array (code fences, prose) is skipped.
+    """
+
+    def __init__(self, key: Optional[str] = "cases"):
+        self.key = key
+        self.text = ""
+        self.objects = 0
+        self.finished = False
+        self._array_start = None
+        self._pos = 0
+        self._depth = 0
+        self._element_start = None
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def started(self) -> bool:
+        return self._array_start is not None
+
+    def _find_array(self) -> None:
+        first = re.search(r"[\[{]", self.text)
+        if first is None:
+            return
+        if first.group() == "[":
+            self._array_start = first.start()
+        elif self.key:
+            keyed = re.search(r'"%s"\s*:\s*\[' % re.escape(self.key), self.text)
+            if keyed:
+                self._array_start = keyed.end() - 1
+        if self._array_start is not None:
+            self._pos = self._array_start + 1
+
+    def feed(self, delta: str) -> List[Dict[str, Any]]:
+        self.text += delta
+        if self.finished:
+            return []
+        if self._array_start is None:
+            self._find_array()
+            if self._array_start is None:
+                return []
+
+        completed = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if self._depth == 0:
+                    self._element_start = i
+                self._depth += 1
+            elif ch in "}]":
+                if self._depth == 0:
+                    # The closing bracket of the array itself
+                    self.finished = True
+                    self._pos = i + 1
+                    return completed
+                self._depth -= 1
+                if self._depth == 0 and self._element_start is not None:
+                    value = json.loads(text[self._element_start:i + 1])
+                    self._element_start = None
+                    if isinstance(value, dict):
+                        completed.append(value)
+                        self.objects += 1
+        self._pos = len(text)
+        return completed
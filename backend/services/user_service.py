@@ -3,12 +3,12 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from models import User
 from schemas.user import UserCreate, UserUpdate
-from services.security import hash_password, verify_password
+from services.security import hash_password_async, verify_password_async
 from typing import List, Optional
 
 async def create_user(db: AsyncSession, user: UserCreate) -> User:
     """Create a new user"""
-    hashed_password = hash_password(user.password)
+    hashed_password = await hash_password_async(user.password)
     db_user = User(
         username=user.username,
         name=user.name,
@@ -51,7 +51,7 @@ async def update_user(db: AsyncSession, user_id: int, user_update: UserUpdate) -
     
     # Hash password if it's being updated
     if "password" in update_data:
-        update_data["hashed_password"] = hash_password(update_data.pop("password"))
+        update_data["hashed_password"] = await hash_password_async(update_data.pop("password"))
     
     for field, value in update_data.items():
         setattr(db_user, field, value)
@@ -75,6 +75,6 @@ async def authenticate_user(db: AsyncSession, username: str, password: str) -> O
     user = await get_user_by_username(db, username)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         return None
     return user
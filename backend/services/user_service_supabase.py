@@ -1,19 +1,60 @@
 # User Service using Supabase Client
 from typing import List, Optional, Dict, Any
 from schemas.user import UserCreate, UserUpdate
-from services.security import hash_password, verify_password
+from services.security import hash_password_async, verify_and_update_password_async
 from supabase_client import get_supabase
 import logging
+import os
+import time
 
 logger = logging.getLogger(__name__)
 
+# Authenticated principals are cached briefly so get_current_user doesn't hit Supabase on
+# every request. Entries are keyed by token user_id (or sub for older tokens).
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "30"))
+_principal_cache: Dict[Any, Dict[str, Any]] = {}
+
+def _principal_key(username: str, user_id: Optional[int]) -> Any:
+    return ("id", user_id) if user_id is not None else ("sub", username)
+
+def invalidate_principal(user_id: Optional[int] = None, username: Optional[str] = None) -> None:
+    """Drop cached principals for a user (by id and/or username)"""
+    for key, entry in list(_principal_cache.items()):
+        user = entry["user"]
+        if (user_id is not None and user.get("id") == user_id) or (username is not None and user.get("username") == username):
+            _principal_cache.pop(key, None)
+
+def clear_principal_cache() -> None:
+    """Drop all cached principals"""
+    _principal_cache.clear()
+
+async def get_principal(username: str, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """Get the authenticated user for a token subject, served from a short TTL cache.
+
+    The cached principal carries no password hash.
+    """
+    key = _principal_key(username, user_id)
+    entry = _principal_cache.get(key)
+    if entry and entry["expires_at"] > time.monotonic() and entry["user"].get("username") == username:
+        return entry["user"]
+    
+    user = await get_user_by_username(username)
+    if user is None or (user_id is not None and user.get("id") != user_id):
+        _principal_cache.pop(key, None)
+        return None
+    
+    principal = {k: v for k, v in user.items() if k != "hashed_password"}
+    if PRINCIPAL_CACHE_TTL_SECONDS > 0:
+        _principal_cache[key] = {"user": principal, "expires_at": time.monotonic() + PRINCIPAL_CACHE_TTL_SECONDS}
+    return principal
+
 async def create_user(user: UserCreate) -> Optional[Dict[str, Any]]:
     """Create a new user using Supabase"""
     try:
         supabase = get_supabase()
         
         # Hash the password
-        hashed_password = hash_password(user.password)
+        hashed_password = await hash_password_async(user.password)
         
         # Prepare user data
         user_data = {
@@ -113,11 +154,12 @@ async def update_user(user_id: int, user_update: UserUpdate) -> Optional[Dict[st
         
         # Hash password if it's being updated
         if "password" in update_data:
-            update_data["hashed_password"] = hash_password(update_data.pop("password"))
+            update_data["hashed_password"] = await hash_password_async(update_data.pop("password"))
         
         # Update user in Supabase
         response = supabase.table("users").update(update_data).eq("id", user_id).execute()
         
+        invalidate_principal(user_id=user_id, username=current_user.get("username"))
         if response.data:
             logger.info(f"User updated successfully: {user_id}")
             return response.data[0]
@@ -139,6 +181,7 @@ async def delete_user(user_id: int) -> bool:
         
         # Delete user from Supabase
         response = supabase.table("users").delete().eq("id", user_id).execute()
+        invalidate_principal(user_id=user_id, username=current_user.get("username"))
         
         if response.data:
             logger.info(f"User deleted successfully: {user_id}")
@@ -149,6 +192,16 @@ async def delete_user(user_id: int) -> bool:
         logger.error(f"Error deleting user: {e}")
         return False
 
+async def rehash_password(user: Dict[str, Any], new_hash: str) -> None:
+    """Store a hash recomputed with the current cost factor (best effort, login still succeeds)"""
+    try:
+        supabase = get_supabase()
+        supabase.table("users").update({"hashed_password": new_hash}).eq("id", user["id"]).execute()
+        user["hashed_password"] = new_hash
+        logger.info(f"Password rehashed with current cost factor for user: {user['username']}")
+    except Exception as e:
+        logger.error(f"Error rehashing password for user {user['username']}: {e}")
+
 async def authenticate_user(username: str, password: str) -> Optional[Dict[str, Any]]:
     """Authenticate user with username and password using Supabase"""
     try:
@@ -159,11 +212,15 @@ async def authenticate_user(username: str, password: str) -> Optional[Dict[str,
             return None
         
         logger.info(f"User found: {username}, checking password...")
-        # Verify password
-        if not verify_password(password, user["hashed_password"]):
+        # Verify password (off the event loop)
+        valid, new_hash = await verify_and_update_password_async(password, user["hashed_password"])
+        if not valid:
             logger.warning(f"Invalid password for user: {username}")
             return None
         
+        if new_hash:
+            await rehash_password(user, new_hash)
+        
         logger.info(f"Authentication successful for user: {username}")
         return user
         
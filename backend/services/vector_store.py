@@ -0,0 +1,684 @@
+# backend/services/vector_store.py
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from services.bm25_index import BM25Index
+
+logger = logging.getLogger(__name__)
+
+# Compaction merges all segments into one once either limit is exceeded
+VECTORSTORE_MAX_SEGMENTS = int(os.getenv("VECTORSTORE_MAX_SEGMENTS", "8"))
+VECTORSTORE_MAX_DELETED_RATIO = float(os.getenv("VECTORSTORE_MAX_DELETED_RATIO", "0.25"))
+
+# ANN index used for segments: flat (exact), ivf, hnsw or pq (IVF with product quantization).
+# Segments too small to train the chosen index fall back to flat.
+VECTORSTORE_INDEX_TYPE = os.getenv("VECTORSTORE_INDEX_TYPE", "flat").lower()
+VECTORSTORE_IVF_NLIST = int(os.getenv("VECTORSTORE_IVF_NLIST", "0"))  # 0: about 4 * sqrt(n)
+VECTORSTORE_NPROBE = int(os.getenv("VECTORSTORE_NPROBE", "8"))
+VECTORSTORE_HNSW_M = int(os.getenv("VECTORSTORE_HNSW_M", "32"))
+VECTORSTORE_EF_CONSTRUCTION = int(os.getenv("VECTORSTORE_EF_CONSTRUCTION", "80"))
+VECTORSTORE_EF_SEARCH = int(os.getenv("VECTORSTORE_EF_SEARCH", "64"))
+VECTORSTORE_PQ_M = int(os.getenv("VECTORSTORE_PQ_M", "16"))
+VECTORSTORE_PQ_NBITS = int(os.getenv("VECTORSTORE_PQ_NBITS", "8"))
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "pq")
+# FAISS wants about 39 training points per centroid; below MIN_IVF_NLIST lists an
+# inverted index isn't worth it and the segment stays flat
+TRAINING_POINTS_PER_CENTROID = 39
+MIN_IVF_NLIST = 16
+
+# Memory-map segment indexes, vectors and offsets instead of reading them into memory
+VECTORSTORE_MMAP = os.getenv("VECTORSTORE_MMAP", "true").lower() == "true"
+
+MANIFEST_FILE = "manifest.json"
+TOMBSTONES_FILE = "tombstones.txt"
+
+
+def chunk_id(text: str) -> str:
+    """Content hash of a chunk; identical chunks share one id and are stored once"""
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()[:32]
+
+
+def file_hash(data: bytes) -> str:
+    """Hash of a source file's raw bytes, used to skip re-ingesting unchanged files"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def _ivf_nlist(n: int) -> int:
+    nlist = VECTORSTORE_IVF_NLIST or int(4 * np.sqrt(n))
+    return min(nlist, n // TRAINING_POINTS_PER_CENTROID)
+
+
+def _pq_m(dimension: int) -> int:
+    """Largest number of sub-quantizers <= VECTORSTORE_PQ_M that divides the dimension"""
+    m = min(VECTORSTORE_PQ_M, dimension)
+    while dimension % m:
+        m -= 1
+    return m
+
+
+def build_index(vectors: np.ndarray, index_type: str = VECTORSTORE_INDEX_TYPE):
+    """Build (and train if needed) a FAISS index of the given type over vectors.
+
+    Returns (index, actual_type); a segment with too few vectors to train IVF/PQ
+    centroids gets an exact flat index instead.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {', '.join(INDEX_TYPES)}")
+    n, dimension = vectors.shape
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, VECTORSTORE_HNSW_M)
+        index.hnsw.efConstruction = VECTORSTORE_EF_CONSTRUCTION
+    elif index_type in ("ivf", "pq"):
+        nlist = _ivf_nlist(n)
+        too_small = nlist < MIN_IVF_NLIST
+        if index_type == "pq":
+            too_small = too_small or n < 2 ** VECTORSTORE_PQ_NBITS * TRAINING_POINTS_PER_CENTROID
+        if too_small:
+            index_type = "flat"
+            index = faiss.IndexFlatL2(dimension)
+        else:
+            quantizer = faiss.IndexFlatL2(dimension)
+            if index_type == "ivf":
+                index = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+            else:
+                index = faiss.IndexIVFPQ(quantizer, dimension, nlist, _pq_m(dimension), VECTORSTORE_PQ_NBITS)
+            index.train(vectors)
+    else:
+        index = faiss.IndexFlatL2(dimension)
+
+    index.add(vectors)
+    return index, index_type
+
+
+def index_type_of(index) -> str:
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+
+def configure_search(index, nprobe: int = VECTORSTORE_NPROBE, ef_search: int = VECTORSTORE_EF_SEARCH) -> None:
+    """Apply the recall/latency knobs of an index (nprobe for IVF/PQ, efSearch for HNSW)"""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = min(nprobe, index.nlist)
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+
+
+def _write_json(path: str, data: Any) -> None:
+    """Write JSON atomically (temp file + rename) so readers never see a partial file"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class Segment:
+    """An immutable batch of chunks: raw vectors (.npy), a FAISS index (.faiss) and the
+    chunk documents (.jsonl), all in the same order.
+
+    Segments are opened lazily: the index and vectors are memory-mapped (pages are shared
+    between workers) and a chunk document is read from the JSONL file by its byte offset
+    (.offsets.npy) only when it is returned, so opening a segment doesn't depend on its size.
+    """
+
+    def __init__(self, name: str, base: str, index, vectors: np.ndarray, ids: np.ndarray, offsets: np.ndarray):
+        self.name = name
+        self.base = base
+        self.index = index
+        self.vectors = vectors
+        self.ids = ids
+        self.offsets = offsets
+        self.index_type = index_type_of(index)
+        self._rows: Optional[Dict[str, int]] = None
+        self._fd: Optional[int] = None
+
+    @classmethod
+    def write(cls, folder: str, name: str, vectors: np.ndarray, docs: List[Document],
+              index_type: str = VECTORSTORE_INDEX_TYPE) -> "Segment":
+        index, _ = build_index(vectors, index_type)
+        base = os.path.join(folder, name)
+        np.save(f"{base}.npy", vectors)
+        faiss.write_index(index, f"{base}.faiss")
+        cls._write_docs(base, docs)
+        return cls.read(folder, name)
+
+    @staticmethod
+    def _write_docs(base: str, docs: Iterable[Document]) -> None:
+        offsets, ids = [0], []
+        with open(f"{base}.jsonl", "wb") as f:
+            for doc in docs:
+                line = (json.dumps({"id": doc.id, "page_content": doc.page_content, "metadata": doc.metadata}) + "\n").encode("utf-8")
+                f.write(line)
+                offsets.append(offsets[-1] + len(line))
+                ids.append(doc.id)
+        np.save(f"{base}.offsets.npy", np.asarray(offsets, dtype=np.int64))
+        np.save(f"{base}.ids.npy", np.asarray(ids, dtype=str))
+
+    @classmethod
+    def read(cls, folder: str, name: str) -> "Segment":
+        base = os.path.join(folder, name)
+        if not os.path.exists(f"{base}.offsets.npy"):
+            # Segment written before offset indexes existed: index its JSONL once
+            with open(f"{base}.jsonl", encoding="utf-8") as f:
+                docs = [Document(**json.loads(line)) for line in f]
+            cls._write_docs(base, docs)
+
+        mmap_mode = "r" if VECTORSTORE_MMAP else None
+        return cls(
+            name,
+            base,
+            cls._read_index(f"{base}.faiss"),
+            np.load(f"{base}.npy", mmap_mode=mmap_mode),
+            np.load(f"{base}.ids.npy", mmap_mode=mmap_mode),
+            np.load(f"{base}.offsets.npy", mmap_mode=mmap_mode)
+        )
+
+    @staticmethod
+    def _read_index(path: str):
+        if not VECTORSTORE_MMAP:
+            return faiss.read_index(path)
+        try:
+            # Flat codes (flat, HNSW storage) are mapped through the mmap'ed file reader...
+            return faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            # ...IVF inverted lists need the on-disk inverted lists hook instead
+            return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+
+    @property
+    def rows(self) -> Dict[str, int]:
+        """Chunk id -> row, built on first use"""
+        if self._rows is None:
+            self._rows = {str(doc_id): row for row, doc_id in enumerate(self.ids)}
+        return self._rows
+
+    def doc(self, row: int) -> Document:
+        if self._fd is None:
+            self._fd = os.open(f"{self.base}.jsonl", os.O_RDONLY)
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        record = json.loads(os.pread(self._fd, end - start, start))
+        return Document(id=record["id"], page_content=record["page_content"], metadata=record["metadata"])
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+
+class SegmentedVectorStore(VectorStore):
+    """Append-only FAISS vectorstore persisted as segment files.
+
+    Every add writes one new segment and the chunk manifest of each affected source, so
+    an upload costs O(new chunks). Deletes are recorded as tombstones. When there are too
+    many segments or too many deleted chunks, all live chunks are compacted into a single
+    segment from the stored vectors (no re-embedding).
+
+    Source chunks are content addressed (chunk_id): a chunk shared by several sources, e.g.
+    the same PDF in data/ and in storage, is stored once and only removed when the last
+    source referencing it goes. A source whose file hash didn't change is not touched.
+
+    Layout of the folder:
+        manifest.json           segment list and next segment number
+        sources/<hash>.json     chunk manifest of one source file
+        segments/seg-*.{npy,faiss,jsonl}
+        tombstones.txt          ids of deleted chunks, one per line
+    """
+
+    def __init__(self, folder: str, embedding: Embeddings, index_type: str = VECTORSTORE_INDEX_TYPE,
+                 nprobe: int = VECTORSTORE_NPROBE, ef_search: int = VECTORSTORE_EF_SEARCH):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{index_type}', expected one of {', '.join(INDEX_TYPES)}")
+        self.folder = folder
+        self.embedding = embedding
+        self.index_type = index_type
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.segments: List[Segment] = []
+        self.deleted: set = set()
+        self.next_segment = 1
+        # chunk id -> segment holding it, and chunk id -> sources referencing it.
+        # Both are built on first use so loading doesn't scan every chunk.
+        self._locations: Optional[Dict[str, Segment]] = None
+        self._chunk_sources: Optional[Dict[str, set]] = None
+        # BM25 index over the live chunks, also built on first use and then kept in sync
+        self._lexical: Optional[BM25Index] = None
+        self._lock = threading.RLock()
+        self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    # ----- persistence -------------------------------------------------
+
+    @property
+    def _segments_folder(self) -> str:
+        return os.path.join(self.folder, "segments")
+
+    @property
+    def _sources_folder(self) -> str:
+        return os.path.join(self.folder, "sources")
+
+    @staticmethod
+    def exists(folder: str) -> bool:
+        return os.path.exists(os.path.join(folder, MANIFEST_FILE))
+
+    def _load(self) -> None:
+        os.makedirs(self._segments_folder, exist_ok=True)
+        os.makedirs(self._sources_folder, exist_ok=True)
+        manifest_path = os.path.join(self.folder, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            self._save_manifest()
+            return
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.next_segment = manifest["next_segment"]
+        self.segments = [Segment.read(self._segments_folder, name) for name in manifest["segments"]]
+        for segment in self.segments:
+            configure_search(segment.index, self.nprobe, self.ef_search)
+        tombstones_path = os.path.join(self.folder, TOMBSTONES_FILE)
+        if os.path.exists(tombstones_path):
+            with open(tombstones_path, encoding="utf-8") as f:
+                self.deleted = {line.strip() for line in f if line.strip()}
+        logger.info(f"Loaded vectorstore from {self.folder}: {len(self.segments)} segments, {self.count()} chunks")
+        if self.segments and manifest.get("index_type", "flat") != self.index_type:
+            # Index type changed in the config: rebuild the segments from their stored vectors
+            logger.info(f"Index type changed from {manifest.get('index_type', 'flat')} to {self.index_type}, compacting")
+            self.compact()
+
+    def _get_locations(self) -> Dict[str, Segment]:
+        if self._locations is None:
+            self._locations = {}
+            for segment in self.segments:
+                self._locations.update((doc_id, segment) for doc_id in segment.rows)
+        return self._locations
+
+    def _get_chunk_sources(self) -> Dict[str, set]:
+        if self._chunk_sources is None:
+            self._chunk_sources = {}
+            for source_manifest in self.list_sources():
+                for doc_id in source_manifest["chunk_ids"]:
+                    self._chunk_sources.setdefault(doc_id, set()).add(source_manifest["source"])
+        return self._chunk_sources
+
+    def _get_lexical(self) -> BM25Index:
+        if self._lexical is None:
+            lexical = BM25Index()
+            for segment in self.segments:
+                for row, doc_id in enumerate(segment.ids):
+                    if str(doc_id) not in self.deleted:
+                        lexical.add(str(doc_id), segment.doc(row).page_content)
+            self._lexical = lexical
+            logger.info(f"Built lexical index: {len(lexical)} chunks")
+        return self._lexical
+
+    def _save_manifest(self) -> None:
+        _write_json(os.path.join(self.folder, MANIFEST_FILE), {
+            "version": 1,
+            "segments": [segment.name for segment in self.segments],
+            "next_segment": self.next_segment,
+            "index_type": self.index_type
+        })
+
+    def _source_path(self, source: str) -> str:
+        digest = hashlib.sha1(source.encode("utf-8")).hexdigest()
+        return os.path.join(self._sources_folder, f"{digest}.json")
+
+    def get_source(self, source: str) -> Optional[Dict[str, Any]]:
+        """Chunk manifest of a source file, or None if it isn't indexed"""
+        path = self._source_path(source)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def list_sources(self) -> List[Dict[str, Any]]:
+        manifests = []
+        for filename in sorted(os.listdir(self._sources_folder)):
+            if filename.endswith(".json"):
+                with open(os.path.join(self._sources_folder, filename), encoding="utf-8") as f:
+                    manifests.append(json.load(f))
+        return manifests
+
+    # ----- writes ------------------------------------------------------
+
+    def _append_segment(self, vectors: np.ndarray, docs: List[Document]) -> Segment:
+        name = f"seg-{self.next_segment:06d}"
+        segment = Segment.write(self._segments_folder, name, vectors, docs, self.index_type)
+        configure_search(segment.index, self.nprobe, self.ef_search)
+        self.segments.append(segment)
+        if self._locations is not None:
+            self._locations.update((doc_id, segment) for doc_id in segment.rows)
+        if self._lexical is not None:
+            for doc in docs:
+                self._lexical.add(doc.id, doc.page_content)
+        self.next_segment += 1
+        self._save_manifest()
+        return segment
+
+    def _tombstone(self, ids: Iterable[str]) -> None:
+        ids = [doc_id for doc_id in ids if doc_id not in self.deleted]
+        if not ids:
+            return
+        with open(os.path.join(self.folder, TOMBSTONES_FILE), "a", encoding="utf-8") as f:
+            f.write("".join(f"{doc_id}\n" for doc_id in ids))
+        self.deleted.update(ids)
+        if self._lexical is not None:
+            for doc_id in ids:
+                self._lexical.remove(doc_id)
+
+    def _revive(self, ids: Iterable[str]) -> None:
+        """Un-delete chunks that are still in a segment (a source brought them back)"""
+        ids = set(ids) & self.deleted
+        if not ids:
+            return
+        self.deleted -= ids
+        tombstones_path = os.path.join(self.folder, TOMBSTONES_FILE)
+        with open(f"{tombstones_path}.tmp", "w", encoding="utf-8") as f:
+            f.write("".join(f"{doc_id}\n" for doc_id in self.deleted))
+        os.replace(f"{tombstones_path}.tmp", tombstones_path)
+        if self._lexical is not None:
+            locations = self._get_locations()
+            for doc_id in ids:
+                segment = locations[doc_id]
+                self._lexical.add(doc_id, segment.doc(segment.rows[doc_id]).page_content)
+
+    def chunk_sources(self, doc_id: str) -> List[str]:
+        """Sources whose manifests reference a chunk"""
+        return sorted(self._get_chunk_sources().get(doc_id, ()))
+
+    def is_source_current(self, source: str, source_hash: Optional[str]) -> bool:
+        """True if the source is indexed from a file with this hash (re-ingesting is a no-op)"""
+        manifest = self.get_source(source)
+        return bool(source_hash) and manifest is not None and manifest.get("file_hash") == source_hash
+
+    def _release(self, source: str, ids: Iterable[str]) -> List[str]:
+        """Drop a source's references; returns the chunks no source references anymore"""
+        chunk_sources = self._get_chunk_sources()
+        orphaned = []
+        for doc_id in ids:
+            sources = chunk_sources.get(doc_id)
+            if sources is None:
+                continue
+            sources.discard(source)
+            if not sources:
+                del chunk_sources[doc_id]
+                orphaned.append(doc_id)
+        return orphaned
+
+    def add_embedded(self, docs: List[Document], vectors: List[List[float]]) -> List[str]:
+        """Append already embedded chunks as a new segment"""
+        if not docs:
+            return []
+        with self._lock:
+            for doc in docs:
+                doc.id = doc.id or str(uuid.uuid4())
+            self._append_segment(np.asarray(vectors, dtype=np.float32), docs)
+            self._maybe_compact()
+        return [doc.id for doc in docs]
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, *,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        docs = [Document(id=doc_id, page_content=text, metadata=metadata)
+                for doc_id, text, metadata in zip(ids, texts, metadatas)]
+        return self.add_embedded(docs, self.embedding.embed_documents(texts))
+
+    def add_source(self, source: str, docs: List[Document], source_hash: Optional[str] = None,
+                   **info: Any) -> Dict[str, Any]:
+        """Index the chunks of one source file, replacing whatever it had before.
+
+        Only chunks not already stored are embedded. If source_hash matches the indexed
+        version the call is a no-op. Extra keyword arguments go into the chunk manifest.
+        """
+        if self.is_source_current(source, source_hash):
+            manifest = self.get_source(source)
+            return {"source": source, "status": "unchanged", "chunks": len(manifest["chunk_ids"]),
+                    "embedded": 0, "reused": len(manifest["chunk_ids"]), "removed": 0}
+
+        unique_docs: Dict[str, Document] = {}
+        for doc in docs:
+            unique_docs.setdefault(chunk_id(doc.page_content), doc)
+
+        # Embed outside the lock so searches aren't blocked by a slow embedding call
+        with self._lock:
+            to_embed = [doc_id for doc_id in unique_docs if doc_id not in self._get_locations()]
+        vectors = self.embedding.embed_documents([unique_docs[doc_id].page_content for doc_id in to_embed]) if to_embed else []
+
+        with self._lock:
+            new_docs, new_vectors = [], []
+            for doc_id, vector in zip(to_embed, vectors):
+                if doc_id not in self._get_locations():
+                    doc = unique_docs[doc_id]
+                    new_docs.append(Document(id=doc_id, page_content=doc.page_content, metadata=dict(doc.metadata, source=source)))
+                    new_vectors.append(vector)
+            if new_docs:
+                self._append_segment(np.asarray(new_vectors, dtype=np.float32), new_docs)
+
+            ids = list(unique_docs)
+            self._revive(ids)
+            previous = self.get_source(source)
+            orphaned = self._release(source, set(previous["chunk_ids"]) - set(ids)) if previous else []
+            self._tombstone(orphaned)
+            chunk_sources = self._get_chunk_sources()
+            for doc_id in ids:
+                chunk_sources.setdefault(doc_id, set()).add(source)
+            _write_json(self._source_path(source), dict(info, source=source, file_hash=source_hash, chunk_ids=ids))
+            self._maybe_compact()
+
+        logger.info(f"Indexed {source}: {len(ids)} chunks, {len(new_docs)} embedded, {len(orphaned)} removed")
+        return {"source": source, "status": "indexed", "chunks": len(ids), "embedded": len(new_docs),
+                "reused": len(ids) - len(new_docs), "removed": len(orphaned)}
+
+    def delete_source(self, source: str, compact: bool = True) -> int:
+        """Remove a source file; returns the number of chunks that were only referenced by it"""
+        with self._lock:
+            manifest = self.get_source(source)
+            if manifest is None:
+                return 0
+            orphaned = self._release(source, manifest["chunk_ids"])
+            self._tombstone(orphaned)
+            os.remove(self._source_path(source))
+            if compact:
+                self._maybe_compact()
+            return len(orphaned)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """Delete chunks by id; returns False if none of them is a live chunk"""
+        if not ids:
+            return False
+        with self._lock:
+            # Unknown or already deleted ids would skew count() and the compaction ratio
+            locations = self._get_locations()
+            live = [doc_id for doc_id in dict.fromkeys(ids) if doc_id in locations and doc_id not in self.deleted]
+            if not live:
+                return False
+            self._tombstone(live)
+            self._maybe_compact()
+        return True
+
+    def clear(self) -> None:
+        """Drop every segment, source manifest and tombstone"""
+        with self._lock:
+            for segment in self.segments:
+                segment.close()
+            shutil.rmtree(self.folder, ignore_errors=True)
+            self.segments = []
+            self.deleted = set()
+            self.next_segment = 1
+            self._locations = None
+            self._chunk_sources = None
+            self._lexical = None
+            self._load()
+
+    # ----- compaction --------------------------------------------------
+
+    def _maybe_compact(self) -> None:
+        total = sum(len(segment) for segment in self.segments)
+        deleted_ratio = len(self.deleted) / total if total else 0.0
+        if len(self.segments) > VECTORSTORE_MAX_SEGMENTS or deleted_ratio > VECTORSTORE_MAX_DELETED_RATIO:
+            self.compact()
+
+    def compact(self) -> Dict[str, int]:
+        """Rewrite all live chunks into a single segment and drop the old segment files"""
+        with self._lock:
+            old_segments = self.segments
+            docs, vectors = [], []
+            for segment in old_segments:
+                for row, doc_id in enumerate(segment.ids):
+                    if str(doc_id) not in self.deleted:
+                        docs.append(segment.doc(row))
+                        vectors.append(segment.vectors[row])
+
+            self.segments = []
+            self._locations = None
+            if docs:
+                self._append_segment(np.vstack(vectors).astype(np.float32), docs)
+            else:
+                self._save_manifest()
+
+            # Old files go only after the new manifest is in place
+            for segment in old_segments:
+                segment.close()
+                for ext in (".npy", ".faiss", ".jsonl", ".offsets.npy", ".ids.npy"):
+                    path = os.path.join(self._segments_folder, segment.name + ext)
+                    if os.path.exists(path):
+                        os.remove(path)
+            removed = len(self.deleted)
+            self.deleted = set()
+            tombstones_path = os.path.join(self.folder, TOMBSTONES_FILE)
+            if os.path.exists(tombstones_path):
+                os.remove(tombstones_path)
+
+            logger.info(f"Compacted {len(old_segments)} segments into 1 ({len(docs)} chunks, {removed} deleted dropped)")
+            return {"segments_merged": len(old_segments), "chunks": len(docs), "deleted_dropped": removed}
+
+    # ----- reads -------------------------------------------------------
+
+    def count(self) -> int:
+        """Number of live chunks"""
+        with self._lock:
+            return sum(len(segment) for segment in self.segments) - len(self.deleted)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "segments": len(self.segments),
+                "index_type": self.index_type,
+                "segment_index_types": [segment.index_type for segment in self.segments],
+                "chunks": self.count(),
+                "deleted_pending_compaction": len(self.deleted),
+                "sources": len(os.listdir(self._sources_folder)),
+                "lexical_index": self._lexical.stats() if self._lexical is not None else None
+            }
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        docs = []
+        with self._lock:
+            locations = self._get_locations()
+            for doc_id in ids:
+                segment = locations.get(doc_id)
+                if segment is not None and doc_id not in self.deleted:
+                    docs.append(segment.doc(segment.rows[doc_id]))
+        return docs
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        query = np.asarray([embedding], dtype=np.float32)
+        results = []
+        with self._lock:
+            for segment in self.segments:
+                if not len(segment):
+                    continue
+                # Over-fetch so tombstoned chunks can't push live ones out of the top k
+                distances, rows = segment.index.search(query, min(len(segment), k + len(self.deleted)))
+                for distance, row in zip(distances[0], rows[0]):
+                    if row != -1 and str(segment.ids[row]) not in self.deleted:
+                        results.append((segment.doc(row), float(distance)))
+        results.sort(key=lambda item: item[1])
+        return results[:k]
+
+    def lexical_search_with_score(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        """Top k chunks by BM25 score (higher is better); no embedding call involved"""
+        with self._lock:
+            hits = self._get_lexical().search(query, k)
+            locations = self._get_locations()
+            return [(locations[doc_id].doc(locations[doc_id].rows[doc_id]), score) for doc_id, score in hits]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self.embedding.embed_query(query), k, **kwargs)
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   folder: str = "vectorstore", **kwargs: Any) -> "SegmentedVectorStore":
+        store = cls(folder, embedding)
+        store.add_texts(texts, metadatas)
+        return store
+
+    # ----- migration ---------------------------------------------------
+
+    @classmethod
+    def migrate_langchain_faiss(cls, folder: str, embedding: Embeddings) -> "SegmentedVectorStore":
+        """Convert a LangChain FAISS folder (index.faiss + index.pkl) in place, keeping its vectors"""
+        from langchain_community.vectorstores import FAISS
+
+        legacy = FAISS.load_local(folder, embedding, allow_dangerous_deserialization=True)
+        vectors = legacy.index.reconstruct_n(0, legacy.index.ntotal)
+        docs, rows = {}, []
+        by_source: Dict[str, List[str]] = {}
+        for row in range(legacy.index.ntotal):
+            doc = legacy.docstore.search(legacy.index_to_docstore_id[row])
+            source = doc.metadata.get("source") or doc.metadata.get("filename") or "unknown"
+            doc_id = chunk_id(doc.page_content)
+            # Duplicate chunks of the old index collapse into one
+            if doc_id not in docs:
+                docs[doc_id] = Document(id=doc_id, page_content=doc.page_content, metadata=dict(doc.metadata, source=source))
+                rows.append(vectors[row])
+            source_ids = by_source.setdefault(source, [])
+            if doc_id not in source_ids:
+                source_ids.append(doc_id)
+
+        store = cls(folder, embedding)
+        with store._lock:
+            if docs:
+                store.add_embedded(list(docs.values()), np.vstack(rows))
+            for source, ids in by_source.items():
+                for doc_id in ids:
+                    store._get_chunk_sources().setdefault(doc_id, set()).add(source)
+                _write_json(store._source_path(source), {"source": source, "file_hash": None, "chunk_ids": ids})
+            store.compact()
+        for legacy_file in ("index.faiss", "index.pkl"):
+            os.remove(os.path.join(folder, legacy_file))
+        logger.info(f"Migrated LangChain FAISS vectorstore in {folder} ({store.count()} chunks)")
+        return store
@@ -0,0 +1,20 @@
+import os
+
+import pytest
+
+# Clients are created at import time or lazily and never reach OpenAI or Supabase in
+# tests, but they need settings to exist (the Supabase key must look like a JWT)
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.test")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+
+@pytest.fixture
+def fake_embeddings(tmp_path, monkeypatch):
+    """EMBEDDING_PROVIDER=fake embeddings (small vectors), with their cache in tmp_path"""
+    from services import embedding_pipeline
+
+    monkeypatch.chdir(tmp_path)  # the embedding cache file goes to the working directory
+    monkeypatch.setattr(embedding_pipeline, "EMBEDDING_FAKE_DIMENSION", 8)
+    return embedding_pipeline.create_embeddings("fake")
@@ -0,0 +1,56 @@
+import random
+import string
+
+import pytest
+import tiktoken
+
+from services import chunking
+from services.chunking import StructuredChunker, count_tokens, split_by_tokens
+
+
+@pytest.fixture
+def byte_encoding(monkeypatch):
+    """Offline stand-in for cl100k_base: byte-level tokens plus a few merges, so multi-byte
+    characters span several tokens"""
+    ranks = {bytes([i]): i for i in range(256)}
+    for pair in (b"ab", b"cd", b"ef", b"Ro", b"om"):
+        ranks[pair] = len(ranks)
+    encoding = tiktoken.Encoding(name="test-bytes", pat_str=r"\S+|\s+", mergeable_ranks=ranks, special_tokens={})
+    monkeypatch.setattr(chunking, "_encoding", lambda: encoding)
+    return encoding
+
+
+def random_word(length: int) -> str:
+    rng = random.Random(7)
+    return "".join(rng.choice(string.ascii_letters + string.digits + "+/") for _ in range(length))
+
+
+def test_over_long_word_is_split_to_the_token_budget(byte_encoding):
+    word = random_word(2000)
+    text = f"# Wifi\n\nThe access token is {word} and it expires daily. Ask reception for a new one.\n"
+
+    chunks = StructuredChunker(max_tokens=64, overlap_tokens=8).split_text(text)
+
+    assert max(count_tokens(chunk["text"]) for chunk in chunks) <= 64
+    body = "".join(chunk["text"].removeprefix("Wifi\n") for chunk in chunks)
+    assert word in body.replace(" ", "")
+
+
+def test_split_by_tokens_keeps_multi_byte_characters_whole(byte_encoding):
+    text = "ÄÖÜ€漢字" * 200
+
+    pieces = split_by_tokens(text, 10)
+
+    assert "".join(pieces) == text
+    assert all(count_tokens(piece) <= 10 for piece in pieces)
+    assert not any("�" in piece for piece in pieces)
+
+
+def test_over_long_word_without_tiktoken(monkeypatch):
+    monkeypatch.setattr(chunking, "_encoding", lambda: None)
+    word = random_word(2000)
+
+    chunks = StructuredChunker(max_tokens=64, overlap_tokens=8).split_text(f"Access token: {word}")
+
+    assert max(count_tokens(chunk["text"]) for chunk in chunks) <= 64
+    assert "".join(split_by_tokens(word, 64)) == word
@@ -0,0 +1,153 @@
+import threading
+import time
+from typing import List
+
+import httpx
+import numpy as np
+import openai
+import pytest
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_core.embeddings import Embeddings
+
+import services.embedding_pipeline as embedding_pipeline
+from services.embedding_cache import CachedEmbeddings
+from services.embedding_pipeline import EmbeddingPipeline, is_retryable
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+
+
+def status_error(status_code: int) -> openai.APIStatusError:
+    response = httpx.Response(status_code, request=REQUEST)
+    return openai.APIStatusError(f"HTTP {status_code}", response=response, body=None)
+
+
+class FakeEmbedder(Embeddings):
+    """Deterministic embeddings that record every batch and can fail on chosen calls"""
+
+    def __init__(self, fail_calls=(), error=openai.APIConnectionError(request=REQUEST), delay: float = 0.0):
+        self.base = DeterministicFakeEmbedding(size=8)
+        self.model = "fake-8"
+        self.fail_calls = set(fail_calls)
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+        self.batches: List[List[str]] = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            if self.delay:
+                time.sleep(self.delay)
+            if call in self.fail_calls:
+                raise self.error
+            with self._lock:
+                self.batches.append(list(texts))
+                # DeterministicFakeEmbedding isn't thread-safe (it seeds numpy's global generator)
+                return self.base.embed_documents(texts)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.base.embed_query(text)
+
+
+TEXTS = [f"Guest in room {100 + i} asked for a late checkout" for i in range(100)]
+
+
+def expected(texts):
+    return DeterministicFakeEmbedding(size=8).embed_documents(texts)
+
+
+def test_batches_run_concurrently_up_to_the_limit():
+    embedder = FakeEmbedder(delay=0.05)
+    pipeline = EmbeddingPipeline(embedder, batch_size=10, concurrency=3, requests_per_minute=0)
+
+    vectors = pipeline.embed_documents(TEXTS)
+
+    assert vectors == expected(TEXTS)
+    assert sorted(len(batch) for batch in embedder.batches) == [10] * 10
+    assert embedder.max_active == 3
+    assert pipeline.stats()["batches"] == 10
+    assert pipeline.stats()["texts_embedded"] == 100
+
+
+def test_retryable_errors_are_retried_with_backoff(monkeypatch):
+    delays = []
+    monkeypatch.setattr(embedding_pipeline.time, "sleep", delays.append)
+    embedder = FakeEmbedder(fail_calls={1, 2})
+    pipeline = EmbeddingPipeline(embedder, batch_size=10, concurrency=1, requests_per_minute=0,
+                                 max_retries=3, retry_base_seconds=1, retry_max_seconds=60)
+
+    vectors = pipeline.embed_documents(TEXTS[:10])
+
+    assert vectors == expected(TEXTS[:10])
+    assert pipeline.retries == 2
+    # Exponential backoff with jitter: attempt n waits between half and all of base * 2^n
+    assert 0.5 <= delays[0] <= 1 and 1 <= delays[1] <= 2
+
+
+def test_non_retryable_errors_fail_at_once(monkeypatch):
+    monkeypatch.setattr(embedding_pipeline.time, "sleep", lambda seconds: None)
+    embedder = FakeEmbedder(fail_calls={1}, error=ValueError("input too long"))
+    pipeline = EmbeddingPipeline(embedder, batch_size=10, concurrency=1, requests_per_minute=0, max_retries=3)
+
+    with pytest.raises(ValueError):
+        pipeline.embed_documents(TEXTS[:10])
+    assert embedder.calls == 1
+    assert pipeline.retries == 0
+
+
+@pytest.mark.parametrize("error, retryable", [
+    (openai.APIConnectionError(request=REQUEST), True),
+    (openai.APITimeoutError(request=REQUEST), True),
+    (openai.RateLimitError("slow down", response=httpx.Response(429, request=REQUEST), body=None), True),
+    (status_error(503), True),
+    (status_error(400), False),
+    (status_error(401), False),
+    (ConnectionError("connection reset"), False),
+    (KeyError("choices"), False),
+    (ValueError("input too long"), False),
+])
+def test_only_transient_openai_errors_are_retryable(error, retryable):
+    assert is_retryable(error) is retryable
+
+
+def test_interrupted_build_resumes_from_checkpointed_batches(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    # Batch 4 fails for good; the batches that completed are checkpointed in the cache
+    failing = FakeEmbedder(fail_calls={4}, error=ValueError("bad batch"))
+    cache = CachedEmbeddings(EmbeddingPipeline(failing, batch_size=10, concurrency=1, requests_per_minute=0),
+                             path=path)
+    with pytest.raises(ValueError):
+        cache.embed_documents(TEXTS)
+    completed = {text for batch in failing.batches for text in batch}
+    # Batches 1-3, plus any the worker picked up before the failure was seen
+    assert set(TEXTS[:30]) <= completed < set(TEXTS)
+
+    embedder = FakeEmbedder()
+    cache = CachedEmbeddings(EmbeddingPipeline(embedder, batch_size=10, concurrency=2, requests_per_minute=0),
+                             path=path)
+    vectors = cache.embed_documents(TEXTS)
+
+    assert np.allclose(vectors, expected(TEXTS))
+    assert cache.hits == len(completed)
+    assert cache.misses == len(TEXTS) - len(completed)
+    assert sorted(text for batch in embedder.batches for text in batch) == sorted(set(TEXTS) - completed)
+
+
+def test_fake_provider_is_deterministic_under_concurrency(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # the cache file goes to the working directory
+    monkeypatch.setattr(embedding_pipeline, "EMBEDDING_FAKE_DIMENSION", 8)
+    embeddings = embedding_pipeline.create_embeddings("fake")
+    embeddings.embeddings.batch_size = 5
+    embeddings.embeddings.concurrency = 4
+
+    assert np.allclose(embeddings.embed_documents(TEXTS), expected(TEXTS))
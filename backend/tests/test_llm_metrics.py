@@ -0,0 +1,34 @@
+import httpx
+import pytest
+
+from main import app
+from routers.auth_route import get_current_user
+
+
+def principal(is_admin: bool) -> dict:
+    return {"id": 1, "username": "frontdesk", "name": None, "email": None, "is_admin": is_admin}
+
+
+@pytest.fixture
+def client():
+    yield httpx.AsyncClient(app=app, base_url="http://localhost")
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_llm_metrics_require_a_token(client):
+    async with client:
+        response = await client.get("/api/metrics/llm")
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_llm_metrics_are_admin_only(client):
+    app.dependency_overrides[get_current_user] = lambda: principal(is_admin=False)
+    async with client:
+        assert (await client.get("/api/metrics/llm")).status_code == 403
+
+        app.dependency_overrides[get_current_user] = lambda: principal(is_admin=True)
+        response = await client.get("/api/metrics/llm")
+    assert response.status_code == 200
+    assert {"requests_per_minute", "tokens_per_minute", "queue_wait"} <= set(response.json())
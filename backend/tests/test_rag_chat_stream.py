@@ -0,0 +1,185 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from fastapi import FastAPI
+from langchain_core.documents import Document
+
+from routers import rag_router
+from services.rag_service import RAGService
+
+TOKENS = [f"word{i} " for i in range(40)]
+FIRST_TOKEN_DELAY = 0.2
+TOKEN_INTERVAL = 0.02
+
+
+class FakeCompletionServer:
+    """Local stand-in for /v1/chat/completions that streams TOKENS as SSE chunks and
+    records how many it sent before the client hung up"""
+
+    def __init__(self):
+        self.requests = []
+        self.sent = 0
+        self.finished = threading.Event()
+        self.disconnected = threading.Event()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def write_chunk(self, text: str) -> None:
+                data = text.encode()
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+            def do_POST(self):
+                server.requests.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                time.sleep(FIRST_TOKEN_DELAY)
+                try:
+                    for token in TOKENS:
+                        self.write_chunk("data: " + json.dumps({
+                            "id": "chatcmpl-test", "object": "chat.completion.chunk", "created": 0, "model": "gpt-4",
+                            "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                        }) + "\n\n")
+                        server.sent += 1
+                        time.sleep(TOKEN_INTERVAL)
+                    self.write_chunk("data: [DONE]\n\n")
+                    self.wfile.write(b"0\r\n\r\n")
+                    server.finished.set()
+                except (BrokenPipeError, ConnectionResetError):
+                    server.disconnected.set()
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/v1"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+
+
+@pytest.fixture
+def completion_server(monkeypatch):
+    server = FakeCompletionServer()
+    # Read when the event loop's shared client is created
+    monkeypatch.setenv("OPENAI_BASE_URL", server.url)
+    yield server
+    server.close()
+
+
+class StubRAGService(RAGService):
+    """RAG service with a fixed retrieval result instead of a vectorstore"""
+
+    def __init__(self):
+        # Held so garbage collection can't close an abandoned reply: only the router
+        # closing it explicitly stops the upstream stream
+        self.replies = []
+
+    def stream_openai_reply(self, messages):
+        reply = super().stream_openai_reply(messages)
+        self.replies.append(reply)
+        return reply
+
+    def _has_documents(self) -> bool:
+        return True
+
+    def _retrieve(self, query, k=3):
+        return [Document(page_content="Late checkout until 2pm costs 30 EUR.")]
+
+
+def chat_app(rag_service: RAGService) -> FastAPI:
+    app = FastAPI()
+    app.include_router(rag_router.router)
+    app.dependency_overrides[rag_router.require_rag_service] = lambda: rag_service
+    return app
+
+
+async def post_chat(app, disconnect_after_deltas=None) -> str:
+    """POST /rag/chat with "stream": true through the raw ASGI interface; the client
+    disconnects once it has received disconnect_after_deltas deltas"""
+    body = json.dumps({"messages": [{"role": "user", "content": "How much is late checkout?"}],
+                       "stream": True}).encode()
+    received = []
+    request_sent = False
+    disconnect = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            received.append(message["body"].decode())
+            deltas = sum(1 for event in parse_events("".join(received)) if event[0] is None)
+            if disconnect_after_deltas is not None and deltas >= disconnect_after_deltas:
+                # Hang up while the chat generator is parked at its yield (not waiting on the
+                # reply stream), so only the router's own close can stop the upstream
+                disconnect.set()
+                await asyncio.sleep(1)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/rag/chat", "raw_path": b"/rag/chat", "root_path": "",
+        "query_string": b"", "headers": [(b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+    await app(scope, receive, send)
+    return "".join(received)
+
+
+def parse_events(text: str):
+    """[(event name or None, data)] of the complete SSE events in text"""
+    events = []
+    for block in text.split("\n\n")[:-1]:
+        name, data = None, None
+        for line in block.splitlines():
+            if line.startswith("event: "):
+                name = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+        events.append((name, data))
+    return events
+
+
+@pytest.mark.asyncio
+async def test_deltas_are_forwarded_in_order_with_timings(completion_server, caplog):
+    caplog.set_level("INFO")
+
+    events = parse_events(await post_chat(chat_app(StubRAGService())))
+
+    deltas = [data["delta"] for name, data in events if name is None]
+    assert deltas == TOKENS
+    name, done = events[-1]
+    assert name == "done"
+    assert done["first_token_ms"] >= FIRST_TOKEN_DELAY * 1000
+    assert done["total_ms"] >= done["first_token_ms"] + (len(TOKENS) - 1) * TOKEN_INTERVAL * 1000
+    assert completion_server.requests[0]["stream"] is True
+    assert any("first token after" in record.getMessage() for record in caplog.records)
+
+
+@pytest.mark.asyncio
+async def test_client_disconnect_closes_the_upstream_stream(completion_server, caplog):
+    caplog.set_level("INFO")
+
+    events = parse_events(await post_chat(chat_app(StubRAGService()), disconnect_after_deltas=3))
+
+    assert [data["delta"] for name, data in events if name is None] == TOKENS[:len(events)]
+    assert all(name is None for name, _ in events)  # no "done" after a disconnect
+    # Closing the reply stream (aclosing) closed the upstream connection mid-generation
+    assert await asyncio.to_thread(completion_server.disconnected.wait, 2)
+    assert not completion_server.finished.is_set()
+    assert completion_server.sent < len(TOKENS) // 2
+    assert any("closed by the client" in record.getMessage() for record in caplog.records)
@@ -0,0 +1,65 @@
+import threading
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from routers import rag_router
+from services import rag_service as rag_service_module
+from services.rag_service import RAGService
+
+POLICY = "\n\n".join(f"Pets policy {i}: dogs under 10 kg stay for 25 EUR per night." for i in range(6)).encode()
+
+
+class RecordingRAGService(RAGService):
+    """RAG service that remembers which thread ran each upload"""
+
+    def __init__(self):
+        super().__init__()
+        self.upload_threads = []
+
+    def upload_training_documents(self, files):
+        self.upload_threads.append(threading.get_ident())
+        return super().upload_training_documents(files)
+
+
+@pytest.fixture
+def rag_service(fake_embeddings, monkeypatch):
+    # fake_embeddings moved to tmp_path, so the vectorstore and data folders are empty
+    monkeypatch.setattr(rag_service_module, "create_embeddings", lambda: fake_embeddings)
+    return RecordingRAGService()
+
+
+async def upload(rag_service: RAGService, *files):
+    app = FastAPI()
+    app.include_router(rag_router.router)
+    app.dependency_overrides[rag_router.require_rag_service] = lambda: rag_service
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post("/rag/upload-documents",
+                                     files=[("files", (name, content, "text/plain")) for name, content in files])
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+@pytest.mark.asyncio
+async def test_upload_indexes_files_off_the_event_loop(rag_service):
+    result = await upload(rag_service, ("pets.txt", POLICY), ("spa.md", b"Spa opens at 7am."))
+
+    assert result["errors"] == []
+    assert [(f["filename"], f["indexed"]) for f in result["uploaded_files"]] == \
+        [("pets.txt", "indexed"), ("spa.md", "indexed")]
+    assert result["processed_chunks"] == rag_service.vectorstore.count() > 0
+    assert rag_service.upload_threads and threading.get_ident() not in rag_service.upload_threads
+
+
+@pytest.mark.asyncio
+async def test_reuploading_an_unchanged_file_is_a_no_op(rag_service):
+    first = await upload(rag_service, ("pets.txt", POLICY))
+    chunks = rag_service.vectorstore.count()
+
+    second = await upload(rag_service, ("pets.txt", POLICY))
+
+    assert first["uploaded_files"][0]["indexed"] == "indexed"
+    assert second["uploaded_files"][0]["indexed"] == "unchanged"
+    assert second["processed_chunks"] == 0
+    assert rag_service.vectorstore.count() == chunks
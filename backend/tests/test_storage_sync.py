@@ -0,0 +1,137 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+from langchain_core.documents import Document
+
+from services.storage_sync import (
+    SYNC_MANIFEST_FILE, LocalBucket, SupabaseBucket, download_file, pull_index, push_index
+)
+from services.vector_store import SegmentedVectorStore
+
+PREFIX = "vectorstore"
+
+
+class RecordingBucket(LocalBucket):
+    """LocalBucket that remembers which objects were uploaded"""
+
+    def __init__(self, root: str):
+        super().__init__(root)
+        self.uploaded = []
+
+    def upload_file(self, path: str, local_path: str, content_type: str = "application/octet-stream") -> None:
+        self.uploaded.append(path)
+        super().upload_file(path, local_path, content_type)
+
+
+def source_docs(source: str, version: int = 1):
+    return [Document(page_content=f"{source}: policy paragraph {i}, revision {version if i == 0 else 1}.",
+                     metadata={"filename": source})
+            for i in range(5)]
+
+
+def relative(store: SegmentedVectorStore, path: str) -> str:
+    return os.path.relpath(path, store.folder).replace(os.sep, "/")
+
+
+def contents(store: SegmentedVectorStore):
+    sources = {manifest["source"]: manifest["chunk_ids"] for manifest in store.list_sources()}
+    docs = {doc.id: doc.page_content for ids in sources.values() for doc in store.get_by_ids(ids)}
+    return sources, docs
+
+
+def test_push_pull_round_trip(tmp_path, fake_embeddings):
+    bucket = RecordingBucket(str(tmp_path / "bucket"))
+    store = SegmentedVectorStore(str(tmp_path / "built"), fake_embeddings)
+    for source in ("checkin.pdf", "spa.pdf", "pets.pdf"):
+        store.add_source(source, source_docs(source))
+
+    first_push = push_index(bucket, store.folder, PREFIX)
+    assert first_push["uploaded"] > 0 and first_push["unchanged"] == 0
+
+    pulled_folder = str(tmp_path / "pulled")
+    assert pull_index(bucket, pulled_folder, PREFIX)["downloaded"] == first_push["uploaded"]
+    pulled = SegmentedVectorStore(pulled_folder, fake_embeddings)
+    assert contents(pulled) == contents(store)
+    assert pulled.count() == store.count() == 15
+    assert [doc.id for doc in pulled.similarity_search("spa.pdf policy", k=3)] == \
+        [doc.id for doc in store.similarity_search("spa.pdf policy", k=3)]
+
+    # Changing one source re-uploads only its new segment, its manifest entry and the
+    # store's own manifest/tombstones
+    segments_before = {segment.name for segment in store.segments}
+    store.add_source("spa.pdf", source_docs("spa.pdf", version=2))
+    new_segment = next(segment.name for segment in store.segments if segment.name not in segments_before)
+    bucket.uploaded.clear()
+    second_push = push_index(bucket, store.folder, PREFIX)
+
+    segment_files = {f"segments/{name}" for name in os.listdir(store._segments_folder) if name.startswith(new_segment)}
+    assert segment_files
+    # The replaced chunk is tombstoned, and the segment list in manifest.json changed
+    expected = segment_files | {relative(store, store._source_path("spa.pdf")), "manifest.json", "tombstones.txt"}
+    assert {path[len(PREFIX) + 1:] for path in bucket.uploaded} == expected | {SYNC_MANIFEST_FILE}
+    assert second_push["uploaded"] == len(expected)
+    assert second_push["removed"] == 0
+
+    result = pull_index(bucket, pulled_folder, PREFIX)
+    assert result["downloaded"] == second_push["uploaded"]
+    pulled = SegmentedVectorStore(pulled_folder, fake_embeddings)
+    assert contents(pulled) == contents(store)
+
+    # A deleted source is removed from storage and pruned from the pulled copy
+    removed_manifest = relative(store, store._source_path("pets.pdf"))
+    store.delete_source("pets.pdf", compact=False)
+    assert push_index(bucket, store.folder, PREFIX)["removed"] == 1
+    assert not os.path.exists(os.path.join(bucket.root, PREFIX, *removed_manifest.split("/")))
+
+    result = pull_index(bucket, pulled_folder, PREFIX)
+    assert result["removed"] == 1
+    assert not os.path.exists(os.path.join(pulled_folder, *removed_manifest.split("/")))
+    pulled = SegmentedVectorStore(pulled_folder, fake_embeddings)
+    assert "pets.pdf" not in contents(pulled)[0]
+    assert contents(pulled) == contents(store)
+    assert pulled.count() == store.count() == 10
+
+
+def test_pull_without_remote_index(tmp_path):
+    assert pull_index(LocalBucket(str(tmp_path / "bucket")), str(tmp_path / "pulled"), PREFIX) is None
+
+
+def test_supabase_bucket_streams_from_the_storage_api(tmp_path):
+    payload = os.urandom(3 * 1024 * 1024 + 17)
+    requests = []
+
+    class StorageHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            requests.append((self.path, self.headers.get("apikey"), self.headers.get("Authorization")))
+            if self.path != "/storage/v1/object/ai-training-docs/vectorstore/segments/seg%20000001.npy":
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StorageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        # The public attributes of a supabase Client that the stream uses
+        client = SimpleNamespace(storage_url=f"http://127.0.0.1:{server.server_port}/storage/v1", supabase_key="service-key")
+        bucket = SupabaseBucket(client, "ai-training-docs")
+        target = str(tmp_path / "seg.npy")
+
+        download_file(bucket, "vectorstore/segments/seg 000001.npy", target)
+
+        with open(target, "rb") as f:
+            assert f.read() == payload
+        assert requests[0][1:] == ("service-key", "Bearer service-key")
+        with bucket.open_stream("vectorstore/segments/seg 000001.npy") as chunks:
+            assert max(len(chunk) for chunk in chunks) <= 1024 * 1024
+    finally:
+        server.shutdown()